@@ -0,0 +1,85 @@
+"""
+ASGI serving mode for the PCOS prediction API.
+
+Serves the same /predict contract as server.py, but concurrent requests are
+micro-batched into a single predict_proba call. Run with:
+
+    python asgi_server.py
+    uvicorn asgi_server:app --host 0.0.0.0 --port 8000
+
+PCOS_MAX_BATCH_SIZE and PCOS_MAX_WAIT_MS tune the batching window.
+"""
+import asyncio
+import os
+
+from fastapi import FastAPI, Request
+from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
+import numpy as np
+
+from batching import MicroBatcher
+from predictor import (
+    DEFAULT_TOP_K, extract_features, build_prediction, cached_predict_risk, current_bundle,
+    predict_with_explanations, prediction_cache, start_model_watcher
+)
+
+MAX_BATCH_SIZE = int(os.environ.get('PCOS_MAX_BATCH_SIZE', 64))
+MAX_WAIT_MS = float(os.environ.get('PCOS_MAX_WAIT_MS', 5))
+
+app = FastAPI(title='PCOS Risk Prediction API')
+app.add_middleware(CORSMiddleware, allow_origins=['*'], allow_methods=['*'], allow_headers=['*'])
+
+# Cache hits are answered inside the batch call without touching the model
+batcher = MicroBatcher(cached_predict_risk, max_batch_size=MAX_BATCH_SIZE, max_wait_ms=MAX_WAIT_MS)
+
+@app.middleware('http')
+async def add_model_version(request: Request, call_next):
+    response = await call_next(request)
+    response.headers['X-Model-Version'] = current_bundle().version
+    return response
+
+@app.on_event('startup')
+async def start_batcher():
+    await batcher.start()
+    start_model_watcher()
+
+@app.on_event('shutdown')
+async def stop_batcher():
+    await batcher.stop()
+
+@app.post('/predict')
+async def predict(request: Request):
+    try:
+        data = await request.json()
+        features = extract_features(data)
+        if request.query_params.get('explain', '').lower() in ('1', 'true', 'yes'):
+            # Explanations bypass the micro-batcher so plain requests never pay for SHAP
+            top_k = request.query_params.get('top_k', str(DEFAULT_TOP_K))
+            if not top_k.isdigit() or int(top_k) < 1:
+                raise ValueError(f"top_k must be a positive integer, got {top_k!r}")
+            top_k = int(top_k)
+            risk_probs, explanations = await asyncio.get_running_loop().run_in_executor(
+                None, predict_with_explanations, np.array([features]), top_k
+            )
+            result = build_prediction(float(risk_probs[0]))
+            result['explanation'] = explanations[0]
+            return result
+        risk_prob = await batcher.submit(features)
+        return build_prediction(risk_prob)
+    except ValueError as e:
+        # Invalid input, including a body that is not JSON (JSONDecodeError is a ValueError)
+        return JSONResponse({'error': str(e)}, status_code=400)
+    except Exception as e:
+        return JSONResponse({'error': str(e)}, status_code=500)
+
+@app.get('/model-info')
+async def model_info():
+    return current_bundle().info()
+
+@app.get('/cache/stats')
+async def cache_stats():
+    return prediction_cache.stats()
+
+if __name__ == '__main__':
+    import uvicorn
+    uvicorn.run(app, host='0.0.0.0', port=8000)
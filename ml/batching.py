@@ -0,0 +1,105 @@
+"""
+Micro-batching scheduler for the ASGI prediction server.
+
+Concurrent single-row requests are queued and flushed to the model as one
+matrix once the queue reaches ``max_batch_size`` or the oldest request has
+waited ``max_wait_ms`` milliseconds.
+"""
+import asyncio
+import logging
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class MicroBatcher:
+    """Collect feature rows from concurrent callers and score them in batches."""
+
+    def __init__(self, predict_fn, max_batch_size=64, max_wait_ms=5.0):
+        """
+        Args:
+            predict_fn (callable): Maps an (n, f) matrix to n risk probabilities
+            max_batch_size (int): Flush as soon as this many rows are queued
+            max_wait_ms (float): Flush after the first queued row has waited this long
+        """
+        self.predict_fn = predict_fn
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000.0
+        self._queue = None
+        self._getter = None
+        self._worker = None
+
+    async def start(self):
+        """Start the background flush loop on the running event loop."""
+        self._queue = asyncio.Queue()
+        self._worker = asyncio.ensure_future(self._run())
+
+    async def stop(self):
+        """Stop the flush loop and fail any requests still waiting."""
+        for task in (self._worker, self._getter):
+            if task is not None:
+                task.cancel()
+        self._worker = self._getter = None
+        while self._queue is not None and not self._queue.empty():
+            _, future = self._queue.get_nowait()
+            if not future.done():
+                future.set_exception(RuntimeError('prediction server is shutting down'))
+
+    async def submit(self, features):
+        """Queue one feature row and wait for its risk probability."""
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((features, future))
+        return await future
+
+    async def _next_item(self, timeout=None):
+        # Keep a single pending get() across batches so a timeout never drops an item
+        if self._getter is None:
+            self._getter = asyncio.ensure_future(self._queue.get())
+        done, _ = await asyncio.wait({self._getter}, timeout=timeout)
+        if not done:
+            return None
+        item = self._getter.result()
+        self._getter = None
+        return item
+
+    async def _collect(self):
+        loop = asyncio.get_running_loop()
+        batch = [await self._next_item()]
+        deadline = loop.time() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            # Take whatever is already queued without waiting
+            while len(batch) < self.max_batch_size and not self._queue.empty() and self._getter is None:
+                batch.append(self._queue.get_nowait())
+            if len(batch) >= self.max_batch_size:
+                break
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            item = await self._next_item(timeout=remaining)
+            if item is None:
+                break
+            batch.append(item)
+        return batch
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self._collect()
+            # Drop requests whose callers have already gone away
+            batch = [(features, future) for features, future in batch if not future.done()]
+            if not batch:
+                continue
+            X = np.array([features for features, _ in batch], dtype=np.float64)
+            try:
+                # Score off the event loop so new requests keep queuing meanwhile
+                probs = await loop.run_in_executor(None, self.predict_fn, X)
+            except Exception as e:
+                logger.error(f"Batch prediction failed: {e}")
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            for (_, future), prob in zip(batch, probs):
+                if not future.done():
+                    future.set_result(float(prob))
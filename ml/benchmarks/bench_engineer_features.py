@@ -0,0 +1,109 @@
+"""
+Benchmark engineer_features() from train_model.py on synthetic frames.
+
+Times the whole vectorized function on 10k, 100k and 1M rows and, unless
+--skip-rowwise is given, the two former row-wise DataFrame.apply columns
+(BMI_Category and Cycle_Score) on the same frames, checking both agree.
+
+    python ml/benchmarks/bench_engineer_features.py
+    python ml/benchmarks/bench_engineer_features.py --rows 10000 100000 --repeat 5
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+from train_model import engineer_features
+
+
+def make_frame(n_rows, seed=42):
+    """Build a synthetic frame with the columns engineer_features reads."""
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame({
+        'BMI': rng.normal(24.3, 4.0, n_rows),
+        'Follicle No. (L)': rng.poisson(6, n_rows).astype(float),
+        'Follicle No. (R)': rng.poisson(6, n_rows).astype(float),
+        'Avg. F size (L) (mm)': rng.normal(15, 3.5, n_rows),
+        'Avg. F size (R) (mm)': rng.normal(15, 3.5, n_rows),
+        'Weight (Kg)': rng.normal(59, 11, n_rows),
+        'Height(Cm)': rng.normal(156, 6, n_rows),
+        'Cycle length(days)': rng.integers(0, 12, n_rows).astype(float) + 22,
+        'Cycle(R/I)': rng.integers(0, 2, n_rows).astype(float),
+        'LH(mIU/mL)': rng.gamma(2.0, 1.5, n_rows),
+        'FSH(mIU/mL)': rng.gamma(2.0, 2.5, n_rows),
+        'TSH (mIU/L)': rng.gamma(2.0, 1.5, n_rows),
+        'AMH(ng/mL)': rng.gamma(2.0, 2.9, n_rows),
+        'PRL(ng/mL)': rng.gamma(3.0, 8.0, n_rows),
+        'RBS(mg/dl)': rng.normal(99, 18, n_rows),
+        'BP _Systolic (mmHg)': rng.normal(114, 7, n_rows),
+        'BP _Diastolic (mmHg)': rng.normal(76, 5, n_rows),
+    })
+    for col in ['Weight gain(Y/N)', 'hair growth(Y/N)', 'Skin darkening (Y/N)', 'Hair loss(Y/N)', 'Pimples(Y/N)']:
+        df[col] = rng.integers(0, 2, n_rows).astype(float)
+    # Sprinkle in missing BMI values like the real dataset has
+    df.loc[rng.random(n_rows) < 0.05, 'BMI'] = np.nan
+    return df
+
+
+def rowwise_reference(df):
+    """The former row-wise implementation of the two apply-based columns."""
+    def get_bmi_category(bmi):
+        if bmi < 18.5:
+            return 0
+        elif bmi < 25:
+            return 1
+        elif bmi < 30:
+            return 2
+        else:
+            return 3
+
+    out = pd.DataFrame(index=df.index)
+    out['BMI_Category'] = df['BMI'].apply(get_bmi_category)
+    out['Cycle_Score'] = df.apply(
+        lambda x: abs(x['Cycle length(days)'] - 28) * (2 if x['Cycle(R/I)'] == 0 else 1),
+        axis=1
+    )
+    return out
+
+
+def best_time(fn, df, repeat):
+    """Best wall-clock time of fn over repeat runs, each on a fresh copy of df."""
+    timings = []
+    for _ in range(repeat):
+        frame = df.copy()
+        start = time.perf_counter()
+        result = fn(frame)
+        timings.append(time.perf_counter() - start)
+    return min(timings), result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, nargs='+', default=[10_000, 100_000, 1_000_000])
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--skip-rowwise', action='store_true', help='only time the vectorized implementation')
+    args = parser.parse_args()
+
+    print(f"{'rows':>10} {'engineer_features (s)':>22} {'row-wise apply (s)':>19} {'ratio':>7}")
+    for n_rows in args.rows:
+        df = make_frame(n_rows)
+        vec_time, result = best_time(engineer_features, df, args.repeat)
+
+        if args.skip_rowwise:
+            print(f"{n_rows:>10} {vec_time:>22.4f} {'-':>19} {'-':>7}")
+            continue
+
+        # The row-wise version is slow, so it only runs once
+        row_time, reference = best_time(rowwise_reference, df, 1)
+        for col in reference.columns:
+            if not np.allclose(result[col].to_numpy(float), reference[col].to_numpy(float), equal_nan=True):
+                raise AssertionError(f"{col} differs from the row-wise implementation")
+        print(f"{n_rows:>10} {vec_time:>22.4f} {row_time:>19.4f} {row_time / vec_time:>6.1f}x")
+
+
+if __name__ == '__main__':
+    main()
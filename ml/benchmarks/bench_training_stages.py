@@ -0,0 +1,219 @@
+"""
+Benchmark each stage of the training pipeline in train_model.py on scaled-up data.
+
+The training workbook is replicated 1x, 10x and 100x (numeric measurements
+jittered slightly so the copies are not exact duplicates) and written out as
+workbooks, then every stage is timed on each scale: read_excel, clean_dataset +
+preprocess_data, engineer_features, the split and Preprocessor fit, each
+cross-validation fold, the final fit and writing the model artifacts.
+
+Folds run one after another with all cores here, so each fold gets its own
+timing; train_model.py runs them in parallel. Memory is how far the stage
+raised the process's peak resident set size above what was resident when it
+started; the peak is reset between stages through /proc/self/clear_refs
+(Linux), so CatBoost's native allocations are included. Elsewhere it falls
+back to tracemalloc, which only sees Python allocations.
+
+    python ml/benchmarks/bench_training_stages.py
+    python ml/benchmarks/bench_training_stages.py --scales 1 10 --iterations 200 --json stages.json
+
+The 100x workbook takes about a minute to write; scaled workbooks are kept in
+--workdir and reused on later runs.
+"""
+import argparse
+import gc
+import json
+import logging
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import joblib
+import numpy as np
+import pandas as pd
+from sklearn.model_selection import StratifiedKFold, train_test_split
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+from features import Preprocessor, default_feature_names
+from train_model import (
+    MODEL_PARAMS, N_FOLDS, RANDOM_SEED, build_model, clean_dataset, engineer_features, fit_fold, preprocess_data
+)
+from tree_engine import export_ensemble, export_oblivious_trees
+
+DATA_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'data', 'PCOS_data_without_infertility.xlsx')
+SHEET_NAME = 'Full_new'
+TARGET = 'PCOS (Y/N)'
+MIB = 1024 * 1024
+
+
+def _rss_peak_supported():
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+        return True
+    except OSError:
+        return False
+
+
+def _read_status(field):
+    with open('/proc/self/status') as f:
+        for line in f:
+            if line.startswith(field + ':'):
+                return int(line.split()[1]) * 1024
+    return 0
+
+
+class StageRecorder:
+    """Times named stages and records the peak memory reached during each."""
+
+    def __init__(self):
+        self.rss = _rss_peak_supported()
+        self.stages = {}
+
+    def run(self, name, fn, *args, **kwargs):
+        gc.collect()
+        if self.rss:
+            # Writing 5 resets the peak resident set size (VmHWM) to the current one
+            with open('/proc/self/clear_refs', 'w') as f:
+                f.write('5')
+            baseline = _read_status('VmRSS')
+        else:
+            tracemalloc.start()
+            baseline = 0
+        start = time.perf_counter()
+        result = fn(*args, **kwargs)
+        seconds = time.perf_counter() - start
+        if self.rss:
+            peak = _read_status('VmHWM')
+        else:
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+        self.stages[name] = {'seconds': seconds, 'peak_mib': peak / MIB, 'growth_mib': max(0, peak - baseline) / MIB}
+        return result
+
+
+def scaled_workbook(df, scale, workdir, seed=42):
+    """Write (or reuse) a workbook holding `scale` jittered copies of the sheet's rows."""
+    path = os.path.join(workdir, f'pcos_{scale}x.xlsx')
+    if os.path.exists(path):
+        return path
+    rng = np.random.default_rng(seed)
+    copies = [df]
+    # Only continuous measurements move; float columns holding whole numbers are codes or counts with gaps
+    float_columns = [
+        col for col in df.columns
+        if df[col].dtype.kind == 'f' and not np.allclose(df[col].dropna(), np.round(df[col].dropna()))
+    ]
+    spread = df[float_columns].std().fillna(0).to_numpy()
+    for _ in range(scale - 1):
+        copy = df.copy()
+        noise = rng.normal(size=(len(copy), len(float_columns))) * spread * 0.02
+        copy[float_columns] = copy[float_columns].to_numpy() + noise
+        copies.append(copy)
+    pd.concat(copies, ignore_index=True).to_excel(path, sheet_name=SHEET_NAME, index=False)
+    return path
+
+
+def split_and_impute(df):
+    features = [col for col in default_feature_names() if col in df.columns]
+    X_train, X_test, y_train, y_test = train_test_split(
+        df[features], df[TARGET], test_size=0.2, random_state=RANDOM_SEED, stratify=df[TARGET]
+    )
+    preprocessor = Preprocessor.fit(X_train)
+    return preprocessor, preprocessor.transform(X_train), preprocessor.transform(X_test), y_train, y_test
+
+
+def final_fit(X_train, y_train, X_test, y_test, params):
+    model = build_model(**params)
+    model.fit(X_train, y_train, eval_set=[(X_test, y_test)], verbose=False)
+    return model
+
+
+def write_artifacts(model, fold_models, preprocessor, out_dir):
+    joblib.dump(model, os.path.join(out_dir, 'pcos_model.joblib'))
+    export_oblivious_trees(model, os.path.join(out_dir, 'pcos_model.trees.npz'))
+    joblib.dump(fold_models, os.path.join(out_dir, 'pcos_model.folds.joblib'))
+    export_ensemble(fold_models, os.path.join(out_dir, 'pcos_model.ensemble.npz'))
+    preprocessor.save(os.path.join(out_dir, 'pcos_model.preprocess.npz'))
+
+
+def bench_scale(path, params, recorder):
+    """Run every training stage once on one workbook."""
+    raw = recorder.run('read_excel', pd.read_excel, path, sheet_name=SHEET_NAME)
+    df = recorder.run('preprocess_data', lambda: preprocess_data(clean_dataset(raw)))
+    recorder.run('engineer_features', engineer_features, df.copy())
+    preprocessor, X_train, X_test, y_train, y_test = recorder.run('split_and_impute', split_and_impute, df)
+
+    skf = StratifiedKFold(n_splits=N_FOLDS, shuffle=True, random_state=RANDOM_SEED)
+    fold_models = []
+    for fold, (train_idx, val_idx) in enumerate(skf.split(X_train, y_train), 1):
+        _, model, _ = recorder.run(
+            f'fold_{fold}', fit_fold, fold, X_train.iloc[train_idx], y_train.iloc[train_idx],
+            X_train.iloc[val_idx], y_train.iloc[val_idx], -1, params
+        )
+        fold_models.append(model)
+
+    model = recorder.run('final_fit', final_fit, X_train, y_train, X_test, y_test, params)
+    with tempfile.TemporaryDirectory() as out_dir:
+        recorder.run('write_artifacts', write_artifacts, model, fold_models, preprocessor, out_dir)
+    return len(df)
+
+
+def print_table(results):
+    scales = list(results)
+    stages = list(next(iter(results.values()))['stages'])
+    # Memory columns show how far the stage pushed the peak above what was resident when it started
+    header = f"{'stage':<18}" + ''.join(f"{f'{s}x s':>11}{f'{s}x +MiB':>11}" for s in scales)
+    print(header)
+    print('-' * len(header))
+    for stage in stages + ['total']:
+        row = f'{stage:<18}'
+        for scale in scales:
+            if stage == 'total':
+                seconds = sum(r['seconds'] for r in results[scale]['stages'].values())
+                growth = max(r['growth_mib'] for r in results[scale]['stages'].values())
+            else:
+                seconds = results[scale]['stages'][stage]['seconds']
+                growth = results[scale]['stages'][stage]['growth_mib']
+            row += f'{seconds:>11.3f}{growth:>11.1f}'
+        print(row)
+    print(f"{'rows':<18}" + ''.join(f"{results[s]['rows']:>11}{'':>11}" for s in scales))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scales', type=int, nargs='+', default=[1, 10, 100])
+    parser.add_argument('--iterations', type=int, default=None, help='override CatBoost iterations for quicker runs')
+    parser.add_argument('--workdir', default=os.path.join(tempfile.gettempdir(), 'pcos_bench_training'),
+                        help='where scaled workbooks are written and reused')
+    parser.add_argument('--json', help='also write the results to this file')
+    args = parser.parse_args()
+
+    # The pipeline's progress logging would drown the table
+    logging.getLogger().setLevel(logging.WARNING)
+    params = {'verbose': False}
+    if args.iterations is not None:
+        params['iterations'] = args.iterations
+    os.makedirs(args.workdir, exist_ok=True)
+    sheet = pd.read_excel(DATA_PATH, sheet_name=SHEET_NAME)
+
+    results = {}
+    for scale in args.scales:
+        path = scaled_workbook(sheet, scale, args.workdir)
+        recorder = StageRecorder()
+        rows = bench_scale(path, params, recorder)
+        results[scale] = {'rows': rows, 'stages': recorder.stages}
+        print(f"{scale}x ({rows} rows): {sum(s['seconds'] for s in recorder.stages.values()):.1f}s", file=sys.stderr)
+
+    memory = 'peak RSS' if StageRecorder().rss else 'tracemalloc peak'
+    print(f"\nCatBoost iterations: {params.get('iterations', MODEL_PARAMS['iterations'])}, memory: {memory}\n")
+    print_table(results)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'params': params, 'memory': memory, 'results': results}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,159 @@
+"""
+Nearest healthcare facility lookup over assets/healthcare_facilities.csv.
+
+The CSV is read once into column arrays and the coordinates are indexed with a
+haversine ball tree, so a k-nearest query touches O(log n) facilities instead
+of scanning all of them. Queries filtered by facility type or county use a
+smaller tree built over just the matching rows; those trees are built on first
+use and kept for the most recent filter combinations.
+"""
+from collections import OrderedDict
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+from sklearn.neighbors import BallTree
+
+FACILITIES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'assets', 'healthcare_facilities.csv')
+
+# Mean Earth radius; BallTree's haversine metric works in radians on the unit sphere
+EARTH_RADIUS_KM = 6371.0088
+
+DEFAULT_K = 5
+MAX_K = 100
+
+# Filtered trees kept in memory
+MAX_FILTERED_TREES = 64
+
+# CSV column -> response key
+FIELDS = {
+    'OBJECTID': 'id',
+    'Facility_N': 'name',
+    'Type': 'type',
+    'Owner': 'owner',
+    'County': 'county',
+    'Sub_County': 'sub_county',
+    'Location': 'location',
+    'Nearest_To': 'nearest_to',
+}
+
+
+def normalize(value):
+    """Case- and whitespace-insensitive form used for filter matching."""
+    return ' '.join(str(value).split()).lower()
+
+
+def as_filter(values):
+    """Turn None, a string or a list of strings into a sorted tuple of normalized values."""
+    if values is None:
+        return ()
+    if isinstance(values, str):
+        values = [values]
+    return tuple(sorted({normalize(v) for v in values if str(v).strip()}))
+
+
+class FacilityIndex:
+    """Column arrays of the facility CSV plus haversine ball trees for k-nearest queries."""
+
+    def __init__(self, df):
+        """
+        Args:
+            df (pd.DataFrame): Facility rows with the FIELDS columns, Latitude and Longitude
+        """
+        df = df.dropna(subset=['Latitude', 'Longitude'])
+        self.columns = {
+            key: df[col].fillna('').astype(str).str.strip().to_numpy(dtype=object)
+            for col, key in FIELDS.items()
+        }
+        self.columns['id'] = df['OBJECTID'].to_numpy()
+        self.latitude = df['Latitude'].to_numpy(dtype=np.float64)
+        self.longitude = df['Longitude'].to_numpy(dtype=np.float64)
+        self.type_keys = np.array([normalize(v) for v in self.columns['type']], dtype=object)
+        self.county_keys = np.array([normalize(v) for v in self.columns['county']], dtype=object)
+
+        self._radians = np.radians(np.column_stack([self.latitude, self.longitude]))
+        self._tree = BallTree(self._radians, metric='haversine')
+        self._filtered = OrderedDict()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def load(cls, path=FACILITIES_PATH):
+        return cls(pd.read_csv(path))
+
+    def __len__(self):
+        return len(self.latitude)
+
+    def _subset(self, types, counties):
+        """Return (tree, row indices) for the rows matching the filters; (None, empty) if none do."""
+        if not types and not counties:
+            return self._tree, None
+        key = (types, counties)
+        with self._lock:
+            if key in self._filtered:
+                self._filtered.move_to_end(key)
+                return self._filtered[key]
+
+        mask = np.ones(len(self), dtype=bool)
+        if types:
+            mask &= np.isin(self.type_keys, types)
+        if counties:
+            mask &= np.isin(self.county_keys, counties)
+        rows = np.flatnonzero(mask)
+        tree = BallTree(self._radians[rows], metric='haversine') if len(rows) else None
+
+        with self._lock:
+            self._filtered[key] = (tree, rows)
+            if len(self._filtered) > MAX_FILTERED_TREES:
+                self._filtered.popitem(last=False)
+        return tree, rows
+
+    def record(self, i, distance_km=None):
+        """Response dict for facility row i."""
+        record = {key: self.columns[key][i] for key in FIELDS.values()}
+        record['id'] = int(record['id'])
+        record['latitude'] = float(self.latitude[i])
+        record['longitude'] = float(self.longitude[i])
+        if distance_km is not None:
+            record['distance_km'] = round(float(distance_km), 3)
+        return record
+
+    def nearest_rows(self, points, k=DEFAULT_K, types=None, counties=None):
+        """
+        Find the k nearest facilities to each query point in one tree query.
+        Args:
+            points (np.ndarray): (m, 2) array of (latitude, longitude) in degrees
+            k (int): Facilities per point
+            types: Facility type or list of types to keep (case-insensitive)
+            counties: County or list of counties to keep (case-insensitive)
+        Returns:
+            tuple: (rows, distances_km), both (m, k') with k' = min(k, matching facilities)
+        """
+        points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+        if not (np.all(np.abs(points[:, 0]) <= 90) and np.all(np.abs(points[:, 1]) <= 180)):
+            raise ValueError('latitude must be within [-90, 90] and longitude within [-180, 180]')
+        k = int(k)
+        if not 1 <= k <= MAX_K:
+            raise ValueError(f'k must be between 1 and {MAX_K}')
+
+        tree, rows = self._subset(as_filter(types), as_filter(counties))
+        if tree is None:
+            empty = np.empty((len(points), 0))
+            return empty.astype(np.intp), empty
+        k = min(k, len(rows) if rows is not None else len(self))
+        distances, idx = tree.query(np.radians(points), k=k)
+        if rows is not None:
+            idx = rows[idx]
+        return idx, distances * EARTH_RADIUS_KM
+
+    def nearest(self, latitude, longitude, k=DEFAULT_K, types=None, counties=None):
+        """Return the k nearest facilities to one point, nearest first."""
+        return self.nearest_batch([(latitude, longitude)], k, types, counties)[0]
+
+    def nearest_batch(self, points, k=DEFAULT_K, types=None, counties=None):
+        """Return one list of the k nearest facilities per (latitude, longitude) point."""
+        rows, distances = self.nearest_rows(points, k, types, counties)
+        return [
+            [self.record(i, d) for i, d in zip(point_rows, point_distances)]
+            for point_rows, point_distances in zip(rows, distances)
+        ]
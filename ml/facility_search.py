@@ -0,0 +1,212 @@
+"""
+Search-as-you-type text index over the facility names and locations.
+
+Every word of Facility_N, Location, Sub_County and Nearest_To is normalized
+(case, accents, punctuation and stray whitespace removed) into a sorted
+vocabulary whose postings are stored back to back in one array. A prefix trie
+maps each prefix to the contiguous range of words that start with it, so the
+postings of a prefix are a single slice. Trigram inverted lists over the
+vocabulary add typo-tolerant matches. Each query word must match (as a whole
+word, a prefix or a fuzzy match) in some field; facilities are ranked by the
+summed match scores, weighted by field.
+"""
+from collections import defaultdict
+import re
+import unicodedata
+
+import numpy as np
+
+from facilities import as_filter
+
+# Searched fields and their weight in the ranking
+SEARCH_FIELDS = (('name', 1.0), ('location', 0.7), ('sub_county', 0.7), ('nearest_to', 0.5))
+
+EXACT_SCORE = 3.0
+PREFIX_SCORE = 2.0
+FUZZY_SCORE = 1.5
+
+# Smallest Dice similarity between trigram sets for a fuzzy match
+MIN_SIMILARITY = 0.5
+MIN_FUZZY_LENGTH = 3
+
+DEFAULT_PER_PAGE = 20
+MAX_PER_PAGE = 100
+
+
+def normalize_text(text):
+    """Lower-case ASCII words separated by single spaces."""
+    text = unicodedata.normalize('NFKD', str(text)).encode('ascii', 'ignore').decode('ascii').lower()
+    text = re.sub(r"['`]", '', text)
+    return ' '.join(re.sub(r'[^0-9a-z]+', ' ', text).split())
+
+
+def trigrams(word):
+    padded = f' {word} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class PrefixTrie:
+    """Maps every prefix of a sorted vocabulary to the [start, end) range of words sharing it."""
+
+    def __init__(self, vocabulary):
+        """
+        Args:
+            vocabulary (list): Words in sorted order
+        """
+        self.root = {}
+        # Each node is [children, start, end]
+        for i, word in enumerate(vocabulary):
+            children = self.root
+            for ch in word:
+                node = children.get(ch)
+                if node is None:
+                    node = children[ch] = [{}, i, i + 1]
+                node[2] = i + 1
+                children = node[0]
+
+    def range(self, prefix):
+        """Return (start, end) of the words starting with prefix; start == end if there are none."""
+        children, node = self.root, None
+        for ch in prefix:
+            node = children.get(ch)
+            if node is None:
+                return 0, 0
+            children = node[0]
+        return (node[1], node[2]) if node is not None else (0, 0)
+
+
+class FacilitySearchIndex:
+    """Ranked, filtered text search over a FacilityIndex."""
+
+    def __init__(self, facility_index):
+        """
+        Args:
+            facility_index (FacilityIndex): Facility columns and records to search
+        """
+        self.facilities = facility_index
+        n_fields = len(SEARCH_FIELDS)
+        self.field_weights = np.array([weight for _, weight in SEARCH_FIELDS])
+
+        # word -> postings encoded as facility * n_fields + field
+        postings = defaultdict(set)
+        for field, (key, _) in enumerate(SEARCH_FIELDS):
+            for i, value in enumerate(facility_index.columns[key]):
+                for word in normalize_text(value).split():
+                    postings[word].add(i * n_fields + field)
+
+        self.vocabulary = sorted(postings)
+        lists = [np.array(sorted(postings[word]), dtype=np.int64) for word in self.vocabulary]
+        self.offsets = np.concatenate([[0], np.cumsum([len(p) for p in lists])])
+        self.postings = np.concatenate(lists) if lists else np.empty(0, dtype=np.int64)
+        self.trie = PrefixTrie(self.vocabulary)
+
+        grams = defaultdict(list)
+        self.trigram_counts = np.empty(len(self.vocabulary), dtype=np.int64)
+        for word_id, word in enumerate(self.vocabulary):
+            word_grams = trigrams(word)
+            self.trigram_counts[word_id] = len(word_grams)
+            for gram in word_grams:
+                grams[gram].append(word_id)
+        self.trigram_index = {gram: np.array(ids, dtype=np.int64) for gram, ids in grams.items()}
+
+        # Integer codes make the type and county filters cheap vector comparisons
+        self.type_values, self.type_codes = np.unique(facility_index.type_keys.astype(str), return_inverse=True)
+        self.county_values, self.county_codes = np.unique(facility_index.county_keys.astype(str), return_inverse=True)
+        self.sort_names = np.array([normalize_text(name) for name in facility_index.columns['name']], dtype=object)
+        self.name_order = np.argsort(self.sort_names, kind='stable')
+
+    def _word_postings(self, start, end):
+        return self.postings[self.offsets[start]:self.offsets[end]]
+
+    def _add_matches(self, scores, postings, score):
+        """Keep, per facility, the best score of a match found in postings."""
+        n_fields = len(SEARCH_FIELDS)
+        np.maximum.at(scores, postings // n_fields, score * self.field_weights[postings % n_fields])
+
+    def term_scores(self, term):
+        """Best match score of one query word for every facility (0 where it does not match)."""
+        scores = np.zeros(len(self.facilities))
+        start, end = self.trie.range(term)
+        if start < end:
+            self._add_matches(scores, self._word_postings(start, end), PREFIX_SCORE)
+            if self.vocabulary[start] == term:
+                self._add_matches(scores, self._word_postings(start, start + 1), EXACT_SCORE)
+
+        if len(term) >= MIN_FUZZY_LENGTH:
+            term_grams = trigrams(term)
+            lists = [self.trigram_index[g] for g in term_grams if g in self.trigram_index]
+            if lists:
+                overlap = np.bincount(np.concatenate(lists), minlength=len(self.vocabulary))
+                similarity = 2 * overlap / (len(term_grams) + self.trigram_counts)
+                for word_id in np.flatnonzero(similarity >= MIN_SIMILARITY):
+                    self._add_matches(
+                        scores, self._word_postings(word_id, word_id + 1), FUZZY_SCORE * similarity[word_id]
+                    )
+        return scores
+
+    def filter_mask(self, types=None, counties=None):
+        """Boolean mask of facilities matching the type and county filters, or None for no filter."""
+        mask = None
+        for values, keys, codes in ((as_filter(types), self.type_values, self.type_codes),
+                                    (as_filter(counties), self.county_values, self.county_codes)):
+            if values:
+                wanted = np.flatnonzero(np.isin(keys, values))
+                matches = np.isin(codes, wanted)
+                mask = matches if mask is None else mask & matches
+        return mask
+
+    def search(self, query='', types=None, counties=None, page=1, per_page=DEFAULT_PER_PAGE):
+        """
+        Rank facilities against a free-text query.
+        Args:
+            query (str): Words to match; the last one may be a partial word
+            types: Facility type or list of types to keep (case-insensitive)
+            counties: County or list of counties to keep (case-insensitive)
+            page (int): 1-based result page
+            per_page (int): Results per page
+        Returns:
+            dict: {'query', 'total', 'page', 'per_page', 'results'}, results carrying a 'score'
+        """
+        page, per_page = int(page), int(per_page)
+        if page < 1:
+            raise ValueError('page must be at least 1')
+        if not 1 <= per_page <= MAX_PER_PAGE:
+            raise ValueError(f'per_page must be between 1 and {MAX_PER_PAGE}')
+
+        terms = normalize_text(query).split()
+        mask = self.filter_mask(types, counties)
+        if not terms and mask is None:
+            raise ValueError('give a query or at least one type or county filter')
+
+        if terms:
+            total_scores = np.zeros(len(self.facilities))
+            matched = np.ones(len(self.facilities), dtype=bool) if mask is None else mask.copy()
+            for term in terms:
+                scores = self.term_scores(term)
+                matched &= scores > 0
+                total_scores += scores
+            hits = np.flatnonzero(matched)
+            # Highest score first, then shorter and alphabetically earlier names
+            order = np.lexsort((
+                self.sort_names[hits].astype(str),
+                [len(name) for name in self.sort_names[hits]],
+                -total_scores[hits],
+            ))
+            ranked, ranked_scores = hits[order], total_scores[hits][order]
+        else:
+            ranked = self.name_order[mask[self.name_order]]
+            ranked_scores = np.zeros(len(ranked))
+
+        first = (page - 1) * per_page
+        results = []
+        for i, score in zip(ranked[first:first + per_page], ranked_scores[first:first + per_page]):
+            record = self.facilities.record(i)
+            record['score'] = round(float(score), 4)
+            results.append(record)
+        return {
+            'query': query,
+            'total': int(len(ranked)),
+            'page': page,
+            'per_page': per_page,
+            'results': results,
+        }
@@ -0,0 +1,295 @@
+"""
+Load test for the prediction API.
+
+Patient payloads are synthesized from the training data: real rows are
+resampled, continuous values jittered within the observed range and a share of
+fields dropped, like partially filled forms. They are generated up front, then
+replayed against /predict and /predict/batch by a pool of keep-alive clients.
+Throughput, latency percentiles and error rates are written as JSON with
+stable keys, so runs from two commits can be diffed or compared directly:
+
+    python loadtest.py --in-process --output before.json
+    python loadtest.py --url http://localhost:8000 --concurrency 32 --compare before.json
+
+--in-process serves server.py on a local port inside this process, which is
+convenient but shares the GIL with the clients; point --url at a separately
+started server (for example prefork.py) for numbers closer to production.
+With --compare the exit status is 1 when p95 or p99 latency grows, or
+throughput drops, by more than --max-regression.
+"""
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+import http.client
+import itertools
+import json
+import os
+import platform
+import subprocess
+import sys
+import threading
+import time
+from urllib.parse import urlsplit
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'src'))
+from features import RAW_FEATURES, encode_series
+from ingest import load_dataset
+
+ENDPOINTS = {
+    'predict': '/predict',
+    'predict_batch': '/predict/batch',
+}
+
+# Relative jitter applied to continuous values, as a fraction of the column's standard deviation
+JITTER = 0.1
+
+
+class PayloadGenerator:
+    """Samples patient records whose values follow the training data."""
+
+    def __init__(self, df, missing_rate=0.1, seed=0):
+        """
+        Args:
+            df (pd.DataFrame): Training sheet with the raw feature columns
+            missing_rate (float): Probability that any one field is left out of a record
+            seed (int): Random seed; the same seed yields the same payloads
+        """
+        df.columns = df.columns.str.strip()
+        raw_features = [raw for raw in RAW_FEATURES if raw.column in df.columns]
+        self.keys = [raw.key for raw in raw_features]
+        self.values = np.column_stack([
+            encode_series(df[raw.column], raw.encoding) if raw.encoding is not None
+            else pd.to_numeric(df[raw.column], errors='coerce').astype('float64')
+            for raw in raw_features
+        ])
+        # Categorical and integer-valued columns are resampled as is, continuous ones jittered
+        observed = np.where(np.isnan(self.values), 0.0, self.values)
+        self.continuous = np.array([
+            raw.encoding is None and not np.allclose(observed[:, j], np.round(observed[:, j]))
+            for j, raw in enumerate(raw_features)
+        ])
+        self.low = np.nanmin(self.values, axis=0)
+        self.high = np.nanmax(self.values, axis=0)
+        self.scale = np.nan_to_num(np.nanstd(self.values, axis=0)) * JITTER
+        self.missing_rate = missing_rate
+        self.rng = np.random.default_rng(seed)
+
+    def records(self, n):
+        """Generate n records as request dicts keyed by the API field names."""
+        rows = self.values[self.rng.integers(0, len(self.values), size=n)]
+        noise = self.rng.normal(size=rows.shape) * self.scale
+        rows = np.where(self.continuous, np.clip(rows + noise, self.low, self.high), rows)
+        keep = (self.rng.random(rows.shape) >= self.missing_rate) & ~np.isnan(rows)
+        return [
+            {key: round(float(value), 3) for key, value, k in zip(self.keys, row, mask) if k}
+            for row, mask in zip(rows, keep)
+        ]
+
+
+def start_local_server(host='127.0.0.1'):
+    """Serve the Flask app from a background thread on a free port; returns its base URL."""
+    from werkzeug.serving import make_server
+    import server
+
+    httpd = make_server(host, 0, server.app, threaded=True)
+    threading.Thread(target=httpd.serve_forever, name='loadtest-server', daemon=True).start()
+    return f'http://{host}:{httpd.server_port}'
+
+
+class Client:
+    """One keep-alive HTTP connection that times each request."""
+
+    def __init__(self, base_url):
+        parts = urlsplit(base_url)
+        self.host = parts.hostname
+        self.port = parts.port or 80
+        self.conn = None
+
+    def post(self, path, body):
+        """Return (status, seconds); status is None when the request failed outright."""
+        start = time.perf_counter()
+        try:
+            if self.conn is None:
+                self.conn = http.client.HTTPConnection(self.host, self.port, timeout=30)
+            self.conn.request('POST', path, body=body, headers={'Content-Type': 'application/json'})
+            response = self.conn.getresponse()
+            response.read()
+            status = response.status
+        except (OSError, http.client.HTTPException):
+            self.conn.close()
+            self.conn = None
+            status = None
+        return status, time.perf_counter() - start
+
+
+def run_endpoint(base_url, path, bodies, concurrency, warmup=0):
+    """
+    Send every body once from `concurrency` clients and summarize the run.
+    Args:
+        base_url (str): Server base URL
+        path (str): Endpoint path
+        bodies (list): Pre-serialized JSON request bodies
+        concurrency (int): Number of clients sending in parallel
+        warmup (int): Leading bodies sent first and left out of the results
+    Returns:
+        dict: Request counts, throughput and latency percentiles
+    """
+    clients = [Client(base_url) for _ in range(concurrency)]
+    for client, body in zip(itertools.cycle(clients), bodies[:warmup]):
+        client.post(path, body)
+
+    bodies = bodies[warmup:]
+    statuses = [None] * len(bodies)
+    latencies = np.empty(len(bodies))
+    next_index = itertools.count()
+
+    def drive(client):
+        # itertools.count is atomic under the GIL, so every body is sent exactly once
+        for i in next_index:
+            if i >= len(bodies):
+                return
+            statuses[i], latencies[i] = client.post(path, bodies[i])
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(drive, clients))
+    elapsed = time.perf_counter() - start
+
+    errors = sum(1 for status in statuses if status != 200)
+    status_counts = {}
+    for status in statuses:
+        key = str(status) if status is not None else 'failed'
+        status_counts[key] = status_counts.get(key, 0) + 1
+    latency_ms = latencies * 1000
+    return {
+        'requests': len(bodies),
+        'errors': errors,
+        'error_rate': round(errors / len(bodies), 6) if bodies else 0.0,
+        'status_codes': dict(sorted(status_counts.items())),
+        'duration_s': round(elapsed, 3),
+        'throughput_rps': round(len(bodies) / elapsed, 2) if elapsed else 0.0,
+        'latency_ms': {
+            'mean': round(float(latency_ms.mean()), 3),
+            'p50': round(float(np.percentile(latency_ms, 50)), 3),
+            'p95': round(float(np.percentile(latency_ms, 95)), 3),
+            'p99': round(float(np.percentile(latency_ms, 99)), 3),
+            'max': round(float(latency_ms.max()), 3),
+        } if len(bodies) else {},
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)), check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(baseline, current, max_regression):
+    """Print per-endpoint changes against a baseline report; returns the regressions found."""
+    regressions = []
+    print(f"{'endpoint':<16}{'metric':<16}{'baseline':>12}{'current':>12}{'change':>10}")
+    for name, result in current['endpoints'].items():
+        before = baseline.get('endpoints', {}).get(name)
+        if before is None:
+            continue
+        checks = [
+            ('p50 ms', before['latency_ms']['p50'], result['latency_ms']['p50'], False),
+            ('p95 ms', before['latency_ms']['p95'], result['latency_ms']['p95'], True),
+            ('p99 ms', before['latency_ms']['p99'], result['latency_ms']['p99'], True),
+            ('throughput rps', before['throughput_rps'], result['throughput_rps'], True),
+            ('error rate', before['error_rate'], result['error_rate'], False),
+        ]
+        for metric, old, new, gated in checks:
+            change = (new - old) / old if old else 0.0
+            print(f"{name:<16}{metric:<16}{old:>12.3f}{new:>12.3f}{change:>+10.1%}")
+            # Latency regresses upwards, throughput downwards
+            worse = -change if metric == 'throughput rps' else change
+            if gated and worse > max_regression:
+                regressions.append(f"{name} {metric}: {old:.3f} -> {new:.3f}")
+        if result['error_rate'] > before['error_rate']:
+            regressions.append(f"{name} error rate: {before['error_rate']} -> {result['error_rate']}")
+    return regressions
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Load test the PCOS prediction API.")
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument('--url', help="base URL of a running server, e.g. http://localhost:8000")
+    target.add_argument('--in-process', action='store_true', help="serve server.py from this process")
+    parser.add_argument('--endpoints', nargs='+', choices=sorted(ENDPOINTS), default=sorted(ENDPOINTS))
+    parser.add_argument('--requests', type=int, default=2000, help="measured requests per endpoint")
+    parser.add_argument('--warmup', type=int, default=100, help="unmeasured requests sent first")
+    parser.add_argument('--concurrency', type=int, default=8, help="clients sending in parallel")
+    parser.add_argument('--batch-size', type=int, default=100, help="records per /predict/batch request")
+    parser.add_argument('--missing-rate', type=float, default=0.1, help="share of fields left out of a record")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help="write the JSON report here instead of stdout")
+    parser.add_argument('--compare', help="baseline JSON report to compare against")
+    parser.add_argument('--max-regression', type=float, default=0.1,
+                        help="tolerated relative p95/p99 latency increase or throughput drop")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    generator = PayloadGenerator(load_dataset(), missing_rate=args.missing_rate, seed=args.seed)
+    base_url = start_local_server() if args.in_process else args.url.rstrip('/')
+
+    report = {
+        'config': {
+            'concurrency': args.concurrency,
+            'requests': args.requests,
+            'warmup': args.warmup,
+            'batch_size': args.batch_size,
+            'missing_rate': args.missing_rate,
+            'seed': args.seed,
+            'target': 'in-process' if args.in_process else base_url,
+        },
+        'environment': {
+            'commit': git_commit(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'inference_engine': os.environ.get('PCOS_INFERENCE_ENGINE', 'catboost'),
+        },
+        'endpoints': {},
+    }
+    n_bodies = args.warmup + args.requests
+    for name in args.endpoints:
+        # Payloads are generated and serialized before the clock starts
+        if name == 'predict_batch':
+            bodies = [json.dumps(generator.records(args.batch_size)) for _ in range(n_bodies)]
+        else:
+            bodies = [json.dumps(record) for record in generator.records(n_bodies)]
+        result = run_endpoint(base_url, ENDPOINTS[name], bodies, args.concurrency, args.warmup)
+        if name == 'predict_batch':
+            result['records_per_s'] = round(result['throughput_rps'] * args.batch_size, 2)
+        report['endpoints'][name] = result
+        print(f"{name}: {result['throughput_rps']} req/s, p50 {result['latency_ms'].get('p50')} ms, "
+              f"p99 {result['latency_ms'].get('p99')} ms, {result['errors']} errors", file=sys.stderr)
+
+    text = json.dumps(report, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text + '\n')
+    else:
+        print(text)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare(baseline, report, args.max_regression)
+        if regressions:
+            print("Regressions:\n  " + "\n  ".join(regressions), file=sys.stderr)
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,407 @@
+"""
+In-process metrics in the Prometheus text format, plus an optional sampling profiler.
+
+Counters and histograms are kept in plain dicts behind a lock, so recording a
+value costs a few dictionary operations on the request path. REGISTRY.render()
+produces the text served at /metrics.
+
+Under the pre-forking launcher every worker has its own registry. After
+enable_multiprocess(directory) each worker writes a snapshot of its values to
+that directory every second, and render() merges the snapshots of all workers:
+counters and histograms are summed (including workers that have exited, so
+totals never go backwards), gauges take the largest value, and collector
+series of the live workers are summed.
+
+The sampling profiler records the stack of the thread handling a request at a
+fixed interval and appends the samples in folded format ("a;b;c count"), which
+flamegraph.pl, speedscope and inferno read directly. Set PCOS_PROFILE_RATE to
+the fraction of requests to profile (0 turns it off).
+"""
+from bisect import bisect_left
+from collections import Counter as StackCounter
+from contextlib import contextmanager
+import json
+import math
+import os
+import random
+import sys
+import threading
+import time
+
+PROFILE_RATE = float(os.environ.get('PCOS_PROFILE_RATE', 0))
+PROFILE_INTERVAL_MS = float(os.environ.get('PCOS_PROFILE_INTERVAL_MS', 1))
+PROFILE_DIR = os.environ.get(
+    'PCOS_PROFILE_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'logs', 'profiles')
+)
+
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024, 4096)
+
+
+def _label_text(labelnames, values, extra=()):
+    pairs = list(zip(labelnames, values)) + list(extra)
+    if not pairs:
+        return ''
+    escaped = (str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, v in pairs)
+    return '{' + ','.join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + '}'
+
+
+class Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        return tuple(str(labels.get(name, '')) for name in self.labelnames)
+
+    def render(self, values=None):
+        """Exposition lines for this process's values, or for merged values from several processes."""
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}']
+        with self._lock:
+            lines.extend(self._samples(self._values if values is None else values))
+        return lines
+
+    def snapshot(self):
+        """JSON-serializable copy of the values: a list of [label values, value] pairs."""
+        with self._lock:
+            return [[list(key), value] for key, value in self._values.items()]
+
+    def merge(self, snapshots):
+        """Combine the snapshots of several processes into one values dict."""
+        merged = {}
+        for snapshot in snapshots:
+            for key, value in snapshot:
+                key = tuple(key)
+                merged[key] = value if key not in merged else self._combine(merged[key], value)
+        return merged
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def __init__(self, name, documentation, labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        self._values = {}
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    @staticmethod
+    def _combine(a, b):
+        return a + b
+
+    def _samples(self, values):
+        return [f'{self.name}{_label_text(self.labelnames, key)} {value}' for key, value in values.items()]
+
+
+class Gauge(Counter):
+    kind = 'gauge'
+
+    def set(self, value, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    @staticmethod
+    def _combine(a, b):
+        return max(a, b)
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+        self._values = {}
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        # Index of the first bucket whose upper bound is >= value; len(buckets) means +Inf
+        i = bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][i] += 1
+            state[1] += value
+            state[2] += 1
+
+    def snapshot(self):
+        with self._lock:
+            return [[list(key), [list(counts), total, n]] for key, (counts, total, n) in self._values.items()]
+
+    @staticmethod
+    def _combine(a, b):
+        return [[x + y for x, y in zip(a[0], b[0])], a[1] + b[1], a[2] + b[2]]
+
+    def _samples(self, values):
+        lines = []
+        for key, (counts, total, n) in values.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), counts):
+                cumulative += count
+                le = '+Inf' if bound == math.inf else repr(bound)
+                lines.append(f'{self.name}_bucket{_label_text(self.labelnames, key, [("le", le)])} {cumulative}')
+            lines.append(f'{self.name}_sum{_label_text(self.labelnames, key)} {total}')
+            lines.append(f'{self.name}_count{_label_text(self.labelnames, key)} {n}')
+        return lines
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _merge_collected(line_lists):
+    """Sum identical collector series across processes, keeping the first HELP/TYPE lines."""
+    merged = {}
+    for lines in line_lists:
+        for line in lines:
+            if line.startswith('#'):
+                merged.setdefault(line, None)
+                continue
+            series, value = line.rsplit(' ', 1)
+            merged[series] = merged.get(series, 0) + float(value)
+    return [
+        line if value is None else f'{line} {int(value) if value.is_integer() else value}'
+        for line, value in merged.items()
+    ]
+
+
+class Registry:
+    """Metrics plus callbacks producing extra exposition lines at render time."""
+
+    def __init__(self):
+        self.metrics = []
+        self.collectors = []
+        self.states = {}
+        self.multiprocess_dir = None
+        self._flusher = None
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def add_collector(self, collect):
+        """collect() returns a list of exposition lines (with their HELP/TYPE headers)."""
+        self.collectors.append(collect)
+
+    def add_state(self, name, get_state):
+        """Register a JSON-serializable per-process state that other workers can read via process_states."""
+        self.states[name] = get_state
+
+    def enable_multiprocess(self, directory, flush_seconds=1.0):
+        """
+        Share this process's values with the other workers through snapshot files in directory.
+        Called in a freshly forked worker: counts inherited from the parent are the parent's to report.
+        """
+        for metric in self.metrics:
+            if metric.kind != 'gauge':
+                with metric._lock:
+                    metric._values.clear()
+        self.multiprocess_dir = directory
+        self._flusher = threading.Thread(
+            target=self._flush_loop, args=(flush_seconds,), name='pcos-metrics-flush', daemon=True
+        )
+        self._flusher.start()
+
+    def _flush_loop(self, interval):
+        while True:
+            time.sleep(interval)
+            self.flush()
+
+    def flush(self, include_states=True):
+        """Write this process's snapshot atomically; a no-op outside multiprocess mode."""
+        if self.multiprocess_dir is None:
+            return
+        snapshot = {
+            'pid': os.getpid(),
+            'metrics': {metric.name: metric.snapshot() for metric in self.metrics},
+            'collected': [line for collect in self.collectors for line in collect()],
+            'states': {name: get_state() for name, get_state in self.states.items()} if include_states else {},
+        }
+        path = os.path.join(self.multiprocess_dir, f'{os.getpid()}.json')
+        tmp_path = f'{path}.{threading.get_ident()}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(snapshot, f)
+        os.replace(tmp_path, path)
+
+    def _snapshots(self):
+        self.flush()
+        snapshots = []
+        for name in os.listdir(self.multiprocess_dir):
+            if not name.endswith('.json'):
+                continue
+            try:
+                with open(os.path.join(self.multiprocess_dir, name)) as f:
+                    snapshots.append(json.load(f))
+            except (OSError, ValueError):
+                continue
+        return snapshots
+
+    def process_states(self, name):
+        """The named state of every live process (just this one outside multiprocess mode)."""
+        if self.multiprocess_dir is None:
+            return [self.states[name]()]
+        return [
+            snapshot['states'][name] for snapshot in self._snapshots()
+            if name in snapshot.get('states', {}) and _pid_alive(snapshot['pid'])
+        ]
+
+    def render(self):
+        lines = []
+        if self.multiprocess_dir is None:
+            for metric in self.metrics:
+                lines.extend(metric.render())
+            for collect in self.collectors:
+                lines.extend(collect())
+        else:
+            snapshots = self._snapshots()
+            for metric in self.metrics:
+                lines.extend(metric.render(metric.merge(
+                    snapshot['metrics'].get(metric.name, []) for snapshot in snapshots
+                )))
+            # Collectors describe current state, so only processes still running count
+            lines.extend(_merge_collected(
+                snapshot['collected'] for snapshot in snapshots if _pid_alive(snapshot['pid'])
+            ))
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+REQUESTS = REGISTRY.register(Counter(
+    'pcos_requests_total', 'HTTP requests by endpoint, method and status code', ('endpoint', 'method', 'status')
+))
+ERRORS = REGISTRY.register(Counter(
+    'pcos_request_errors_total', 'Unhandled errors by endpoint and exception type', ('endpoint', 'exception')
+))
+REQUEST_SECONDS = REGISTRY.register(Histogram(
+    'pcos_request_duration_seconds', 'End-to-end request latency', ('endpoint',)
+))
+PHASE_SECONDS = REGISTRY.register(Histogram(
+    'pcos_phase_duration_seconds',
+    'Latency of request phases: parse, features, transform, predict, serialize', ('phase',)
+))
+BATCH_SIZE = REGISTRY.register(Histogram(
+    'pcos_batch_size', 'Records per batch request', ('endpoint',), buckets=BATCH_SIZE_BUCKETS
+))
+MODEL_LOAD_SECONDS = REGISTRY.register(Gauge(
+    'pcos_model_load_seconds', 'Time taken to load the model and its preprocessing state', ('version', 'engine')
+))
+MODEL_RELOADS = REGISTRY.register(Counter(
+    'pcos_model_reloads_total', 'Hot reloads of a new registry version by result', ('result',)
+))
+
+
+MEMORY_FIELDS = ('Rss', 'Pss', 'Shared_Clean', 'Shared_Dirty', 'Private_Clean', 'Private_Dirty')
+
+
+def process_memory(pid='self'):
+    """
+    Resident memory of a process from /proc/<pid>/smaps_rollup, in bytes (Linux only).
+    Returns:
+        dict: rss, pss (resident memory with shared pages split between their users),
+              shared and private bytes, or None when the kernel does not provide them
+    """
+    try:
+        with open(f'/proc/{pid}/smaps_rollup') as f:
+            fields = dict(line.split(':', 1) for line in f if ':' in line and not line[0].isdigit())
+    except OSError:
+        return None
+    kb = {name: int(fields.get(name, '0 kB').split()[0]) * 1024 for name in MEMORY_FIELDS}
+    return {
+        'rss': kb['Rss'],
+        'pss': kb['Pss'],
+        'shared': kb['Shared_Clean'] + kb['Shared_Dirty'],
+        'private': kb['Private_Clean'] + kb['Private_Dirty'],
+    }
+
+
+def memory_metrics():
+    """Expose this process's memory so every worker of a pre-forked server reports its own."""
+    memory = process_memory()
+    if memory is None:
+        return []
+    pid = os.getpid()
+    lines = []
+    for name, value in memory.items():
+        lines += [f'# HELP pcos_process_{name}_bytes Process {name} memory',
+                  f'# TYPE pcos_process_{name}_bytes gauge',
+                  f'pcos_process_{name}_bytes{{pid="{pid}"}} {value}']
+    return lines
+
+
+REGISTRY.add_collector(memory_metrics)
+
+
+@contextmanager
+def timed(phase):
+    """Record the duration of the enclosed block as one observation of a phase."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        PHASE_SECONDS.observe(time.perf_counter() - start, phase=phase)
+
+
+def frame_label(code):
+    return f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})'
+
+
+class SamplingProfiler:
+    """Samples one thread's stack every interval until stopped, then appends folded stacks to a file."""
+
+    def __init__(self, thread_id, path, interval_ms=PROFILE_INTERVAL_MS):
+        self.thread_id = thread_id
+        self.path = path
+        self.interval = interval_ms / 1000
+        self.stacks = StackCounter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='pcos-profiler', daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            stack = []
+            while frame is not None:
+                stack.append(frame_label(frame.f_code))
+                frame = frame.f_back
+            self.stacks[';'.join(reversed(stack))] += 1
+
+    _write_lock = threading.Lock()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        if not self.stacks:
+            return
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with self._write_lock, open(self.path, 'a') as f:
+            for stack, count in self.stacks.items():
+                f.write(f'{stack} {count}\n')
+
+
+def maybe_profile(name):
+    """Start a profiler for the current thread for a PROFILE_RATE share of calls, else return None."""
+    if PROFILE_RATE <= 0 or random.random() >= PROFILE_RATE:
+        return None
+    path = os.path.join(PROFILE_DIR, f'{name}.folded')
+    return SamplingProfiler(threading.get_ident(), path).start()
@@ -0,0 +1,374 @@
+"""
+Model loading and prediction helpers shared by the Flask and ASGI servers.
+
+The serving model, its preprocessing state and feature pipeline are held in one
+immutable ModelBundle. start_model_watcher() polls the model registry and swaps
+in a new bundle once it has been verified and warmed up. Each prediction reads
+the bundle reference once, and only versions that parse requests the same way
+are hot-swapped, so in-flight requests finish without errors.
+"""
+from bisect import bisect_right
+from dataclasses import dataclass
+from types import MappingProxyType
+import joblib
+import logging
+import numpy as np
+import os
+import sys
+import threading
+import time
+
+from metrics import MODEL_LOAD_SECONDS, MODEL_RELOADS, timed
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'src'))
+from features import FeaturePipeline, Preprocessor
+from prediction_cache import PredictionCache, file_version, merge_stats
+import registry
+from tree_engine import ObliviousTreeEngine
+
+# Risk stages; a probability p falls in stage i when STAGE_THRESHOLDS[i-1] <= p < STAGE_THRESHOLDS[i]
+STAGE_THRESHOLDS = (0.3, 0.7)
+STAGES = ('Low Risk', 'Moderate Risk', 'High Risk')
+
+STAGE_RECOMMENDATIONS = (
+    (),
+    (
+        "Schedule a check-up with your healthcare provider within the next month.",
+        "Monitor your symptoms and keep a health diary.",
+    ),
+    (
+        "Schedule an immediate consultation with a gynecologist.",
+        "Consider comprehensive hormone testing.",
+    ),
+)
+
+# Contributions above this mark a feature as high impact
+HIGH_IMPACT_THRESHOLD = 0.3
+
+# Number of per-patient contributions returned when explanations are requested
+DEFAULT_TOP_K = 5
+
+
+@dataclass(frozen=True)
+class ModelProfile:
+    """Request-independent parts of a prediction, computed once per loaded model."""
+    feature_names: tuple
+    feature_contributions: MappingProxyType
+    stage_thresholds: tuple
+    stages: tuple
+    recommendations: tuple  # one tuple of recommendation strings per stage
+
+
+def feature_recommendation(feature):
+    """Return the lifestyle recommendation for a high impact feature, if any."""
+    if 'Weight gain' in feature:
+        return "Consider consulting with a nutritionist and developing a balanced meal plan."
+    elif 'Exercise' in feature:
+        return "Aim for at least 150 minutes of moderate exercise per week."
+    elif 'Fast food' in feature:
+        return "Reduce processed food intake and focus on whole, nutrient-rich foods."
+    elif 'Hair' in feature or 'Skin' in feature:
+        return "Consider consulting with a dermatologist for specialized skin and hair care advice."
+    return None
+
+
+def build_profile(model, feature_names):
+    """Precompute feature contributions and per-stage recommendations for a model."""
+    feature_contributions = {
+        name: float(abs(imp))
+        for name, imp in zip(feature_names, model.feature_importances_)
+    }
+    
+    # Feature-specific recommendations depend only on the global importances
+    feature_recommendations = []
+    for feature, contribution in feature_contributions.items():
+        if contribution > HIGH_IMPACT_THRESHOLD:
+            recommendation = feature_recommendation(feature)
+            if recommendation is not None:
+                feature_recommendations.append(recommendation)
+    
+    return ModelProfile(
+        feature_names=tuple(feature_names),
+        feature_contributions=MappingProxyType(feature_contributions),
+        stage_thresholds=STAGE_THRESHOLDS,
+        stages=STAGES,
+        recommendations=tuple(
+            stage_recs + tuple(feature_recommendations)
+            for stage_recs in STAGE_RECOMMENDATIONS
+        ),
+    )
+
+
+# 'catboost' unpickles the full model; 'compiled' uses the exported trees and never imports catboost;
+# 'ensemble' averages the cross-validation fold models with the same catboost-free evaluator
+# (cheap per request, but several times slower than 'catboost' on large batches; see the README)
+INFERENCE_ENGINE = os.environ.get('PCOS_INFERENCE_ENGINE', 'catboost')
+
+MODEL_FILES = {
+    'catboost': 'pcos_model.joblib',
+    'compiled': 'pcos_model.trees.npz',
+    'ensemble': 'pcos_model.ensemble.npz',
+}
+
+# Models are served from the registry's CURRENT version, or from ml/models before anything is published
+MODEL_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'models')
+REGISTRY_DIR = os.environ.get('PCOS_REGISTRY_DIR', registry.DEFAULT_REGISTRY_DIR)
+
+# Seconds between checks of the registry for a new version; 0 disables hot reload
+RELOAD_SECONDS = float(os.environ.get('PCOS_MODEL_RELOAD_SECONDS', 5))
+
+# Rows scored by a new version before it takes traffic
+WARMUP_ROWS = 64
+
+def load_model(model_dir, engine=INFERENCE_ENGINE):
+    """Load the prediction model with the requested inference engine."""
+    if engine not in MODEL_FILES:
+        raise ValueError(f"unknown inference engine: {engine}")
+    path = os.path.join(model_dir, MODEL_FILES[engine])
+    if engine != 'catboost':
+        return ObliviousTreeEngine.load(path)
+    return joblib.load(path)
+
+
+@dataclass(frozen=True)
+class ModelBundle:
+    """A model together with the preprocessing state and pipeline it was trained with."""
+    model: object
+    preprocessor: object
+    pipeline: FeaturePipeline
+    profile: ModelProfile
+    version: str
+    engine: str
+    source: str
+    metrics: dict
+    load_seconds: float
+    loaded_at: float
+
+    def prepare_matrix(self, X):
+        """Turn a matrix of raw input rows into the model's imputed and clipped feature matrix."""
+        X = self.pipeline.transform(X)
+        if self.preprocessor is not None:
+            X = self.preprocessor.transform(X)
+        return X
+
+    def predict_risk(self, X):
+        """Build features for a matrix of raw input rows and return the positive-class probability for each."""
+        with timed('transform'):
+            X = self.prepare_matrix(X)
+        with timed('predict'):
+            return self.model.predict_proba(X)[:, 1]
+
+    def info(self):
+        return {
+            'version': self.version,
+            'engine': self.engine,
+            'source': self.source,
+            'loaded_at': time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(self.loaded_at)),
+            'load_seconds': self.load_seconds,
+            'features': list(self.profile.feature_names),
+            'metrics': self.metrics,
+        }
+
+
+def load_bundle(model_dir, version=None, engine=INFERENCE_ENGINE):
+    """
+    Load everything needed to serve predictions from one artifact directory.
+    Args:
+        model_dir (str): Registry version directory, or the flat ml/models directory
+        version (str): Registry version name; None derives a content hash from the files
+        engine (str): Inference engine, a key of MODEL_FILES
+    Returns:
+        ModelBundle: The loaded bundle
+    """
+    load_start = time.perf_counter()
+    metrics = {}
+    if version is not None:
+        # Refuse a version whose files no longer match its manifest
+        registry.verify(model_dir)
+        metrics = registry.read_metrics(model_dir)
+    model = load_model(model_dir, engine)
+    preprocessor = Preprocessor.load(os.path.join(model_dir, 'pcos_model.preprocess.npz'))
+    pipeline = FeaturePipeline.load(
+        os.path.join(model_dir, 'feature_names.txt'),
+        encodings=preprocessor.category_maps if preprocessor is not None else None
+    )
+    if preprocessor is not None and preprocessor.feature_names != pipeline.feature_names:
+        raise ValueError("pcos_model.preprocess.npz was fitted on different columns than feature_names.txt")
+    if version is None:
+        # Content hash of everything that shapes a prediction; cached results are keyed by it
+        version = file_version(
+            os.path.join(model_dir, MODEL_FILES[engine]),
+            os.path.join(model_dir, 'pcos_model.preprocess.npz'),
+            os.path.join(model_dir, 'feature_names.txt'),
+        )
+    return ModelBundle(
+        model=model,
+        preprocessor=preprocessor,
+        pipeline=pipeline,
+        profile=build_profile(model, pipeline.feature_names),
+        version=version,
+        engine=engine,
+        source=os.path.abspath(model_dir),
+        metrics=metrics,
+        load_seconds=time.perf_counter() - load_start,
+        loaded_at=time.time(),
+    )
+
+
+def load_current_bundle():
+    """Load the registry's CURRENT version, falling back to the flat ml/models directory."""
+    version = registry.current_version(REGISTRY_DIR)
+    if version is None:
+        return load_bundle(MODEL_DIR)
+    return load_bundle(registry.version_dir(version, REGISTRY_DIR), version)
+
+
+def warm_up(candidate):
+    """Score a batch of all-missing rows (imputed to medians) so first requests skip lazy initialization."""
+    X = np.full((WARMUP_ROWS, len(candidate.pipeline.raw_columns)), np.nan)
+    risk_probs = candidate.predict_risk(X)
+    if risk_probs.shape != (WARMUP_ROWS,) or not np.all((risk_probs >= 0) & (risk_probs <= 1)):
+        raise ValueError(f"version {candidate.version} produced invalid warm-up predictions")
+
+
+def same_inputs(a, b):
+    """Whether two bundles parse requests into identical raw rows."""
+    return a.pipeline.raw_columns == b.pipeline.raw_columns and a.pipeline.encodings == b.pipeline.encodings
+
+
+bundle = load_current_bundle()
+prediction_cache = PredictionCache()
+MODEL_LOAD_SECONDS.set(bundle.load_seconds, version=bundle.version, engine=bundle.engine)
+
+_reload_lock = threading.Lock()
+_watcher = None
+_rejected_versions = set()
+
+def current_bundle():
+    """The bundle serving predictions right now."""
+    return bundle
+
+def reload_model(version=None):
+    """
+    Load, verify and warm up a registry version, then swap it in for new requests.
+    Requests already holding the previous bundle finish on it.
+    Args:
+        version (str): Version to serve; None reads the registry's CURRENT pointer
+    Returns:
+        bool: True if a new version was swapped in
+    """
+    global bundle
+    with _reload_lock:
+        version = version or registry.current_version(REGISTRY_DIR)
+        if version is None or version == bundle.version or version in _rejected_versions:
+            return False
+        try:
+            candidate = load_bundle(registry.version_dir(version, REGISTRY_DIR), version)
+            if not same_inputs(candidate, bundle):
+                # Rows parsed by the old pipeline may still be queued for scoring
+                raise ValueError(f"version {version} reads different inputs; restart the server to serve it")
+            warm_up(candidate)
+        except Exception:
+            # Not retried, so a broken CURRENT is reported once rather than on every poll
+            _rejected_versions.add(version)
+            MODEL_RELOADS.inc(result='failure')
+            logging.exception(f"Keeping model version {bundle.version}; could not load {version}")
+            return False
+        # A single reference assignment, so readers see either the old or the new bundle
+        bundle = candidate
+        MODEL_LOAD_SECONDS.set(candidate.load_seconds, version=candidate.version, engine=candidate.engine)
+        MODEL_RELOADS.inc(result='success')
+        logging.info(f"Now serving model version {candidate.version}")
+        return True
+
+def _watch_registry(interval):
+    while True:
+        time.sleep(interval)
+        try:
+            reload_model()
+        except Exception:
+            logging.exception("Model registry check failed")
+
+def start_model_watcher(interval=RELOAD_SECONDS):
+    """Poll the registry in a daemon thread and hot-swap new versions; safe to call more than once."""
+    global _watcher
+    if interval <= 0 or (_watcher is not None and _watcher.is_alive()):
+        return
+    _watcher = threading.Thread(target=_watch_registry, args=(interval,), name='pcos-model-watcher', daemon=True)
+    _watcher.start()
+
+def extract_features(data):
+    """Return the raw input row for one record, raising ValueError on non-numeric values."""
+    return bundle.pipeline.parse_record(data)
+
+def prepare_matrix(X):
+    """Turn a matrix of raw input rows into the model's imputed and clipped feature matrix."""
+    return bundle.prepare_matrix(X)
+
+def build_prediction(risk_prob, stage_idx=None):
+    """Build the response body for a single risk probability."""
+    profile = bundle.profile
+    if stage_idx is None:
+        stage_idx = bisect_right(profile.stage_thresholds, risk_prob)
+    return {
+        'risk_probability': risk_prob,
+        'stage': profile.stages[stage_idx],
+        'feature_contributions': dict(profile.feature_contributions),
+        'recommendations': list(profile.recommendations[stage_idx])
+    }
+
+def stage_indices(risk_probs):
+    """Look up the stage index for a whole array of probabilities."""
+    return np.searchsorted(bundle.profile.stage_thresholds, risk_probs, side='right')
+
+def predict_risk(X):
+    """Build features for a matrix of raw input rows and return the positive-class probability for each."""
+    return bundle.predict_risk(X)
+
+def cached_predict_risk(X):
+    """predict_risk for raw input rows, answering repeated inputs from the prediction cache."""
+    # Read the bundle once so the cache key and the model always belong to the same version
+    serving = bundle
+    return prediction_cache.get_or_compute(X, serving.version, serving.predict_risk)
+
+def top_contributions(shap_values, top_k):
+    """Return (indices, values) of the top_k largest absolute contributions per row, largest first."""
+    k = max(1, min(int(top_k), shap_values.shape[1]))
+    magnitude = np.abs(shap_values)
+    # argpartition finds the top k in linear time; only those k are then ordered
+    idx = np.argpartition(-magnitude, k - 1, axis=1)[:, :k]
+    order = np.argsort(-np.take_along_axis(magnitude, idx, axis=1), axis=1)
+    idx = np.take_along_axis(idx, order, axis=1)
+    return idx, np.take_along_axis(shap_values, idx, axis=1)
+
+def predict_with_explanations(X, top_k=DEFAULT_TOP_K):
+    """
+    Score a matrix of raw input rows and explain every row with CatBoost's tree SHAP values.
+    Contributions are in log-odds units and, with base_value, sum to the row's raw score.
+    Returns:
+        tuple: (risk probabilities, list of per-row explanation dicts)
+    """
+    serving = bundle
+    model, profile = serving.model, serving.profile
+    if isinstance(model, ObliviousTreeEngine):
+        raise ValueError('explanations require PCOS_INFERENCE_ENGINE=catboost')
+    from catboost import Pool
+    
+    X = serving.prepare_matrix(X)
+    risk_probs = model.predict_proba(X)[:, 1]
+    
+    # One SHAP call for the whole batch; the last column is the expected value
+    shap_values = model.get_feature_importance(Pool(X, feature_names=list(profile.feature_names)), type='ShapValues')
+    idx, values = top_contributions(shap_values[:, :-1], top_k)
+    
+    explanations = [
+        {
+            'base_value': float(base),
+            'contributions': [
+                {'feature': profile.feature_names[j], 'value': float(v)}
+                for j, v in zip(row_idx, row_values)
+            ]
+        }
+        for base, row_idx, row_values in zip(shap_values[:, -1], idx, values)
+    ]
+    return risk_probs, explanations
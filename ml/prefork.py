@@ -0,0 +1,250 @@
+"""
+Pre-forking launcher for the Flask prediction server.
+
+The parent process imports server.py once - loading the model, preprocessing
+state, feature pipeline and facility indexes - warms them up, freezes the
+garbage collector and only then forks the workers. The workers share all of
+that memory copy-on-write: NumPy buffers and the native CatBoost model are
+never written after loading, and gc.freeze() keeps the collector from touching
+the objects' headers, so each worker's private memory stays at what it
+allocates per request instead of a full copy of the model.
+
+All workers accept on one listening socket. The parent restarts workers that
+die, polls the model registry and, when a new version is published, loads it
+once, forks a fresh set of workers and retires the old ones after their
+current request. Run with:
+
+    python prefork.py --workers 8 --port 8000
+
+and check sharing with --memory-report-seconds or GET /metrics
+(pcos_process_pss_bytes, pcos_process_private_bytes per worker).
+
+Every worker has its own metrics and prediction cache. Workers write snapshots
+of them to a temporary directory, and /metrics and /cache/stats merge all
+snapshots, so any worker answering a scrape reports totals for the whole server.
+"""
+import argparse
+import gc
+import logging
+import os
+import shutil
+import signal
+import socket
+import sys
+import tempfile
+import time
+
+# The parent reloads models itself, before forking; a watcher thread inside it would be
+# copied into the workers mid-operation, so it is turned off before server.py starts it
+RELOAD_SECONDS = float(os.environ.get('PCOS_MODEL_RELOAD_SECONDS', 5))
+os.environ['PCOS_MODEL_RELOAD_SECONDS'] = '0'
+
+from werkzeug.serving import make_server
+
+from metrics import REGISTRY, process_memory
+import predictor
+from referral import STAGE_FACILITY_TYPES
+import server
+
+logger = logging.getLogger('prefork')
+
+# How long an idle worker waits for a connection before checking whether it was told to stop
+ACCEPT_TIMEOUT_SECONDS = 0.5
+
+
+def warm_up():
+    """Run the lazy first-call work in the parent so the workers inherit its results."""
+    predictor.warm_up(predictor.current_bundle())
+    # Filtered facility trees are built on first use; build the ones referrals need
+    for types in (None,) + STAGE_FACILITY_TYPES:
+        server.facility_index.nearest(-1.286, 36.817, k=1, types=types)
+    server.facility_search.search('hospital')
+    # Objects alive now are never collected, and the collector stops writing to their pages
+    gc.collect()
+    gc.freeze()
+
+
+def open_socket(host, port, backlog=2048):
+    sock = socket.socket(socket.AF_INET6 if ':' in host else socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    # Every idle worker wakes up on a new connection; the ones that lose the accept move on
+    sock.setblocking(False)
+    return sock
+
+
+def run_worker(sock, host, port, metrics_dir):
+    """Serve requests on the shared socket until SIGTERM, finishing the request in progress."""
+    stopping = False
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    REGISTRY.enable_multiprocess(metrics_dir)
+    httpd = make_server(host, port, server.app, fd=sock.fileno())
+    httpd.timeout = ACCEPT_TIMEOUT_SECONDS
+    while not stopping:
+        httpd.handle_request()
+    httpd.server_close()
+    # The final counts stay in the merged totals after this worker is gone
+    REGISTRY.flush()
+
+
+class Arbiter:
+    """Forks, supervises and replaces the worker processes."""
+
+    def __init__(self, sock, host, port, n_workers, metrics_dir):
+        self.sock = sock
+        self.metrics_dir = metrics_dir
+        self.host = host
+        self.port = port
+        self.n_workers = n_workers
+        self.workers = {}  # pid -> model version it serves
+        self.retiring = set()
+        self.stopping = False
+
+    def spawn(self):
+        version = predictor.current_bundle().version
+        pid = os.fork()
+        if pid == 0:
+            try:
+                run_worker(self.sock, self.host, self.port, self.metrics_dir)
+            except Exception:
+                logger.exception("Worker crashed")
+                os._exit(1)
+            os._exit(0)
+        self.workers[pid] = version
+        return pid
+
+    def reap(self):
+        """Forget exited workers; returns how many exited."""
+        exited = 0
+        while self.workers:
+            pid, status = os.waitpid(-1, os.WNOHANG)
+            if pid == 0:
+                break
+            if self.workers.pop(pid, None) is not None:
+                exited += 1
+                if pid in self.retiring:
+                    self.retiring.discard(pid)
+                elif not self.stopping:
+                    logger.warning(f"Worker {pid} exited with status {status}")
+        return exited
+
+    def maintain(self):
+        """Start workers until n_workers serve the current model version."""
+        version = predictor.current_bundle().version
+        current = sum(1 for v in self.workers.values() if v == version)
+        for _ in range(self.n_workers - current):
+            self.spawn()
+
+    def retire(self, version):
+        """Ask the workers serving an older version to stop after their current request."""
+        for pid, worker_version in list(self.workers.items()):
+            if worker_version != version and pid not in self.retiring:
+                self.retiring.add(pid)
+                os.kill(pid, signal.SIGTERM)
+
+    def stop(self, timeout=10):
+        self.stopping = True
+        for pid in self.workers:
+            os.kill(pid, signal.SIGTERM)
+        deadline = time.monotonic() + timeout
+        while self.workers and time.monotonic() < deadline:
+            self.reap()
+            time.sleep(0.05)
+        for pid in self.workers:
+            os.kill(pid, signal.SIGKILL)
+
+    def memory_report(self):
+        """Memory of the parent and every worker; pss splits shared pages between the processes."""
+        rows = []
+        for role, pid in [('parent', os.getpid())] + [('worker', pid) for pid in sorted(self.workers)]:
+            memory = process_memory(pid)
+            if memory is not None:
+                rows.append({'role': role, 'pid': pid, **memory})
+        return rows
+
+
+def log_memory_report(rows):
+    mib = 1024 * 1024
+    logger.info(f"{'role':<8}{'pid':>8}{'rss MiB':>10}{'pss MiB':>10}{'shared MiB':>12}{'private MiB':>13}")
+    for row in rows:
+        logger.info(
+            f"{row['role']:<8}{row['pid']:>8}{row['rss'] / mib:>10.1f}{row['pss'] / mib:>10.1f}"
+            f"{row['shared'] / mib:>12.1f}{row['private'] / mib:>13.1f}"
+        )
+    if rows:
+        logger.info(f"total pss {sum(row['pss'] for row in rows) / mib:.1f} MiB, "
+                    f"total rss {sum(row['rss'] for row in rows) / mib:.1f} MiB")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Serve the PCOS prediction API from pre-forked workers.")
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help="worker processes (default: all cores)")
+    parser.add_argument('--reload-seconds', type=float, default=RELOAD_SECONDS,
+                        help="seconds between model registry checks; 0 disables hot reload")
+    parser.add_argument('--memory-report-seconds', type=float, default=0,
+                        help="log per-worker memory at this interval; 0 logs it once after startup")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+    warm_up()
+    sock = open_socket(args.host, args.port)
+    # Workers write metric snapshots here so /metrics and /cache/stats cover all of them
+    metrics_dir = tempfile.mkdtemp(prefix='pcos-metrics-')
+    REGISTRY.multiprocess_dir = metrics_dir
+    REGISTRY.flush(include_states=False)
+    arbiter = Arbiter(sock, args.host, args.port, max(1, args.workers), metrics_dir)
+
+    def shutdown(signum, frame):
+        arbiter.stopping = True
+
+    signal.signal(signal.SIGTERM, shutdown)
+    signal.signal(signal.SIGINT, shutdown)
+
+    arbiter.maintain()
+    logger.info(f"Serving model {predictor.current_bundle().version} on {args.host}:{args.port} "
+                f"with {args.workers} workers")
+
+    start = time.monotonic()
+    next_reload = start + args.reload_seconds
+    next_report = start + (args.memory_report_seconds or 5)
+    while not arbiter.stopping:
+        time.sleep(0.2)
+        arbiter.reap()
+        now = time.monotonic()
+        if args.reload_seconds > 0 and now >= next_reload:
+            next_reload = now + args.reload_seconds
+            # Load and warm the new version once here; new workers inherit it copy-on-write
+            reloaded = predictor.reload_model()
+            # The parent counts reloads; its snapshot joins the workers' in the merged metrics
+            REGISTRY.flush(include_states=False)
+            if reloaded:
+                gc.freeze()
+                arbiter.maintain()
+                arbiter.retire(predictor.current_bundle().version)
+        if not arbiter.stopping:
+            arbiter.maintain()
+        if next_report is not None and now >= next_report:
+            log_memory_report(arbiter.memory_report())
+            next_report = now + args.memory_report_seconds if args.memory_report_seconds > 0 else None
+
+    logger.info("Stopping workers")
+    arbiter.stop()
+    sock.close()
+    shutil.rmtree(metrics_dir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,40 @@
+"""
+Referral routing: send each scored patient to the nearest facilities suited to their risk stage.
+"""
+import numpy as np
+
+# Facility types suited to each stage, aligned with predictor.STAGES
+STAGE_FACILITY_TYPES = (
+    # Low Risk: routine check-ups close to home
+    ('Dispensary', 'Health Centre', 'Medical Clinic', 'Medical Centre'),
+    # Moderate Risk: clinics able to follow up and run hormone tests
+    ('Health Centre', 'Medical Centre', 'Medical Clinic', 'Maternity Home', 'Nursing Home'),
+    # High Risk: hospitals with gynecology services
+    ('National Referral Hospital', 'Provincial General Hospital', 'District Hospital',
+     'Sub-District Hospital', 'Other Hospital'),
+)
+
+DEFAULT_REFERRALS = 3
+
+
+def referral_options(facility_index, points, stage_idx, k=DEFAULT_REFERRALS):
+    """
+    Find the k nearest suitable facilities for every patient.
+    Args:
+        facility_index (FacilityIndex): Indexed facilities
+        points (np.ndarray): (n, 2) patient (latitude, longitude)
+        stage_idx (np.ndarray): (n,) risk stage index per patient
+        k (int): Facilities per patient
+    Returns:
+        list: One list of facility dicts per patient, nearest first
+    """
+    points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+    stage_idx = np.asarray(stage_idx)
+    referrals = [None] * len(points)
+    # One tree query per stage present in the batch
+    for stage in np.unique(stage_idx):
+        rows = np.flatnonzero(stage_idx == stage)
+        options = facility_index.nearest_batch(points[rows], k, types=STAGE_FACILITY_TYPES[stage])
+        for i, facilities in zip(rows, options):
+            referrals[i] = facilities
+    return referrals
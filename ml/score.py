@@ -0,0 +1,178 @@
+"""
+Bulk scoring of large CSV or Parquet files with bounded memory.
+
+The input is read in fixed-size chunks, each chunk goes through the shared
+feature pipeline and the model, and its risk probabilities and stages are
+appended to the output before the next chunks are read. With --jobs > 1 the
+chunks are scored in worker processes while the main process keeps reading
+and writing in input order; at most 2 * jobs chunks are in memory at once.
+
+Input columns may be request keys (age, bmi, ...) or training column names;
+missing columns and empty cells are imputed like missing API inputs. A row with
+an unparseable value, or with no recognised value at all, is rejected as
+/predict would reject it: its risk and stage are left empty and the error
+column says why.
+
+    python score.py registry.csv scores.csv
+    python score.py registry.parquet scores.parquet --jobs 8 --id-column patient_id
+"""
+import argparse
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+import logging
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from predictor import current_bundle, stage_indices
+
+DEFAULT_CHUNK_SIZE = 50_000
+
+
+def is_parquet(path):
+    return path.lower().endswith(('.parquet', '.pq'))
+
+
+def read_chunks(path, chunk_size):
+    """Yield DataFrames of at most chunk_size rows from a CSV or Parquet file."""
+    if is_parquet(path):
+        import pyarrow.parquet as pq
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunk_size):
+            yield batch.to_pandas()
+    else:
+        yield from pd.read_csv(path, chunksize=chunk_size, skipinitialspace=True)
+
+
+class ChunkWriter:
+    """Appends scored chunks to a CSV or Parquet file."""
+
+    def __init__(self, path):
+        self.path = path
+        self.parquet_writer = None
+        self.csv_file = None
+
+    def write(self, df):
+        if is_parquet(self.path):
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+            table = pa.Table.from_pandas(df, preserve_index=False)
+            if self.parquet_writer is None:
+                self.parquet_writer = pq.ParquetWriter(self.path, table.schema)
+            self.parquet_writer.write_table(table)
+        else:
+            header = self.csv_file is None
+            if header:
+                self.csv_file = open(self.path, 'w', newline='')
+            df.to_csv(self.csv_file, header=header, index=False)
+            self.csv_file.flush()
+
+    def close(self):
+        if self.parquet_writer is not None:
+            self.parquet_writer.close()
+        if self.csv_file is not None:
+            self.csv_file.close()
+
+
+def score_frame(df):
+    """
+    Score one chunk of raw records.
+    Returns:
+        tuple: (risk probabilities, stage indices, errors); rejected rows get NaN, stage -1
+            and their error message, valid rows an error of None
+    """
+    serving = current_bundle()
+    raw, errors = serving.pipeline.parse_frame(df)
+    valid = np.equal(errors, None)
+    risk_probs = np.full(len(df), np.nan)
+    stages = np.full(len(df), -1, dtype=np.intp)
+    if valid.any():
+        risk_probs[valid] = serving.predict_risk(raw[valid])
+        stages[valid] = stage_indices(risk_probs[valid])
+    return risk_probs, stages, errors
+
+
+def build_output(df, risk_probs, stages, errors, id_column=None):
+    """Build the output rows for one scored chunk."""
+    # Stage -1 picks the trailing None, so rejected rows get no label
+    labels = np.asarray(current_bundle().profile.stages + (None,), dtype=object)
+    out = pd.DataFrame({
+        'risk_probability': risk_probs,
+        # String dtype keeps the Parquet schema fixed even for a chunk with no values in a column
+        'stage': pd.array(labels[stages], dtype='string'),
+        'error': pd.array(errors, dtype='string'),
+    }, index=df.index)
+    if id_column is not None:
+        out.insert(0, id_column, df[id_column])
+    return out
+
+
+def score_file(input_path, output_path, chunk_size=DEFAULT_CHUNK_SIZE, n_jobs=1, id_column=None):
+    """
+    Score every row of input_path and write the results to output_path.
+    Args:
+        input_path (str): CSV or Parquet file of raw records
+        output_path (str): CSV or Parquet file to write (format from the extension)
+        chunk_size (int): Rows per chunk
+        n_jobs (int): Worker processes; 1 scores in the main process
+        id_column (str): Input column copied to the output to identify rows
+    Returns:
+        int: Number of rows scored
+    """
+    engine = current_bundle().engine
+    if engine != 'catboost':
+        logging.warning(f"Scoring with the '{engine}' engine; on large files the 'catboost' engine "
+                        f"(PCOS_INFERENCE_ENGINE=catboost) is several times faster")
+    writer = ChunkWriter(output_path)
+    start = time.perf_counter()
+    rows = rejected = 0
+
+    def emit(df, risk_probs, stages, errors):
+        nonlocal rows, rejected
+        writer.write(build_output(df, risk_probs, stages, errors, id_column))
+        rows += len(df)
+        rejected += int(np.not_equal(errors, None).sum())
+        elapsed = time.perf_counter() - start
+        logging.info(f"{rows} rows scored, {rejected} rejected ({rows / elapsed:,.0f} rows/sec)")
+
+    try:
+        if n_jobs <= 1:
+            for df in read_chunks(input_path, chunk_size):
+                emit(df, *score_frame(df))
+        else:
+            # On Linux the workers are forked after the model is loaded, so they do not reload it
+            with ProcessPoolExecutor(max_workers=n_jobs) as pool:
+                in_flight = deque()
+                for df in read_chunks(input_path, chunk_size):
+                    in_flight.append((df, pool.submit(score_frame, df)))
+                    # Bound memory: wait for the oldest chunk before reading further ahead
+                    if len(in_flight) >= 2 * n_jobs:
+                        done, future = in_flight.popleft()
+                        emit(done, *future.result())
+                while in_flight:
+                    done, future = in_flight.popleft()
+                    emit(done, *future.result())
+    finally:
+        writer.close()
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('input', help='CSV or Parquet file of records to score')
+    parser.add_argument('output', help='CSV or Parquet file for the scores')
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE, help='rows read per chunk')
+    parser.add_argument('--jobs', type=int, default=1, help='worker processes scoring chunks')
+    parser.add_argument('--id-column', default=None, help='input column copied to the output')
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s', stream=sys.stderr)
+    start = time.perf_counter()
+    rows = score_file(args.input, args.output, args.chunk_size, args.jobs, args.id_column)
+    elapsed = time.perf_counter() - start
+    print(f"Scored {rows} rows in {elapsed:.1f}s ({rows / max(elapsed, 1e-9):,.0f} rows/sec) -> {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,105 +1,373 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, g, request, jsonify
 from flask_cors import CORS
-import joblib
+import csv
+import io
+import math
+import time
 import numpy as np
-import os
+
+from facilities import DEFAULT_K, FacilityIndex
+from metrics import BATCH_SIZE, ERRORS, REGISTRY, REQUESTS, REQUEST_SECONDS, maybe_profile, timed
+from facility_search import DEFAULT_PER_PAGE, FacilitySearchIndex
+from referral import DEFAULT_REFERRALS, STAGE_FACILITY_TYPES, referral_options
+from predictor import (
+    DEFAULT_TOP_K, extract_features, build_prediction, cached_predict_risk, current_bundle,
+    merge_stats, predict_with_explanations, prediction_cache, stage_indices, start_model_watcher
+)
 
 app = Flask(__name__)
 CORS(app)
 
-# Load the model and scaler
-model_dir = os.path.join(os.path.dirname(__file__), 'models')
-model = joblib.load(os.path.join(model_dir, 'pcos_model.joblib'))
-scaler = joblib.load(os.path.join(model_dir, 'scaler.joblib'))
+# Facility coordinates and names are indexed once at startup
+facility_index = FacilityIndex.load()
+facility_search = FacilitySearchIndex(facility_index)
+
+# Pick up newly published registry versions without a restart
+start_model_watcher()
+
+@app.before_request
+def start_request_timer():
+    g.request_start = time.perf_counter()
+    g.profiler = maybe_profile(request.endpoint or 'unknown')
+
+@app.after_request
+def record_request(response):
+    endpoint = request.endpoint or 'unknown'
+    REQUEST_SECONDS.observe(time.perf_counter() - g.request_start, endpoint=endpoint)
+    REQUESTS.inc(endpoint=endpoint, method=request.method, status=response.status_code)
+    response.headers['X-Model-Version'] = current_bundle().version
+    return response
+
+@app.teardown_request
+def stop_profiler(exc):
+    # Teardown also runs when a request fails before its response is built
+    if g.get('profiler') is not None:
+        g.profiler.stop()
+
+def server_error(e):
+    """Log an unexpected exception with its traceback, count it and return a 500 response."""
+    app.logger.exception(f"Unhandled error in {request.endpoint}")
+    ERRORS.inc(endpoint=request.endpoint or 'unknown', exception=type(e).__name__)
+    return jsonify({'error': str(e)}), 500
+
+def read_json():
+    """Parse the request body as JSON; a missing, malformed or non-JSON body is a ValueError (400)."""
+    data = request.get_json(silent=True)
+    if data is None:
+        raise ValueError('request body must be JSON sent with Content-Type: application/json')
+    return data
+
+def respond(payload):
+    """Serialize a JSON response, timing the serialize phase."""
+    with timed('serialize'):
+        return jsonify(payload)
+
+def load_batch_records():
+    """Read batch records from a JSON array or an uploaded/posted CSV file."""
+    upload = request.files.get('file')
+    if upload is not None:
+        text = upload.read().decode('utf-8-sig')
+    elif request.mimetype == 'text/csv':
+        text = request.get_data(as_text=True)
+    else:
+        data = read_json()
+        if isinstance(data, dict):
+            data = data.get('records')
+        if not isinstance(data, list):
+            raise ValueError('expected a JSON array of records or a CSV upload')
+        return data
+    return list(csv.DictReader(io.StringIO(text)))
+
+def parse_positive_int(value, name):
+    """Check a JSON count such as k: a positive integer (2.0 passes; 1.7, "3" and true do not)."""
+    is_integer = (isinstance(value, int) and not isinstance(value, bool)) or (
+        isinstance(value, float) and value.is_integer())
+    if not is_integer or value < 1:
+        raise ValueError(f"{name} must be a positive integer, got {value!r}")
+    return int(value)
+
+def query_int(name, default):
+    """Positive integer query argument, or the default when it is absent."""
+    value = request.args.get(name)
+    if value is None:
+        return default
+    try:
+        number = int(value)
+    except ValueError:
+        raise ValueError(f"{name} must be a positive integer, got {value!r}")
+    return parse_positive_int(number, name)
+
+def explain_options():
+    """Parse the ?explain=true&top_k=N query flags; returns top_k or 0 when explanations are off."""
+    if request.args.get('explain', '').lower() not in ('1', 'true', 'yes'):
+        return 0
+    return query_int('top_k', DEFAULT_TOP_K)
 
 @app.route('/predict', methods=['POST'])
 def predict():
     try:
-        data = request.get_json()
+        with timed('parse'):
+            data = read_json()
         
-        # Extract features in the correct order
-        features = [
-            data['beta_hcg1'],  # First Beta HCG
-            data['beta_hcg2'],  # Second Beta HCG
-            data['amh_level'],  # AMH Level
-            data['pregnant'],    # Pregnancy Status
-            data['weight_gain'], # Weight Gain
-            data['hair_growth'], # Hair Growth
-            data['skin_darkening'], # Skin Darkening
-            data['hair_loss'],   # Hair Loss
-            data['pimples'],     # Pimples
-            data['fast_food'],   # Fast Food
-            data['regular_exercise'], # Regular Exercise
-            data['blood_group'], # Blood Group
-        ]
+        top_k = explain_options()
         
-        # Scale features
-        X = np.array([features])
-        X_scaled = scaler.transform(X)
+        # Scale features and get prediction probability
+        with timed('features'):
+            X = np.array([extract_features(data)])
+        if top_k:
+            risk_probs, explanations = predict_with_explanations(X, top_k)
+            result = build_prediction(float(risk_probs[0]))
+            result['explanation'] = explanations[0]
+        else:
+            result = build_prediction(float(cached_predict_risk(X)[0]))
         
-        # Get prediction probability
-        risk_prob = float(model.predict_proba(X_scaled)[0][1])
+        return respond(result)
         
-        # Get feature names
-        feature_names = [
-            'Beta HCG (First Test)',
-            'Beta HCG (Second Test)',
-            'AMH Level',
-            'Pregnancy Status',
-            'Weight Gain',
-            'Hair Growth',
-            'Skin Darkening',
-            'Hair Loss',
-            'Pimples',
-            'Fast Food Consumption',
-            'Regular Exercise',
-            'Blood Group'
-        ]
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return server_error(e)
+
+@app.route('/predict/batch', methods=['POST'])
+def predict_batch():
+    try:
+        with timed('parse'):
+            records = load_batch_records()
+        top_k = explain_options()
+    except Exception as e:
+        return jsonify({'error': str(e)}), 400
+    BATCH_SIZE.observe(len(records), endpoint='predict_batch')
+    
+    try:
+        results = [None] * len(records)
+        rows = []
+        valid_idx = []
         
-        # Get feature contributions
-        feature_contributions = {
-            name: float(abs(imp)) 
-            for name, imp in zip(feature_names, model.feature_importances_)
-        }
+        # Validate each record on its own so one bad row does not fail the batch
+        with timed('features'):
+            for i, record in enumerate(records):
+                try:
+                    rows.append(extract_features(record))
+                    valid_idx.append(i)
+                except ValueError as e:
+                    results[i] = {'index': i, 'error': str(e)}
         
-        # Determine risk stage
-        if risk_prob < 0.3:
-            stage = 'Low Risk'
-        elif risk_prob < 0.7:
-            stage = 'Moderate Risk'
-        else:
-            stage = 'High Risk'
+        if rows:
+            # One contiguous matrix, one transform and one predict_proba call for all rows
+            X = np.ascontiguousarray(rows, dtype=np.float64)
+            if top_k:
+                risk_probs, explanations = predict_with_explanations(X, top_k)
+            else:
+                risk_probs, explanations = cached_predict_risk(X), None
+            for n, (i, risk_prob, stage_idx) in enumerate(zip(valid_idx, risk_probs, stage_indices(risk_probs))):
+                results[i] = {'index': i, **build_prediction(float(risk_prob), stage_idx)}
+                if explanations is not None:
+                    results[i]['explanation'] = explanations[n]
         
-        # Generate recommendations
-        recommendations = []
-        if risk_prob >= 0.7:
-            recommendations.append("Schedule an immediate consultation with a gynecologist.")
-            recommendations.append("Consider comprehensive hormone testing.")
-        elif risk_prob >= 0.3:
-            recommendations.append("Schedule a check-up with your healthcare provider within the next month.")
-            recommendations.append("Monitor your symptoms and keep a health diary.")
+        return respond({
+            'count': len(records),
+            'errors': len(records) - len(rows),
+            'results': results
+        })
         
-        # Feature-specific recommendations
-        high_impact_features = {k: v for k, v in feature_contributions.items() if v > 0.3}
-        for feature in high_impact_features:
-            if 'Weight gain' in feature:
-                recommendations.append("Consider consulting with a nutritionist and developing a balanced meal plan.")
-            elif 'Exercise' in feature:
-                recommendations.append("Aim for at least 150 minutes of moderate exercise per week.")
-            elif 'Fast food' in feature:
-                recommendations.append("Reduce processed food intake and focus on whole, nutrient-rich foods.")
-            elif 'Hair' in feature or 'Skin' in feature:
-                recommendations.append("Consider consulting with a dermatologist for specialized skin and hair care advice.")
+    except Exception as e:
+        return server_error(e)
+
+def parse_point(point):
+    """Read (latitude, longitude) from {'latitude', 'longitude'}, {'lat', 'lon'} or a 2-item list."""
+    if isinstance(point, dict):
+        lat = point.get('latitude', point.get('lat'))
+        lon = point.get('longitude', point.get('lon'))
+    elif isinstance(point, (list, tuple)) and len(point) == 2:
+        lat, lon = point
+    else:
+        raise ValueError('a point needs a latitude and a longitude')
+    if lat is None or lon is None:
+        raise ValueError('a point needs a latitude and a longitude')
+    try:
+        lat, lon = float(lat), float(lon)
+    except (TypeError, ValueError):
+        raise ValueError(f"invalid coordinates: {lat!r}, {lon!r}")
+    # Checked per point so one bad location only fails its own row of a batch
+    if not (math.isfinite(lat) and math.isfinite(lon) and abs(lat) <= 90 and abs(lon) <= 180):
+        raise ValueError('latitude must be within [-90, 90] and longitude within [-180, 180]')
+    return lat, lon
+
+@app.route('/facilities/nearest', methods=['GET'])
+def facilities_nearest():
+    try:
+        point = parse_point({'lat': request.args.get('lat'), 'lon': request.args.get('lon')})
+        facilities = facility_index.nearest(
+            *point,
+            k=query_int('k', DEFAULT_K),
+            types=request.args.getlist('type'),
+            counties=request.args.getlist('county')
+        )
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify({'count': len(facilities), 'facilities': facilities})
+
+@app.route('/facilities/nearest/batch', methods=['POST'])
+def facilities_nearest_batch():
+    try:
+        data = read_json()
+        if not isinstance(data, dict) or not isinstance(data.get('points'), list):
+            raise ValueError("expected a JSON object with a 'points' array")
+        k = parse_positive_int(data.get('k', DEFAULT_K), 'k')
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    BATCH_SIZE.observe(len(data['points']), endpoint='facilities_nearest_batch')
+    
+    # Validate each point on its own so one bad point does not fail the batch
+    results = [None] * len(data['points'])
+    points, valid_idx = [], []
+    for i, point in enumerate(data['points']):
+        try:
+            points.append(parse_point(point))
+            valid_idx.append(i)
+        except ValueError as e:
+            results[i] = {'index': i, 'error': str(e)}
+    
+    try:
+        if points:
+            facilities = facility_index.nearest_batch(
+                points, k=k, types=data.get('type'), counties=data.get('county')
+            )
+            for i, options in zip(valid_idx, facilities):
+                results[i] = {'index': i, 'facilities': options}
+    except (TypeError, ValueError) as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify({
+        'count': len(results),
+        'errors': len(results) - len(points),
+        'results': results
+    })
+
+@app.route('/facilities/search', methods=['GET'])
+def facilities_search():
+    try:
+        result = facility_search.search(
+            request.args.get('q', ''),
+            types=request.args.getlist('type'),
+            counties=request.args.getlist('county'),
+            page=query_int('page', 1),
+            per_page=query_int('per_page', DEFAULT_PER_PAGE)
+        )
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify(result)
+
+def parse_referral_request(data):
+    """Return (raw feature row, (latitude, longitude)) for one {'patient', 'location'} object."""
+    if not isinstance(data, dict) or not isinstance(data.get('patient'), dict):
+        raise ValueError("expected an object with 'patient' features and a 'location'")
+    return extract_features(data['patient']), parse_point(data.get('location'))
+
+def referral_k(data):
+    k = data.get('k', DEFAULT_REFERRALS) if isinstance(data, dict) else DEFAULT_REFERRALS
+    return parse_positive_int(k, 'k')
+
+def build_referral(risk_prob, stage_idx, facilities):
+    result = build_prediction(float(risk_prob), stage_idx)
+    result['referral_types'] = list(STAGE_FACILITY_TYPES[stage_idx])
+    result['referrals'] = facilities
+    return result
+
+@app.route('/referral', methods=['POST'])
+def referral():
+    try:
+        with timed('parse'):
+            data = read_json()
+        with timed('features'):
+            row, point = parse_referral_request(data)
+        k = referral_k(data)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    try:
+        risk_probs = cached_predict_risk(np.array([row]))
+        stages = stage_indices(risk_probs)
+        facilities = referral_options(facility_index, [point], stages, k)
+        return respond(build_referral(risk_probs[0], int(stages[0]), facilities[0]))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return server_error(e)
+
+@app.route('/referral/batch', methods=['POST'])
+def referral_batch():
+    try:
+        with timed('parse'):
+            data = read_json()
+        records = data.get('records') if isinstance(data, dict) else data
+        if not isinstance(records, list):
+            raise ValueError("expected a JSON array of records or an object with 'records'")
+        k = referral_k(data)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    BATCH_SIZE.observe(len(records), endpoint='referral_batch')
+    
+    try:
+        results = [None] * len(records)
+        rows, points, valid_idx = [], [], []
         
-        return jsonify({
-            'risk_probability': risk_prob,
-            'stage': stage,
-            'feature_contributions': feature_contributions,
-            'recommendations': recommendations
-        })
+        # Validate each record on its own so one bad row does not fail the batch
+        with timed('features'):
+            for i, record in enumerate(records):
+                try:
+                    row, point = parse_referral_request(record)
+                    rows.append(row)
+                    points.append(point)
+                    valid_idx.append(i)
+                except ValueError as e:
+                    results[i] = {'index': i, 'error': str(e)}
+        
+        if rows:
+            # One predict call for all rows, then one facility query per risk stage
+            risk_probs = cached_predict_risk(np.ascontiguousarray(rows, dtype=np.float64))
+            stages = stage_indices(risk_probs)
+            facilities = referral_options(facility_index, points, stages, k)
+            for i, risk_prob, stage_idx, options in zip(valid_idx, risk_probs, stages, facilities):
+                results[i] = {'index': i, **build_referral(risk_prob, int(stage_idx), options)}
         
+        return respond({
+            'count': len(records),
+            'errors': len(records) - len(rows),
+            'results': results
+        })
+    
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
-        return jsonify({'error': str(e)}), 500
+        return server_error(e)
+
+@app.route('/model-info', methods=['GET'])
+def model_info():
+    return jsonify(current_bundle().info())
+
+@app.route('/cache/stats', methods=['GET'])
+def cache_stats():
+    # Under prefork.py every worker has its own cache; report them together
+    return jsonify(merge_stats(REGISTRY.process_states('prediction_cache')))
+
+def cache_metrics():
+    """Expose the prediction cache counters alongside the request metrics."""
+    stats = prediction_cache.stats()
+    lines = []
+    for name, kind, value in (('hits', 'counter', stats['hits']), ('misses', 'counter', stats['misses']),
+                              ('evictions', 'counter', stats['evictions']), ('entries', 'gauge', stats['entries'])):
+        suffix = '_total' if kind == 'counter' else ''
+        lines += [f'# HELP pcos_prediction_cache_{name}{suffix} Prediction cache {name}',
+                  f'# TYPE pcos_prediction_cache_{name}{suffix} {kind}',
+                  f'pcos_prediction_cache_{name}{suffix} {value}']
+    return lines
+
+REGISTRY.add_collector(cache_metrics)
+REGISTRY.add_state('prediction_cache', prediction_cache.stats)
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    return Response(REGISTRY.render(), mimetype='text/plain; version=0.0.4')
 
 if __name__ == '__main__':
     app.run(host='0.0.0.0', port=8000)
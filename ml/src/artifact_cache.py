@@ -0,0 +1,107 @@
+"""
+Content-addressed cache for preprocessed training data.
+
+Entries are keyed by a hash of the input data plus the source code of the
+functions (and modules) that produce them, so a cached frame is reused only
+while neither the data nor the preprocessing code has changed. Frames are
+stored as compressed .npz files; when the cache grows beyond max_bytes the
+least recently used entries are evicted.
+"""
+import hashlib
+import inspect
+import logging
+import os
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'data', 'cache', 'preprocessed')
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+
+
+def code_fingerprint(*objects):
+    """Hash the source of functions, classes or modules so edits change the cache key."""
+    digest = hashlib.sha256()
+    for obj in objects:
+        digest.update(inspect.getsource(obj).encode('utf-8'))
+    return digest.hexdigest()
+
+
+class ArtifactCache:
+    """Disk cache of DataFrames with LRU eviction by total size."""
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        os.makedirs(cache_dir, exist_ok=True)
+
+    @staticmethod
+    def make_key(data_hash, code, *extra):
+        """Combine the data hash, code fingerprint and any extra settings into one key."""
+        parts = [data_hash, code, pd.__version__, np.__version__, *map(str, extra)]
+        return hashlib.sha256('\0'.join(parts).encode('utf-8')).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.npz")
+
+    def get(self, key):
+        """Return the cached DataFrame for key, or None on a miss."""
+        path = self._path(key)
+        if not os.path.exists(path):
+            return None
+        try:
+            with np.load(path, allow_pickle=False) as data:
+                df = pd.DataFrame(data['values'], columns=[str(c) for c in data['columns']])
+                dtypes = dict(zip(df.columns, (str(d) for d in data['dtypes'])))
+        except (OSError, ValueError, KeyError) as e:
+            logging.warning(f"Discarding unreadable cache entry {path}: {e}")
+            os.remove(path)
+            return None
+        # Mark as recently used for eviction
+        os.utime(path)
+        return df.astype(dtypes)
+
+    def put(self, key, df):
+        """Store a numeric DataFrame under key, then evict old entries if over budget."""
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                np.savez_compressed(
+                    f,
+                    values=df.to_numpy(dtype=np.float64),
+                    columns=np.array(df.columns, dtype=str),
+                    dtypes=np.array([str(d) for d in df.dtypes], dtype=str),
+                )
+            os.chmod(tmp_path, 0o644)
+            # Atomic publish so concurrent readers never see a partial file
+            os.replace(tmp_path, self._path(key))
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        self.evict(keep=key)
+
+    def entries(self):
+        """Return (mtime, size, path) for every entry, least recently used first."""
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if name.endswith('.npz'):
+                path = os.path.join(self.cache_dir, name)
+                stat = os.stat(path)
+                entries.append((stat.st_mtime, stat.st_size, path))
+        return sorted(entries)
+
+    def evict(self, keep=None):
+        """Delete least recently used entries until the cache fits in max_bytes."""
+        entries = self.entries()
+        total = sum(size for _, size, _ in entries)
+        keep_path = self._path(keep) if keep else None
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            if path == keep_path:
+                continue
+            os.remove(path)
+            total -= size
+            logging.info(f"Evicted cached artifact {os.path.basename(path)}")
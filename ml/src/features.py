@@ -0,0 +1,367 @@
+"""
+Shared feature pipeline for training, the prediction API and the Streamlit app.
+
+The model inputs are described declaratively: RAW_FEATURES maps each training
+column to the request key used by the API and the Streamlit form, and
+DERIVED_FEATURES lists the engineered columns built from them. Column order
+comes from ml/models/feature_names.txt, written by train_model.py, so every
+entry point produces exactly the training matrix.
+"""
+from collections import namedtuple
+import os
+
+import numpy as np
+import pandas as pd
+
+DEFAULT_FEATURE_NAMES_PATH = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), '..', 'models', 'feature_names.txt'
+)
+DEFAULT_PREPROCESSOR_PATH = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), '..', 'models', 'pcos_model.preprocess.npz'
+)
+
+# Small constant keeping ratios finite when the denominator is zero
+EPSILON = 1e-5
+
+# Category encodings; keys are lower-cased labels, numeric inputs pass through unchanged
+YES_NO_CODES = {'yes': 1, 'y': 1, 'true': 1, 'no': 0, 'n': 0, 'false': 0}
+# Codes from the dataset's Instructions sheet
+BLOOD_GROUP_CODES = {'a+': 11, 'a-': 12, 'b+': 13, 'b-': 14, 'o+': 15, 'o-': 16, 'ab+': 17, 'ab-': 18}
+CYCLE_CODES = {'r': 2, 'regular': 2, 'i': 4, 'irregular': 4}
+
+RawFeature = namedtuple('RawFeature', ['column', 'key', 'aliases', 'encoding'], defaults=((), None))
+DerivedFeature = namedtuple('DerivedFeature', ['name', 'op', 'inputs', 'clip'], defaults=(None,))
+
+RAW_FEATURES = (
+    RawFeature('Age (yrs)', 'age'),
+    RawFeature('Weight (Kg)', 'weight'),
+    RawFeature('Height(Cm)', 'height'),
+    RawFeature('BMI', 'bmi'),
+    RawFeature('Blood Group', 'blood_group', encoding=BLOOD_GROUP_CODES),
+    RawFeature('Pulse rate(bpm)', 'pulse_rate'),
+    RawFeature('RR (breaths/min)', 'rr'),
+    RawFeature('Hb(g/dl)', 'hb'),
+    RawFeature('Cycle(R/I)', 'cycle_ri', encoding=CYCLE_CODES),
+    RawFeature('Cycle length(days)', 'cycle_length'),
+    RawFeature('Marraige Status (Yrs)', 'marriage_status'),
+    RawFeature('Pregnant(Y/N)', 'pregnant', encoding=YES_NO_CODES),
+    RawFeature('No. of aborptions', 'no_of_abortions'),
+    RawFeature('I   beta-HCG(mIU/mL)', 'beta_hcg1'),
+    RawFeature('II    beta-HCG(mIU/mL)', 'beta_hcg2'),
+    RawFeature('FSH(mIU/mL)', 'fsh'),
+    RawFeature('LH(mIU/mL)', 'lh'),
+    RawFeature('FSH/LH', 'fsh_lh_ratio'),
+    RawFeature('Hip(inch)', 'hip'),
+    RawFeature('Waist(inch)', 'waist'),
+    RawFeature('Waist:Hip Ratio', 'waist_hip_ratio'),
+    RawFeature('TSH (mIU/L)', 'tsh'),
+    RawFeature('AMH(ng/mL)', 'amh', aliases=('amh_level',)),
+    RawFeature('PRL(ng/mL)', 'prl'),
+    RawFeature('Vit D3 (ng/mL)', 'vit_d3'),
+    RawFeature('PRG(ng/mL)', 'prg'),
+    RawFeature('RBS(mg/dl)', 'rbs'),
+    RawFeature('Weight gain(Y/N)', 'weight_gain', encoding=YES_NO_CODES),
+    RawFeature('hair growth(Y/N)', 'hair_growth', encoding=YES_NO_CODES),
+    RawFeature('Skin darkening (Y/N)', 'skin_darkening', encoding=YES_NO_CODES),
+    RawFeature('Hair loss(Y/N)', 'hair_loss', encoding=YES_NO_CODES),
+    RawFeature('Pimples(Y/N)', 'pimples', encoding=YES_NO_CODES),
+    RawFeature('Fast food (Y/N)', 'fast_food', encoding=YES_NO_CODES),
+    RawFeature('Reg.Exercise(Y/N)', 'regular_exercise', encoding=YES_NO_CODES),
+    RawFeature('BP _Systolic (mmHg)', 'bp_systolic'),
+    RawFeature('BP _Diastolic (mmHg)', 'bp_diastolic'),
+    RawFeature('Follicle No. (L)', 'follicle_l'),
+    RawFeature('Follicle No. (R)', 'follicle_r'),
+    RawFeature('Avg. F size (L) (mm)', 'avg_f_size_l'),
+    RawFeature('Avg. F size (R) (mm)', 'avg_f_size_r'),
+    RawFeature('Endometrium (mm)', 'endometrium'),
+)
+
+def _hormone_features(prefix, h1, h2):
+    return (
+        DerivedFeature(f'{prefix}_Ratio', 'ratio', (h1, h2), clip=(-10, 10)),
+        DerivedFeature(f'{prefix}_Product', 'product', (h1, h2)),
+        DerivedFeature(f'{prefix}_Sum', 'sum', (h1, h2)),
+    )
+
+DERIVED_FEATURES = (
+    DerivedFeature('Follicle_Sum', 'sum', ('Follicle No. (R)', 'Follicle No. (L)')),
+    DerivedFeature('Follicle_Ratio', 'ratio', ('Follicle No. (R)', 'Follicle No. (L)'), clip=(0, 10)),
+    *_hormone_features('FSH_LH', 'FSH(mIU/mL)', 'LH(mIU/mL)'),
+    *_hormone_features('FSH_AMH', 'FSH(mIU/mL)', 'AMH(ng/mL)'),
+    *_hormone_features('LH_AMH', 'LH(mIU/mL)', 'AMH(ng/mL)'),
+    # Recomputed from weight and height; the supplied BMI is only used when they are missing
+    DerivedFeature('BMI', 'bmi', ('Weight (Kg)', 'Height(Cm)'), clip=(0, 100)),
+)
+
+OPERATIONS = {
+    'sum': lambda a, b: a + b,
+    'product': lambda a, b: a * b,
+    'ratio': lambda a, b: a / (b + EPSILON),
+    'bmi': lambda weight, height: weight / (height / 100) ** 2,
+}
+
+def default_feature_names():
+    """Feature order implied by the spec: raw columns, then new derived columns."""
+    raw_columns = [raw.column for raw in RAW_FEATURES]
+    return raw_columns + [d.name for d in DERIVED_FEATURES if d.name not in raw_columns]
+
+def compute_derived(derived, a, b):
+    """Evaluate one derived feature on two float arrays."""
+    with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+        values = OPERATIONS[derived.op](a, b)
+    if derived.clip is not None:
+        values = np.clip(values, *derived.clip)
+    return values
+
+def encode_value(value, encoding=None):
+    """Convert one raw input value to a float; missing values become NaN."""
+    if value is None:
+        return np.nan
+    if isinstance(value, (bool, int, float, np.number)):
+        return float(value)
+    text = str(value).strip()
+    if not text:
+        return np.nan
+    if encoding is not None and text.lower() in encoding:
+        return float(encoding[text.lower()])
+    return float(text)
+
+def encode_series(series, encoding):
+    """Vectorized encode_value for a DataFrame column; unparseable values become NaN."""
+    numeric = pd.to_numeric(series, errors='coerce')
+    labels = series.astype(str).str.strip().str.lower().map(encoding)
+    return numeric.fillna(labels).astype('float64')
+
+def encode_categorical_columns(df):
+    """Encode the Y/N, blood group and cycle columns of a training frame in place."""
+    for raw in RAW_FEATURES:
+        if raw.encoding is not None and raw.column in df.columns:
+            df[raw.column] = encode_series(df[raw.column], raw.encoding)
+    return df
+
+def add_derived_features(df):
+    """Add every derived feature whose inputs are present to a training frame."""
+    for derived in DERIVED_FEATURES:
+        if all(col in df.columns for col in derived.inputs):
+            a, b = (df[col].astype(float).to_numpy() for col in derived.inputs)
+            values = compute_derived(derived, a, b)
+            if derived.name in df.columns:
+                values = np.where(np.isnan(values), df[derived.name].astype(float).to_numpy(), values)
+            df[derived.name] = values
+    return df
+
+
+class FeaturePipeline:
+    """Turns raw records into the model's feature matrix in training column order."""
+
+    def __init__(self, feature_names=None, encodings=None):
+        """
+        Args:
+            feature_names (list): Model column order; defaults to the spec order
+            encodings (dict): Category maps by column, e.g. from a fitted Preprocessor;
+                columns not listed use the spec encoding
+        """
+        self.feature_names = list(feature_names or default_feature_names())
+        self.raw_features = RAW_FEATURES
+        self.raw_columns = [raw.column for raw in RAW_FEATURES]
+        encodings = encodings or {}
+        self.encodings = [encodings.get(raw.column, raw.encoding) for raw in RAW_FEATURES]
+
+        # Map every accepted request key to its raw column
+        self.key_index = {}
+        for i, raw in enumerate(RAW_FEATURES):
+            for key in (raw.key, raw.column) + tuple(raw.aliases):
+                self.key_index[key] = i
+
+        # Derived columns are appended after the raw ones in the working matrix
+        raw_index = {col: i for i, col in enumerate(self.raw_columns)}
+        self._derived = [
+            (d, raw_index[d.inputs[0]], raw_index[d.inputs[1]], raw_index.get(d.name))
+            for d in DERIVED_FEATURES
+        ]
+        slot = dict(raw_index)
+        for k, derived in enumerate(DERIVED_FEATURES):
+            slot[derived.name] = len(self.raw_columns) + k
+
+        unknown = [name for name in self.feature_names if name not in slot]
+        if unknown:
+            raise ValueError(f"no feature spec for columns: {unknown}")
+        self._column_index = np.array([slot[name] for name in self.feature_names], dtype=np.intp)
+
+    @classmethod
+    def load(cls, path=DEFAULT_FEATURE_NAMES_PATH, encodings=None):
+        """Build a pipeline using the column order in feature_names.txt, if present."""
+        if path and os.path.exists(path):
+            with open(path) as f:
+                names = [line.strip() for line in f if line.strip()]
+            return cls(names, encodings)
+        return cls(encodings=encodings)
+
+    def parse_record(self, record):
+        """
+        Convert one record (a dict keyed by request keys or training column names)
+        into a raw input row. Missing inputs are NaN; invalid values raise ValueError,
+        as does a record without a single recognised input.
+        """
+        if not isinstance(record, dict):
+            raise ValueError('record must be a JSON object')
+        row = np.full(len(self.raw_columns), np.nan)
+        unknown = []
+        for key, value in record.items():
+            i = self.key_index.get(key)
+            if i is None:
+                unknown.append(key)
+                continue
+            try:
+                row[i] = encode_value(value, self.encodings[i])
+            except (TypeError, ValueError):
+                raise ValueError(f"invalid value for '{key}': {value!r}")
+        # A row of medians only would look like a real, low-risk patient
+        if np.isnan(row).all():
+            message = 'record has no recognised patient fields'
+            if unknown:
+                message += f"; unrecognised keys: {', '.join(map(str, unknown))}"
+            raise ValueError(message)
+        return row
+
+    def parse_frame(self, df):
+        """
+        Vectorized parse_record for a DataFrame whose columns are request keys or
+        training column names. Missing columns and empty cells become NaN; a frame
+        without any recognised column raises ValueError.
+        Returns:
+            tuple: (raw input matrix, per-row errors), where errors[i] is None for a row that
+                parsed and otherwise says why it cannot be scored: an unparseable value, or no
+                recognised value at all, as parse_record would reject it
+        """
+        if not any(col in self.key_index for col in df.columns):
+            raise ValueError(f"no recognised input columns in: {', '.join(map(str, df.columns))}")
+        raw = np.full((len(df), len(self.raw_columns)), np.nan)
+        errors = np.full(len(df), None, dtype=object)
+        for col in df.columns:
+            i = self.key_index.get(col)
+            if i is None:
+                continue
+            series = df[col]
+            encoding = self.encodings[i]
+            if encoding is not None:
+                raw[:, i] = encode_series(series, encoding).to_numpy()
+            else:
+                raw[:, i] = pd.to_numeric(series, errors='coerce').to_numpy(dtype=np.float64, na_value=np.nan)
+            # A filled-in cell that did not parse fails its row, reported for the first such column
+            present = (series.notna() & (series.astype(str).str.strip() != '')).to_numpy()
+            invalid = present & np.isnan(raw[:, i]) & (errors == None)  # noqa: E711
+            if invalid.any():
+                errors[invalid] = [f"invalid value for '{col}': {value!r}" for value in series[invalid]]
+        # A row of medians only would look like a real, low-risk patient
+        empty = np.isnan(raw).all(axis=1) & (errors == None)  # noqa: E711
+        errors[empty] = 'record has no recognised patient fields'
+        return raw, errors
+
+    def transform(self, raw):
+        """Build the (n, features) model matrix from an (n, raw inputs) matrix."""
+        raw = np.asarray(raw, dtype=np.float64)
+        if raw.ndim == 1:
+            raw = raw[None, :]
+        work = np.empty((len(raw), len(self.raw_columns) + len(self._derived)))
+        work[:, :len(self.raw_columns)] = raw
+        for k, (derived, a, b, fallback) in enumerate(self._derived):
+            values = compute_derived(derived, raw[:, a], raw[:, b])
+            if fallback is not None:
+                values = np.where(np.isnan(values), raw[:, fallback], values)
+            work[:, len(self.raw_columns) + k] = values
+        return work[:, self._column_index]
+
+    def transform_records(self, records):
+        """Parse a list of records and return their feature matrix."""
+        return self.transform(np.array([self.parse_record(r) for r in records]).reshape(len(records), -1))
+
+
+class Preprocessor:
+    """
+    Missing-value medians, clip bounds and category maps fitted on the training split.
+
+    Applying the fitted state is a couple of vectorized passes over the matrix, so a
+    single incomplete record is imputed exactly as the training data was.
+    """
+
+    def __init__(self, feature_names, medians, lower, upper, category_maps=None):
+        """
+        Args:
+            feature_names (list): Column order of the matrices being transformed
+            medians (np.ndarray): Value used for a missing entry, per column
+            lower (np.ndarray): Smallest training value per column
+            upper (np.ndarray): Largest training value per column
+            category_maps (dict): {column: {label: code}} used to encode categories
+        """
+        self.feature_names = list(feature_names)
+        self.medians = np.asarray(medians, dtype=np.float64)
+        self.lower = np.asarray(lower, dtype=np.float64)
+        self.upper = np.asarray(upper, dtype=np.float64)
+        self.category_maps = category_maps or {}
+
+    @classmethod
+    def fit(cls, X):
+        """
+        Fit on a training feature frame.
+        Args:
+            X (pd.DataFrame): Encoded training features, NaN where missing
+        Returns:
+            Preprocessor: The fitted state
+        """
+        values = X.to_numpy(dtype=np.float64)
+        observed = ~np.isnan(values).all(axis=0)
+        medians = np.zeros(values.shape[1])
+        # Clipping to the observed range never moves a value across a tree split
+        lower = np.full(values.shape[1], -np.inf)
+        upper = np.full(values.shape[1], np.inf)
+        medians[observed] = np.nanmedian(values[:, observed], axis=0)
+        lower[observed] = np.nanmin(values[:, observed], axis=0)
+        upper[observed] = np.nanmax(values[:, observed], axis=0)
+        category_maps = {
+            raw.column: dict(raw.encoding)
+            for raw in RAW_FEATURES if raw.encoding is not None and raw.column in X.columns
+        }
+        return cls(X.columns, medians, lower, upper, category_maps)
+
+    def transform(self, X):
+        """Impute and clip a feature matrix or frame; frames are returned as frames."""
+        values = X.to_numpy(dtype=np.float64) if isinstance(X, pd.DataFrame) else np.asarray(X, dtype=np.float64)
+        values = np.where(np.isnan(values), self.medians, values)
+        np.clip(values, self.lower, self.upper, out=values)
+        if isinstance(X, pd.DataFrame):
+            return pd.DataFrame(values, index=X.index, columns=X.columns)
+        return values
+
+    def save(self, path=DEFAULT_PREPROCESSOR_PATH):
+        """Write the fitted state as a compressed .npz file."""
+        columns = list(self.category_maps)
+        labels = [label for col in columns for label in self.category_maps[col]]
+        codes = [code for col in columns for code in self.category_maps[col].values()]
+        np.savez_compressed(
+            path,
+            feature_names=np.array(self.feature_names, dtype=str),
+            medians=self.medians,
+            lower=self.lower,
+            upper=self.upper,
+            category_columns=np.array(columns, dtype=str),
+            category_sizes=np.array([len(self.category_maps[col]) for col in columns], dtype=np.int64),
+            category_labels=np.array(labels, dtype=str),
+            category_codes=np.array(codes, dtype=np.float64),
+        )
+
+    @classmethod
+    def load(cls, path=DEFAULT_PREPROCESSOR_PATH):
+        """Read a state written by save(), or return None if there is none."""
+        if not path or not os.path.exists(path):
+            return None
+        with np.load(path, allow_pickle=False) as data:
+            offsets = np.concatenate([[0], np.cumsum(data['category_sizes'])])
+            labels, codes = data['category_labels'].tolist(), data['category_codes'].tolist()
+            category_maps = {
+                col: dict(zip(labels[start:end], codes[start:end]))
+                for col, start, end in zip(data['category_columns'].tolist(), offsets[:-1], offsets[1:])
+            }
+            return cls(
+                data['feature_names'].tolist(), data['medians'], data['lower'], data['upper'], category_maps
+            )
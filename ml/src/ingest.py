@@ -0,0 +1,130 @@
+"""
+Data ingest: convert the training workbook once to a typed Feather file.
+
+Parsing the Excel workbook through openpyxl dominates the start of every
+training run. load_dataset() keeps a columnar copy of a sheet under
+ml/data/cache together with the SHA-256 of the source workbook, and reads that
+copy whenever the hash still matches. The copy is converted into an ordinary,
+writable DataFrame, since preprocessing edits the frame in place.
+
+    python ingest.py            # convert the default workbook if it changed
+    python ingest.py --refresh  # force a rebuild
+"""
+import argparse
+from datetime import datetime
+import hashlib
+import json
+import logging
+import os
+
+import pandas as pd
+
+try:
+    import pyarrow.feather as feather
+except ImportError:  # the cache is skipped without pyarrow
+    feather = None
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'data')
+DEFAULT_WORKBOOK = os.path.join(DATA_DIR, 'PCOS_data_without_infertility.xlsx')
+DEFAULT_SHEET = 'Full_new'
+CACHE_DIR = os.path.join(DATA_DIR, 'cache')
+
+# Object columns become numeric when at least this share of their values parse as numbers
+NUMERIC_SHARE = 0.5
+
+
+def file_sha256(path, chunk_size=1 << 20):
+    """Return the hex SHA-256 of a file's contents."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def cache_paths(source, sheet_name, cache_dir=CACHE_DIR):
+    """Return the (feather, metadata) paths used to cache one sheet of a workbook."""
+    stem = f"{os.path.splitext(os.path.basename(source))[0]}.{sheet_name}"
+    return os.path.join(cache_dir, f"{stem}.feather"), os.path.join(cache_dir, f"{stem}.json")
+
+
+def normalize_types(df):
+    """Give every column a single Arrow-compatible type."""
+    df = df.copy()
+    for col in df.select_dtypes(include=['object']).columns:
+        numeric = pd.to_numeric(df[col], errors='coerce')
+        non_null = df[col].notna().sum()
+        if non_null and numeric.notna().sum() >= NUMERIC_SHARE * non_null:
+            # Stray text such as '1.99.' becomes NaN, as preprocess_data would do anyway
+            df[col] = numeric.astype('float64')
+        else:
+            df[col] = df[col].astype('string')
+    return df
+
+
+def cache_dataframe(df, source, sheet_name, source_hash=None, cache_dir=CACHE_DIR):
+    """Write df as the columnar cache for (source, sheet_name) and return the typed frame."""
+    df = normalize_types(df)
+    if feather is None:
+        logging.warning("pyarrow is not installed; skipping the columnar dataset cache")
+        return df
+
+    os.makedirs(cache_dir, exist_ok=True)
+    data_path, meta_path = cache_paths(source, sheet_name, cache_dir)
+    # Uncompressed, so reading it back costs no decompression
+    feather.write_feather(df, data_path, compression='uncompressed')
+    meta = {
+        'source': os.path.abspath(source),
+        'sheet_name': sheet_name,
+        'sha256': source_hash or file_sha256(source),
+        'rows': len(df),
+        'columns': len(df.columns),
+        'created': datetime.now().isoformat(timespec='seconds'),
+    }
+    # Metadata is written last so a partial write never looks valid
+    with open(meta_path, 'w') as f:
+        json.dump(meta, f, indent=2)
+    return df
+
+
+def load_dataset(source=DEFAULT_WORKBOOK, sheet_name=DEFAULT_SHEET, refresh=False, cache_dir=CACHE_DIR):
+    """
+    Load one sheet of the workbook, preferring the cached columnar copy.
+    Args:
+        source (str): Path to the Excel workbook
+        sheet_name (str): Sheet to load
+        refresh (bool): Rebuild the cache even if the workbook is unchanged
+        cache_dir (str): Directory holding the Feather files
+    Returns:
+        pd.DataFrame: The sheet with one type per column
+    """
+    source_hash = file_sha256(source)
+    data_path, meta_path = cache_paths(source, sheet_name, cache_dir)
+
+    if not refresh and feather is not None and os.path.exists(data_path) and os.path.exists(meta_path):
+        with open(meta_path) as f:
+            meta = json.load(f)
+        if meta.get('sha256') == source_hash and meta.get('sheet_name') == sheet_name:
+            logging.info(f"Loading cached dataset from {data_path}")
+            return feather.read_feather(data_path)
+        logging.info("Workbook changed since the dataset cache was built; rebuilding")
+
+    logging.info(f"Parsing {source} (sheet {sheet_name})")
+    df = pd.read_excel(source, sheet_name=sheet_name)
+    return cache_dataframe(df, source, sheet_name, source_hash, cache_dir)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Convert the training workbook to a cached Feather file.')
+    parser.add_argument('--source', default=DEFAULT_WORKBOOK)
+    parser.add_argument('--sheet', default=DEFAULT_SHEET)
+    parser.add_argument('--refresh', action='store_true', help='rebuild even if the workbook is unchanged')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    df = load_dataset(args.source, args.sheet, refresh=args.refresh)
+    print(f"{len(df)} rows x {len(df.columns)} columns cached in {CACHE_DIR}")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,6 +1,33 @@
+"""
+Small Keras network scored on-device by the mobile app through TensorFlow Lite.
+
+It reads three hormone values (AMH and both beta-HCG measurements), standardized
+with the mean and scale saved in pcos_scaler.json. Running this module trains it
+on the dataset and writes the float32 model plus its float16 and int8 variants:
+
+    python pcos_model.py                    # ml/models/pcos_model*.tflite, pcos_scaler.json
+    python test_model.py --compare          # check the variants with the TFLite interpreter
+
+Copy the chosen variant to assets/models/pcos_model.tflite for the app.
+"""
+import argparse
+import json
+import logging
+import os
+
+import numpy as np
+import pandas as pd
 import tensorflow as tf
 from tensorflow import keras
 
+from ingest import load_dataset
+
+MODELS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'models')
+
+# Inputs of the TFLite model, in order
+FEATURE_COLUMNS = ['AMH(ng/mL)', 'I   beta-HCG(mIU/mL)', 'II    beta-HCG(mIU/mL)']
+TARGET_COLUMN = 'PCOS (Y/N)'
+
 def create_model(input_shape):
     """
     Create the PCOS prediction model architecture
@@ -24,15 +51,131 @@ def create_model(input_shape):
 
     return model
 
-def save_as_tflite(model, output_path):
+# Samples from the representative dataset used to calibrate int8 ranges
+REPRESENTATIVE_SAMPLES = 200
+
+def representative_dataset(X, max_samples=REPRESENTATIVE_SAMPLES):
+    """
+    Build the calibration generator for int8 quantization
+    Args:
+        X (np.ndarray): Scaled training inputs
+        max_samples (int): Number of random rows fed to the converter, besides the extremes
+    Returns:
+        callable: Generator function yielding one (1, n_features) float32 batch at a time
+    """
+    X = np.asarray(X, dtype=np.float32)
+    # Always include each column's extremes: hormone values run to 15 standard deviations,
+    # and rows outside the calibrated range saturate to a very different probability
+    extremes = np.concatenate([X.argmin(axis=0), X.argmax(axis=0)])
+    rows = np.unique(np.concatenate([extremes, np.random.default_rng(42).permutation(len(X))[:max_samples]]))
+
+    def generate():
+        for i in rows:
+            yield [X[i:i + 1]]
+    return generate
+
+def save_as_tflite(model, output_path, quantization=None, representative_data=None):
     """
     Convert Keras model to TFLite format and save
     Args:
         model (keras.Model): Trained Keras model
         output_path (str): Path to save TFLite model
+        quantization (str): None for float32, 'float16' or 'int8' post-training quantization
+        representative_data (np.ndarray): Scaled training inputs, required for 'int8'
     """
+    # The Keras input keeps its None batch dimension, so one invoke can score a whole batch
+    # after resize_tensor_input; converting the model (not a traced function) also folds the
+    # weights into constants, which int8 calibration needs
     converter = tf.lite.TFLiteConverter.from_keras_model(model)
+
+    if quantization == 'float16':
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+        converter.target_spec.supported_types = [tf.float16]
+    elif quantization == 'int8':
+        if representative_data is None:
+            raise ValueError("int8 quantization needs representative_data")
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+        converter.representative_dataset = representative_dataset(representative_data)
+        # Integer kernels inside; inputs and outputs stay float32 so callers are unchanged
+        converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+    elif quantization is not None:
+        raise ValueError(f"unknown quantization: {quantization}")
+
     tflite_model = converter.convert()
     
     with open(output_path, 'wb') as f:
         f.write(tflite_model)
+
+def export_variants(model, output_path, representative_data):
+    """
+    Save the float32 model plus its float16 and int8 variants next to it
+    (pcos_model.tflite, pcos_model.float16.tflite, pcos_model.int8.tflite)
+    Args:
+        model (keras.Model): Trained Keras model
+        output_path (str): Path of the float32 TFLite model
+        representative_data (np.ndarray): Scaled training inputs for int8 calibration
+    Returns:
+        dict: Variant name to file path
+    """
+    stem, ext = os.path.splitext(output_path)
+    paths = {'float32': output_path, 'float16': f"{stem}.float16{ext}", 'int8': f"{stem}.int8{ext}"}
+    for name, path in paths.items():
+        save_as_tflite(model, path, None if name == 'float32' else name, representative_data)
+    return paths
+
+def select_inputs(df):
+    """
+    Pick the model inputs and labels of every row that has all of them
+    Args:
+        df (pd.DataFrame): Dataset sheet
+    Returns:
+        tuple: (unscaled float64 inputs, int labels)
+    """
+    df = df.copy()
+    df.columns = df.columns.str.strip()
+    df = df[FEATURE_COLUMNS + [TARGET_COLUMN]].apply(pd.to_numeric, errors='coerce').dropna()
+    return df[FEATURE_COLUMNS].to_numpy(dtype=np.float64), df[TARGET_COLUMN].to_numpy().astype(int)
+
+def fit_scaler(X):
+    """Mean and scale that standardize X, in the pcos_scaler.json layout."""
+    scale = X.std(axis=0)
+    scale[scale == 0] = 1.0
+    return {'mean': X.mean(axis=0).tolist(), 'scale': scale.tolist()}
+
+def train_and_export(df, output_dir=MODELS_DIR, epochs=100, seed=42):
+    """
+    Train the network on a dataset sheet and write pcos_scaler.json plus every TFLite variant
+    Args:
+        df (pd.DataFrame): Dataset sheet holding FEATURE_COLUMNS and TARGET_COLUMN
+        output_dir (str): Directory for the scaler and the .tflite files
+        epochs (int): Training epochs
+        seed (int): Seed for weight initialization and shuffling
+    Returns:
+        dict: Variant name to file path, as returned by export_variants
+    """
+    X, y = select_inputs(df)
+    scaler = fit_scaler(X)
+    X = ((X - scaler['mean']) / np.array(scaler['scale'])).astype(np.float32)
+    keras.utils.set_random_seed(seed)
+    model = create_model((X.shape[1],))
+    model.fit(X, y, epochs=epochs, batch_size=32, validation_split=0.2, verbose=0)
+
+    os.makedirs(output_dir, exist_ok=True)
+    with open(os.path.join(output_dir, 'pcos_scaler.json'), 'w') as f:
+        json.dump(scaler, f, indent=2)
+    paths = export_variants(model, os.path.join(output_dir, 'pcos_model.tflite'), X)
+    for name, path in paths.items():
+        logging.info(f"Wrote {name} model to {path} ({os.path.getsize(path) / 1024:.1f} KB)")
+    return paths
+
+def main():
+    parser = argparse.ArgumentParser(description="Train the TFLite model and export its quantized variants.")
+    parser.add_argument('--output-dir', default=MODELS_DIR)
+    parser.add_argument('--epochs', type=int, default=100)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    train_and_export(load_dataset(), args.output_dir, args.epochs)
+
+if __name__ == '__main__':
+    main()
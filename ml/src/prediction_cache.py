@@ -0,0 +1,153 @@
+"""
+Bounded cache of risk predictions shared by the API servers and the Streamlit app.
+
+Keys are a hash of the model version and the raw input row after rounding to a
+fixed number of decimals, so resubmitted and near-identical inputs map to the
+same entry whatever order or key aliases the request used. Entries expire
+after a TTL and the least recently used ones are evicted beyond max_entries.
+Seeing a new model version clears the cache, so results from a replaced model
+are never served.
+"""
+from collections import OrderedDict
+import hashlib
+import os
+import threading
+import time
+
+import numpy as np
+
+DEFAULT_MAX_ENTRIES = int(os.environ.get('PCOS_CACHE_SIZE', 10_000))
+DEFAULT_TTL_SECONDS = float(os.environ.get('PCOS_CACHE_TTL', 600))
+DEFAULT_DECIMALS = 4
+
+
+def file_version(*paths):
+    """Short content hash of the given files; missing files are skipped."""
+    digest = hashlib.sha256()
+    for path in paths:
+        if path and os.path.exists(path):
+            with open(path, 'rb') as f:
+                for chunk in iter(lambda: f.read(1 << 20), b''):
+                    digest.update(chunk)
+    return digest.hexdigest()[:12]
+
+
+class PredictionCache:
+    """Thread-safe LRU + TTL cache from quantized input rows to predictions."""
+
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES, ttl_seconds=DEFAULT_TTL_SECONDS,
+                 decimals=DEFAULT_DECIMALS):
+        """
+        Args:
+            max_entries (int): Largest number of cached rows; 0 disables the cache
+            ttl_seconds (float): Lifetime of an entry
+            decimals (int): Inputs are rounded to this many decimals before hashing
+        """
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.decimals = decimals
+        self.version = None
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = self.misses = self.evictions = self.expirations = 0
+
+    def key(self, row, version):
+        """Hash of the version and the canonical (rounded, NaN and -0.0 normalized) row."""
+        row = np.round(np.asarray(row, dtype=np.float64), self.decimals) + 0.0
+        row[np.isnan(row)] = np.nan
+        return hashlib.blake2b(version.encode() + row.tobytes(), digest_size=16).digest()
+
+    def _set_version(self, version):
+        if version != self.version:
+            self._entries.clear()
+            self.version = version
+
+    def get_or_compute(self, rows, version, compute):
+        """
+        Return one prediction per row, calling compute only for rows not in the cache.
+        Args:
+            rows (np.ndarray): (n, n_inputs) raw input rows
+            version (str): Version of the model producing the predictions
+            compute (callable): Maps an (m, n_inputs) matrix to m predictions
+        Returns:
+            np.ndarray: (n,) predictions
+        """
+        rows = np.asarray(rows, dtype=np.float64)
+        if self.max_entries <= 0:
+            return np.asarray(compute(rows), dtype=np.float64)
+
+        keys = [self.key(row, version) for row in rows]
+        values = np.empty(len(rows))
+        missing = []
+        now = time.monotonic()
+        with self._lock:
+            self._set_version(version)
+            for i, key in enumerate(keys):
+                entry = self._entries.get(key)
+                if entry is not None and entry[1] <= now:
+                    del self._entries[key]
+                    self.expirations += 1
+                    entry = None
+                if entry is None:
+                    missing.append(i)
+                else:
+                    self._entries.move_to_end(key)
+                    values[i] = entry[0]
+            self.hits += len(rows) - len(missing)
+            self.misses += len(missing)
+
+        if missing:
+            fresh = np.asarray(compute(rows[missing]), dtype=np.float64)
+            values[missing] = fresh
+            expires = time.monotonic() + self.ttl_seconds
+            with self._lock:
+                # The model may have been swapped while computing; drop stale results
+                if self.version == version:
+                    for i, value in zip(missing, fresh):
+                        self._entries[keys[i]] = (float(value), expires)
+                        self._entries.move_to_end(keys[i])
+                    while len(self._entries) > self.max_entries:
+                        self._entries.popitem(last=False)
+                        self.evictions += 1
+        return values
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """Counters and occupancy of the cache."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'version': self.version,
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'ttl_seconds': self.ttl_seconds,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+            }
+
+
+def merge_stats(stats):
+    """
+    Combine the stats() of the caches of several worker processes. A worker that has
+    not served a request yet has no version; while a hot reload rolls the workers they
+    can report different ones, which are then all listed under 'versions'.
+    """
+    if len(stats) == 1:
+        return stats[0]
+    versions = list(dict.fromkeys(s['version'] for s in stats if s['version'] is not None))
+    merged = {'workers': len(stats), 'version': versions[0] if versions else None,
+              'max_entries': sum(s['max_entries'] for s in stats),
+              'ttl_seconds': stats[0]['ttl_seconds'] if stats else None}
+    for name in ('entries', 'hits', 'misses', 'evictions', 'expirations'):
+        merged[name] = sum(s[name] for s in stats)
+    lookups = merged['hits'] + merged['misses']
+    merged['hit_rate'] = merged['hits'] / lookups if lookups else 0.0
+    if len(versions) > 1:
+        merged['versions'] = versions
+    return merged
@@ -0,0 +1,166 @@
+"""
+File-based model registry.
+
+Every training run publishes its artifacts as one immutable version directory:
+
+    ml/models/registry/
+        CURRENT                          # name of the version being served
+        20261016-234210-3f2a9c1b7d04/
+            pcos_model.joblib, pcos_model.trees.npz, ..., feature_names.txt
+            metrics.json
+            manifest.json                # SHA-256 of every file above
+
+A version is assembled in a hidden staging directory and renamed into place,
+and CURRENT is replaced atomically afterwards, so a reader never sees a
+half-written version. Servers poll CURRENT and hot-swap when it changes.
+Publishing prunes all but the newest versions (see prune()); the version
+CURRENT names is never removed, so a rollback target can be kept by activating it.
+"""
+from datetime import datetime
+import hashlib
+import json
+import logging
+import os
+import shutil
+import tempfile
+
+from ingest import file_sha256
+
+DEFAULT_REGISTRY_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'models', 'registry')
+CURRENT_FILE = 'CURRENT'
+MANIFEST_FILE = 'manifest.json'
+METRICS_FILE = 'metrics.json'
+# Versions kept by publish() unless told otherwise; None keeps every version
+DEFAULT_KEEP_VERSIONS = 10
+
+
+def _write_atomic(path, text):
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.tmp-')
+    with os.fdopen(fd, 'w') as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+
+
+def publish(artifacts, metrics=None, registry_dir=DEFAULT_REGISTRY_DIR, activate=True, keep=DEFAULT_KEEP_VERSIONS):
+    """
+    Copy a training run's artifacts into a new version directory.
+    Args:
+        artifacts (list): Paths of the files making up the model
+        metrics (dict): Training and evaluation metrics stored as metrics.json
+        registry_dir (str): Registry root
+        activate (bool): Point CURRENT at the new version
+        keep (int): Newest versions to keep afterwards, see prune(); None keeps all of them
+    Returns:
+        str: The new version name
+    """
+    os.makedirs(registry_dir, exist_ok=True)
+    staging = tempfile.mkdtemp(dir=registry_dir, prefix='.staging-')
+    try:
+        for path in artifacts:
+            shutil.copy2(path, os.path.join(staging, os.path.basename(path)))
+        with open(os.path.join(staging, METRICS_FILE), 'w') as f:
+            json.dump(metrics or {}, f, indent=2)
+
+        checksums = {
+            name: file_sha256(os.path.join(staging, name))
+            for name in sorted(os.listdir(staging))
+        }
+        # The version name carries a digest of the contents, so identical runs are recognizable
+        content_hash = hashlib.sha256(json.dumps(checksums, sort_keys=True).encode()).hexdigest()[:12]
+        version = f"{datetime.now().strftime('%Y%m%d-%H%M%S')}-{content_hash}"
+        manifest = {
+            'version': version,
+            'created': datetime.now().isoformat(timespec='seconds'),
+            'files': checksums,
+        }
+        with open(os.path.join(staging, MANIFEST_FILE), 'w') as f:
+            json.dump(manifest, f, indent=2)
+
+        os.rename(staging, os.path.join(registry_dir, version))
+    except BaseException:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
+
+    if activate:
+        activate_version(version, registry_dir)
+    if keep is not None:
+        prune(keep, registry_dir)
+    return version
+
+
+def prune(keep, registry_dir=DEFAULT_REGISTRY_DIR):
+    """
+    Delete all but the newest `keep` versions, never the one CURRENT points at.
+    Args:
+        keep (int): Number of most recent versions to keep, at least 1
+        registry_dir (str): Registry root
+    Returns:
+        list: Names of the removed versions
+    """
+    if keep < 1:
+        raise ValueError(f"keep must be at least 1, got {keep}")
+    current = current_version(registry_dir)
+    # Names start with a timestamp, so the oldest come first
+    stale = [version for version in list_versions(registry_dir)[:-keep] if version != current]
+    for version in stale:
+        # Renamed first so a reader sees the whole version or none of it
+        trash = tempfile.mkdtemp(dir=registry_dir, prefix='.deleted-')
+        os.rename(version_dir(version, registry_dir), os.path.join(trash, version))
+        shutil.rmtree(trash, ignore_errors=True)
+        logging.info(f"Removed registry version {version}")
+    return stale
+
+
+def activate_version(version, registry_dir=DEFAULT_REGISTRY_DIR):
+    """Point CURRENT at an existing, intact version (also used to roll back)."""
+    verify(version_dir(version, registry_dir))
+    _write_atomic(os.path.join(registry_dir, CURRENT_FILE), version + '\n')
+    logging.info(f"Registry now serves version {version}")
+
+
+def current_version(registry_dir=DEFAULT_REGISTRY_DIR):
+    """Name of the version CURRENT points at, or None if nothing was published."""
+    try:
+        with open(os.path.join(registry_dir, CURRENT_FILE)) as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def version_dir(version, registry_dir=DEFAULT_REGISTRY_DIR):
+    return os.path.join(registry_dir, version)
+
+
+def list_versions(registry_dir=DEFAULT_REGISTRY_DIR):
+    """Published version names, oldest first."""
+    if not os.path.isdir(registry_dir):
+        return []
+    return sorted(
+        name for name in os.listdir(registry_dir)
+        if os.path.isfile(os.path.join(registry_dir, name, MANIFEST_FILE))
+    )
+
+
+def read_manifest(path):
+    with open(os.path.join(path, MANIFEST_FILE)) as f:
+        return json.load(f)
+
+
+def read_metrics(path):
+    metrics_path = os.path.join(path, METRICS_FILE)
+    if not os.path.exists(metrics_path):
+        return {}
+    with open(metrics_path) as f:
+        return json.load(f)
+
+
+def verify(path):
+    """Check every file of a version against its manifest; raises ValueError on a mismatch."""
+    manifest = read_manifest(path)
+    for name, expected in manifest['files'].items():
+        file_path = os.path.join(path, name)
+        if not os.path.exists(file_path):
+            raise ValueError(f"{path}: {name} is missing")
+        if file_sha256(file_path) != expected:
+            raise ValueError(f"{path}: checksum mismatch for {name}")
+    return manifest
@@ -1,49 +1,144 @@
+import argparse
+import os
+import time
+
 import tensorflow as tf
 import numpy as np
 import json
 
+from ingest import load_dataset
+from pcos_model import MODELS_DIR, select_inputs
+
+DATA_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'data', 'PCOS_data_without_infertility.xlsx')
+
+# Variants written by pcos_model.export_variants
+VARIANTS = {
+    'float32': 'pcos_model.tflite',
+    'float16': 'pcos_model.float16.tflite',
+    'int8': 'pcos_model.int8.tflite',
+}
+
+def load_interpreter(path, num_threads=None):
+    """Load a TFLite model whose input has a dynamic batch dimension."""
+    interpreter = tf.lite.Interpreter(model_path=path, num_threads=num_threads)
+    interpreter.allocate_tensors()
+    return interpreter
+
+def predict_batch(interpreter, X, batch_size=1024):
+    """
+    Score a matrix of scaled inputs, one invoke per batch of up to batch_size rows.
+    Args:
+        interpreter (tf.lite.Interpreter): Loaded interpreter
+        X (np.ndarray): (n, n_features) scaled inputs
+        batch_size (int): Largest batch passed to a single invoke
+    Returns:
+        np.ndarray: (n,) predicted probabilities
+    """
+    input_details = interpreter.get_input_details()[0]
+    output_details = interpreter.get_output_details()[0]
+    X = np.asarray(X, dtype=np.float32)
+    probabilities = np.empty(len(X), dtype=np.float32)
+
+    for start in range(0, len(X), batch_size):
+        batch = X[start:start + batch_size]
+        # Tensors are only reallocated when the batch shape changes
+        if tuple(interpreter.get_input_details()[0]['shape']) != batch.shape:
+            interpreter.resize_tensor_input(input_details['index'], batch.shape)
+            interpreter.allocate_tensors()
+        interpreter.set_tensor(input_details['index'], batch)
+        interpreter.invoke()
+        probabilities[start:start + len(batch)] = interpreter.get_tensor(output_details['index'])[:, 0]
+    return probabilities
+
+def load_scaler():
+    """Load the mean/scale used to standardize the TFLite model's inputs."""
+    with open(os.path.join(MODELS_DIR, 'pcos_scaler.json'), 'r') as f:
+        scaler_params = json.load(f)
+    return np.array(scaler_params['mean']), np.array(scaler_params['scale'])
+
+def load_eval_data(mean, scale):
+    """Return scaled inputs and labels for every dataset row with all model inputs present."""
+    X, y = select_inputs(load_dataset(DATA_PATH, sheet_name='Full_new'))
+    return ((X - mean) / scale).astype(np.float32), y
+
+def best_latency(interpreter, X, repeat=5):
+    """Best wall-clock seconds to score X over repeat runs."""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        predict_batch(interpreter, X, batch_size=len(X))
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+def compare_variants(X, y, repeat=5):
+    """
+    Report latency, accuracy and drift from float32 for every exported variant.
+    Returns:
+        list: One result dict per variant found in MODELS_DIR
+    """
+    results = []
+    reference = None
+    for name, filename in VARIANTS.items():
+        path = os.path.join(MODELS_DIR, filename)
+        if not os.path.exists(path):
+            print(f"{name}: {filename} not found, skipping")
+            continue
+        interpreter = load_interpreter(path)
+        probabilities = predict_batch(interpreter, X)
+        result = {
+            'variant': name,
+            'size_kb': os.path.getsize(path) / 1024,
+            'batch_ms': best_latency(interpreter, X, repeat) * 1000,
+            'single_ms': best_latency(interpreter, X[:1], repeat) * 1000,
+            'accuracy': float(((probabilities >= 0.5) == y).mean()),
+        }
+        if reference is None:
+            reference = result, probabilities
+        ref_result, ref_probabilities = reference
+        result['accuracy_delta'] = result['accuracy'] - ref_result['accuracy']
+        result['max_prob_delta'] = float(np.abs(probabilities - ref_probabilities).max())
+        results.append(result)
+
+    print(f"\nScoring {len(X)} rows per invoke (first variant is the reference):")
+    print(f"{'variant':>8} {'size KB':>8} {'batch ms':>9} {'1 row ms':>9} {'accuracy':>9} {'acc delta':>10} {'max |dp|':>9}")
+    for r in results:
+        print(f"{r['variant']:>8} {r['size_kb']:>8.1f} {r['batch_ms']:>9.3f} {r['single_ms']:>9.3f} "
+              f"{r['accuracy']:>9.4f} {r['accuracy_delta']:>+10.4f} {r['max_prob_delta']:>9.5f}")
+    return results
+
 def test_model():
     """Test the trained model with sample data."""
     # Load the TFLite model
-    interpreter = tf.lite.Interpreter(model_path='../models/pcos_model.tflite')
-    interpreter.allocate_tensors()
-    
-    # Get input and output tensors
-    input_details = interpreter.get_input_details()
-    output_details = interpreter.get_output_details()
-    
-    # Load scaler parameters
-    with open('../models/pcos_scaler.json', 'r') as f:
-        scaler_params = json.load(f)
-    
+    interpreter = load_interpreter(os.path.join(MODELS_DIR, VARIANTS['float32']))
+    mean, scale = load_scaler()
+
     # Sample test data
     test_data = np.array([
         [5.0, 10.0, 15.0],  # Sample 1
         [2.5, 5.0, 7.5],    # Sample 2
         [7.5, 15.0, 22.5]   # Sample 3
     ])
-    
+
     print("Testing model with sample data...")
-    
-    for i, sample in enumerate(test_data):
-        # Scale the input data
-        scaled_data = (sample - np.array(scaler_params['mean'])) / np.array(scaler_params['scale'])
-        scaled_data = scaled_data.reshape(1, -1).astype(np.float32)
-        
-        # Set the input tensor
-        interpreter.set_tensor(input_details[0]['index'], scaled_data)
-        
-        # Run inference
-        interpreter.invoke()
-        
-        # Get the output tensor
-        output_data = interpreter.get_tensor(output_details[0]['index'])
-        probability = float(output_data[0][0])
-        
+
+    # Scale and score all samples with a single invoke
+    probabilities = predict_batch(interpreter, (test_data - mean) / scale)
+
+    for i, (sample, probability) in enumerate(zip(test_data, probabilities)):
         print(f"\nSample {i+1}:")
         print(f"Input values: AMH={sample[0]}, Beta-HCG I={sample[1]}, Beta-HCG II={sample[2]}")
         print(f"Prediction probability: {probability:.2f}")
         print(f"Predicted class: {'PCOS' if probability >= 0.5 else 'No PCOS'}")
 
-if __name__ == '__main__':
+def main():
+    parser = argparse.ArgumentParser(description="Test the TFLite model and compare its quantized variants.")
+    parser.add_argument('--compare', action='store_true', help="score the dataset with every exported variant")
+    parser.add_argument('--repeat', type=int, default=5, help="timing repetitions per variant")
+    args = parser.parse_args()
+
     test_model()
+    if args.compare:
+        compare_variants(*load_eval_data(*load_scaler()), repeat=args.repeat)
+
+if __name__ == '__main__':
+    main()
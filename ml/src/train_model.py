@@ -1,15 +1,30 @@
+import argparse
+import json
 import os
 import sys
 import numpy as np
 import pandas as pd
 import logging
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
 from sklearn.model_selection import train_test_split, StratifiedKFold
-from sklearn.metrics import classification_report
+from sklearn.metrics import accuracy_score, brier_score_loss, classification_report, log_loss
 from catboost import CatBoostClassifier
 import joblib
 import traceback
 
+from artifact_cache import DEFAULT_MAX_BYTES, ArtifactCache, code_fingerprint
+import features as features_module
+from features import (
+    YES_NO_CODES, Preprocessor, add_derived_features, default_feature_names,
+    encode_categorical_columns, encode_series
+)
+import ingest
+from ingest import file_sha256, load_dataset
+import registry
+from tree_engine import export_ensemble, export_oblivious_trees
+from tuning import DEFAULT_DB_PATH, successive_halving
+
 # Set up logging
 log_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "logs")
 os.makedirs(log_dir, exist_ok=True)
@@ -26,6 +41,22 @@ logging.basicConfig(
 
 # Constants
 RANDOM_SEED = 42
+N_FOLDS = 5
+
+# CatBoost settings shared by the cross-validation folds and the final model
+MODEL_PARAMS = {
+    'iterations': 1000,
+    'learning_rate': 0.02,
+    'depth': 6,
+    'l2_leaf_reg': 3,
+    'loss_function': 'Logloss',
+    'random_seed': RANDOM_SEED,
+    'verbose': 100,
+    'early_stopping_rounds': 50,
+    'task_type': 'CPU',
+    'grow_policy': 'SymmetricTree',  # Add this to fix max_leaves error
+    'auto_class_weights': 'Balanced'  # Handle class imbalance
+}
 
 def binarize(val):
     """Convert various forms of binary input to 1/0."""
@@ -41,19 +72,10 @@ def binarize(val):
 def engineer_features(df):
     """Create engineered features to improve model performance."""
     
-    # Calculate BMI categories
-    def get_bmi_category(bmi):
-        if bmi < 18.5:
-            return 0  # Underweight
-        elif bmi < 25:
-            return 1  # Normal
-        elif bmi < 30:
-            return 2  # Overweight
-        else:
-            return 3  # Obese
-    
+    # Calculate BMI categories: 0 underweight, 1 normal, 2 overweight, 3 obese (missing BMI also lands in 3)
     if 'BMI' in df.columns:
-        df['BMI_Category'] = df['BMI'].apply(get_bmi_category)
+        bmi = df['BMI'].to_numpy(dtype=float)
+        df['BMI_Category'] = np.select([bmi < 18.5, bmi < 25, bmi < 30], [0, 1, 2], default=3)
     
     # Calculate Follicle-related features
     if 'Follicle No. (R)' in df.columns and 'Follicle No. (L)' in df.columns:
@@ -78,10 +100,8 @@ def engineer_features(df):
     
     # Calculate Cycle Regularity Score with more detail
     if 'Cycle length(days)' in df.columns and 'Cycle(R/I)' in df.columns:
-        df['Cycle_Score'] = df.apply(
-            lambda x: abs(x['Cycle length(days)'] - 28) * (2 if x['Cycle(R/I)'] == 0 else 1),
-            axis=1
-        )
+        # Irregular cycles (coded 0) weigh double
+        df['Cycle_Score'] = (df['Cycle length(days)'] - 28).abs() * np.where(df['Cycle(R/I)'] == 0, 2, 1)
         # Add severity categories for cycle length
         df['Cycle_Severity'] = pd.cut(
             df['Cycle length(days)'],
@@ -133,120 +153,6 @@ def engineer_features(df):
     
     return df
 
-def load_and_preprocess_data():
-    """Load and preprocess PCOS data."""
-    script_dir = os.path.dirname(os.path.abspath(__file__))
-    data_dir = os.path.join(script_dir, "..", "data")
-    
-    # Define the columns we want to use - exactly matching the dataset
-    SELECTED_COLUMNS = [
-        'PCOS (Y/N)', ' Age (yrs)', 'Weight (Kg)', 'Height(Cm) ', 'BMI',
-        'Blood Group', 'Pulse rate(bpm) ', 'RR (breaths/min)', 'Hb(g/dl)',
-        'Cycle(R/I)', 'Cycle length(days)', 'Marraige Status (Yrs)',
-        'Pregnant(Y/N)', 'No. of aborptions', '  I   beta-HCG(mIU/mL)',
-        'II    beta-HCG(mIU/mL)', 'FSH(mIU/mL)', 'LH(mIU/mL)', 'FSH/LH',
-        'Hip(inch)', 'Waist(inch)', 'Waist:Hip Ratio', 'TSH (mIU/L)',
-        'AMH(ng/mL)', 'PRL(ng/mL)', 'Vit D3 (ng/mL)', 'PRG(ng/mL)',
-        'RBS(mg/dl)', 'Weight gain(Y/N)', 'hair growth(Y/N)',
-        'Skin darkening (Y/N)', 'Hair loss(Y/N)', 'Pimples(Y/N)',
-        'Fast food (Y/N)', 'Reg.Exercise(Y/N)', 'BP _Systolic (mmHg)',
-        'BP _Diastolic (mmHg)', 'Follicle No. (L)', 'Follicle No. (R)',
-        'Avg. F size (L) (mm)', 'Avg. F size (R) (mm)', 'Endometrium (mm)'
-    ]
-    
-    logging.info(f"Loading data from: {data_dir}")
-    
-    try:
-        # Load the main dataset from the Full_new sheet
-        df = pd.read_excel(
-            os.path.join(data_dir, "PCOS_data_without_infertility.xlsx"),
-            sheet_name="Full_new"
-        )
-        
-        # Remove unwanted columns immediately
-        columns_to_drop = ['Sl. No', 'Patient File No.']
-        df = df.drop(columns=columns_to_drop, errors='ignore')
-        
-        logging.info("\nOriginal columns after removing unwanted ones: %s", df.columns.tolist())
-        
-        # Clean column names by stripping whitespace
-        df.columns = df.columns.str.strip()
-        
-        # Map original column names to our standardized names
-        column_mapping = {col.strip(): col.strip() for col in df.columns}
-        df = df.rename(columns=column_mapping)
-        
-        logging.info("\nCleaned columns: %s", df.columns.tolist())
-        
-        # Clean up the SELECTED_COLUMNS list
-        clean_selected_columns = [col.strip() for col in SELECTED_COLUMNS]
-        
-        # Check which columns are missing
-        missing_cols = set(clean_selected_columns) - set(df.columns)
-        if missing_cols:
-            logging.warning("\nWarning: Missing columns: %s", missing_cols)
-            # Remove missing columns from our selection
-            clean_selected_columns = [col for col in clean_selected_columns if col not in missing_cols]
-        
-        # Select only the columns we want to use
-        df = df[clean_selected_columns]
-        
-        logging.info("Successfully loaded dataset")
-        logging.info(f"Total records: {len(df)}")
-        
-        # Clean column names
-        df.columns = df.columns.str.strip()
-        
-        # Print data types before conversion
-        logging.info("\nData types before conversion:")
-        logging.info("%s", df.dtypes)
-        
-        # Convert binary columns to numeric (using exact column names from dataset)
-        binary_columns = [
-            'PCOS (Y/N)', 'Pregnant(Y/N)', 'Weight gain(Y/N)',
-            'hair growth(Y/N)', 'Skin darkening (Y/N)', 'Hair loss(Y/N)',
-            'Pimples(Y/N)', 'Fast food (Y/N)', 'Reg.Exercise(Y/N)'
-        ]
-        
-        for col in binary_columns:
-            if col in df.columns:
-                df[col] = df[col].map({'Yes': 1, 'No': 0, 'Y': 1, 'N': 0, 1: 1, 0: 0})
-        
-        # Convert blood group to numeric
-        blood_group_map = {'A+': 0, 'A-': 1, 'B+': 2, 'B-': 3, 'O+': 4, 'O-': 5, 'AB+': 6, 'AB-': 7}
-        df['Blood Group'] = df['Blood Group'].map(blood_group_map)
-        
-        # Convert cycle regularity to numeric
-        df['Cycle(R/I)'] = df['Cycle(R/I)'].map({'R': 1, 'I': 0})
-        
-        # Convert all numeric columns to float
-        numeric_cols = df.select_dtypes(include=['object']).columns
-        for col in numeric_cols:
-            if col not in ['Blood Group']:  # Skip already converted columns
-                df[col] = pd.to_numeric(df[col], errors='coerce')
-        
-        # Add engineered features
-        df = engineer_features(df)
-        
-        # Handle missing values
-        numeric_columns = df.select_dtypes(include=['float64', 'int64']).columns
-        df[numeric_columns] = df[numeric_columns].fillna(df[numeric_columns].mean())
-        
-        # Print data types after conversion
-        logging.info("\nData types after conversion:")
-        logging.info("%s", df.dtypes)
-        
-        # Remove any unwanted columns (like 'Sl. No' or empty columns)
-        columns_to_drop = ['Sl. No', 'Patient File No.', 'Unnamed: 44'] 
-        df = df.drop(columns=[col for col in columns_to_drop if col in df.columns])
-        
-        return df
-        
-    except Exception as e:
-        logging.error(f"Error in data preprocessing: {str(e)}")
-        logging.error(traceback.format_exc())
-        raise
-
 def preprocess_data(df):
     """
     Preprocess the PCOS dataset with robust feature engineering and data cleaning.
@@ -262,78 +168,34 @@ def preprocess_data(df):
         for col in numeric_cols:
             df[col] = pd.to_numeric(df[col], errors='coerce')
         
-        # Binary columns conversion
-        binary_columns = [
-            'PCOS (Y/N)', 'Pregnant(Y/N)', 'Weight gain(Y/N)', 'hair growth(Y/N)', 
-            'Skin darkening (Y/N)', 'Hair loss(Y/N)', 'Pimples(Y/N)',
-            'Fast food (Y/N)', 'Reg.Exercise(Y/N)'
-        ]
-        
         # Log data quality before conversion
         logging.info("\nMissing values before preprocessing:")
         logging.info(df.isnull().sum()[df.isnull().sum() > 0])
         
-        # Handle binary columns
-        for col in binary_columns:
-            if col in df.columns:
-                # Convert string values to numeric
-                df[col] = df[col].map({'Yes': 1, 'No': 0, 'Y': 1, 'N': 0, 1.0: 1, 0.0: 0})
-                df[col] = df[col].astype('float64')
-                logging.info(f"Binarized column: {col}")
-        
-        # Handle blood group conversion
-        if 'Blood Group' in df.columns:
-            blood_group_map = {'A+': 0, 'A-': 1, 'B+': 2, 'B-': 3, 'O+': 4, 'O-': 5, 'AB+': 6, 'AB-': 7}
-            df['Blood Group'] = df['Blood Group'].map(blood_group_map)
-            df['Blood Group'] = df['Blood Group'].astype('float64')
-            
+        # Encode the target plus the Y/N, blood group and cycle columns with the shared feature spec
+        if 'PCOS (Y/N)' in df.columns:
+            df['PCOS (Y/N)'] = encode_series(df['PCOS (Y/N)'], YES_NO_CODES)
+        df = encode_categorical_columns(df)
+        logging.info("Encoded categorical columns")
+        
         # Make sure all remaining non-numeric columns are converted to numeric
         object_columns = df.select_dtypes(include=['object']).columns
         for col in object_columns:
             df[col] = pd.to_numeric(df[col], errors='coerce')
         
-        # Calculate follicle ratios with safeguards against division by zero
-        if 'Follicle No. (R)' in df.columns and 'Follicle No. (L)' in df.columns:
-            df['Follicle_Sum'] = df['Follicle No. (R)'] + df['Follicle No. (L)']
-            df['Follicle_Ratio'] = df['Follicle No. (R)'].astype(float) / (df['Follicle No. (L)'].astype(float) + 1e-5)
-            df['Follicle_Ratio'] = df['Follicle_Ratio'].clip(0, 10)
-            logging.info("Calculated follicle features")
-        
-        # Hormone feature engineering with proper type conversion
-        hormone_pairs = [
-            ('FSH(mIU/mL)', 'LH(mIU/mL)'),
-            ('FSH(mIU/mL)', 'AMH(ng/mL)'),
-            ('LH(mIU/mL)', 'AMH(ng/mL)')
-        ]
-        
-        for h1, h2 in hormone_pairs:
-            if h1 in df.columns and h2 in df.columns:
-                df[h1] = pd.to_numeric(df[h1], errors='coerce')
-                df[h2] = pd.to_numeric(df[h2], errors='coerce')
-                
-                ratio_name = f"{h1.split('(')[0]}_{h2.split('(')[0]}"
-                df[f'{ratio_name}_Ratio'] = df[h1].astype(float) / (df[h2].astype(float) + 1e-5)
-                df[f'{ratio_name}_Product'] = df[h1].astype(float) * df[h2].astype(float)
-                df[f'{ratio_name}_Sum'] = df[h1].astype(float) + df[h2].astype(float)
-                df[f'{ratio_name}_Ratio'] = df[f'{ratio_name}_Ratio'].clip(-10, 10)
-                logging.info(f"Created hormone features for {ratio_name}")
-        
-        # BMI-related features
-        if all(col in df.columns for col in ['Weight (Kg)', 'Height(Cm)']):
-            df['Weight (Kg)'] = pd.to_numeric(df['Weight (Kg)'], errors='coerce')
-            df['Height(Cm)'] = pd.to_numeric(df['Height(Cm)'], errors='coerce')
-            
-            height_m = df['Height(Cm)'].astype(float) / 100
-            df['BMI'] = df['Weight (Kg)'].astype(float) / (height_m ** 2)
-            df['BMI'] = df['BMI'].clip(0, 100)  # Remove unrealistic values
-            logging.info("Calculated BMI features")
+        # Follicle, hormone and BMI features, defined once in features.py for training and serving
+        df = add_derived_features(df)
+        logging.info("Calculated derived features")
         
         # Handle missing values after all conversions
         numeric_columns = df.select_dtypes(include=['float64', 'int64']).columns
         for col in numeric_columns:
             df[col] = pd.to_numeric(df[col], errors='coerce')
             
-        df = df.fillna(df.median())
+        # Missing features are imputed by the Preprocessor fitted on the training split;
+        # rows without a label cannot be used at all
+        if 'PCOS (Y/N)' in df.columns:
+            df = df.dropna(subset=['PCOS (Y/N)'])
         logging.info("Handled missing values")
         
         # Final check for any remaining non-numeric columns
@@ -355,57 +217,88 @@ def preprocess_data(df):
         logging.error(traceback.format_exc())
         raise
 
-def train_model(X_train, y_train, X_test, y_test):
+def build_model(thread_count=-1, **overrides):
+    """Create a CatBoostClassifier with the shared parameters, optionally overridden."""
+    return CatBoostClassifier(**{**MODEL_PARAMS, **overrides}, thread_count=thread_count)
+
+def fit_fold(fold, X_fold_train, y_fold_train, X_fold_val, y_fold_val, thread_count, params=None):
+    """
+    Train and evaluate one cross-validation fold on its own model instance.
+    Runs in a worker process, so it only returns results and does not log.
+    Returns:
+        tuple: (fold number, fitted model, metrics dict)
+    """
+    model = build_model(thread_count=thread_count, **(params or {}))
+    model.fit(
+        X_fold_train, y_fold_train,
+        eval_set=[(X_fold_val, y_fold_val)],
+        verbose=False
+    )
+    
+    # Evaluate on validation fold
+    y_fold_pred = model.predict(X_fold_val)
+    fold_report = classification_report(y_fold_val, y_fold_pred, output_dict=True, zero_division=1)
+    
+    # Use macro avg for all metrics
+    metrics = {
+        'accuracy': fold_report['accuracy'],
+        'precision': fold_report['macro avg']['precision'],
+        'recall': fold_report['macro avg']['recall'],
+        'f1': fold_report['macro avg']['f1-score'],
+    }
+    return fold, model, metrics
+
+def cross_validate(X_train, y_train, n_jobs=None, params=None):
+    """
+    Run stratified k-fold cross-validation with the folds trained concurrently.
+    Each worker process gets cpu_count // n_jobs CatBoost threads so the folds
+    together do not oversubscribe the machine.
+    Returns:
+        tuple: (fold models in fold order, list of per-fold metrics dicts)
+    """
+    skf = StratifiedKFold(n_splits=N_FOLDS, shuffle=True, random_state=RANDOM_SEED)
+    folds = [
+        (fold, X_train.iloc[train_idx], y_train.iloc[train_idx], X_train.iloc[val_idx], y_train.iloc[val_idx])
+        for fold, (train_idx, val_idx) in enumerate(skf.split(X_train, y_train), 1)
+    ]
+    
+    cpu_count = os.cpu_count() or 1
+    n_jobs = max(1, min(len(folds), n_jobs or cpu_count))
+    thread_count = max(1, cpu_count // n_jobs)
+    logging.info(f"Training {len(folds)} folds with {n_jobs} worker(s), {thread_count} thread(s) each")
+    
+    if n_jobs == 1:
+        results = [fit_fold(*fold_data, thread_count, params) for fold_data in folds]
+    else:
+        with ProcessPoolExecutor(max_workers=n_jobs) as pool:
+            futures = [pool.submit(fit_fold, *fold_data, thread_count, params) for fold_data in folds]
+            results = [future.result() for future in futures]
+    
+    results.sort(key=lambda result: result[0])
+    return [model for _, model, _ in results], [metrics for _, _, metrics in results]
+
+def train_model(X_train, y_train, X_test, y_test, n_jobs=None, params=None):
     """
     Train and evaluate the PCOS prediction model using CatBoost with cross-validation.
+    params optionally overrides MODEL_PARAMS, e.g. with the result of a tuning run.
+    Returns:
+        tuple: (final model, feature importance frame, fitted fold models, metrics dict)
     """
     logging.info("Starting model training with cross-validation...")
     try:
-        # Initialize model with optimized parameters
-        model = CatBoostClassifier(
-            iterations=1000,
-            learning_rate=0.02,
-            depth=6,
-            l2_leaf_reg=3,
-            loss_function='Logloss',
-            random_seed=RANDOM_SEED,
-            verbose=100,
-            early_stopping_rounds=50,
-            task_type='CPU',
-            grow_policy='SymmetricTree',  # Add this to fix max_leaves error
-            auto_class_weights='Balanced'  # Handle class imbalance
-        )
-        
-        # Perform stratified k-fold cross-validation
+        # Perform stratified k-fold cross-validation, one model per fold
         cv_scores = {'accuracy': [], 'precision': [], 'recall': [], 'f1': []}
-        skf = StratifiedKFold(n_splits=5, shuffle=True, random_state=RANDOM_SEED)
+        fold_models, fold_metrics = cross_validate(X_train, y_train, n_jobs=n_jobs, params=params)
         
-        for fold, (train_idx, val_idx) in enumerate(skf.split(X_train, y_train), 1):
-            X_fold_train, X_fold_val = X_train.iloc[train_idx], X_train.iloc[val_idx]
-            y_fold_train, y_fold_val = y_train.iloc[train_idx], y_train.iloc[val_idx]
-            
-            # Train on this fold
-            model.fit(
-                X_fold_train, y_fold_train,
-                eval_set=[(X_fold_val, y_fold_val)],
-                verbose=False
-            )
-            
-            # Evaluate on validation fold
-            y_fold_pred = model.predict(X_fold_val)
-            fold_report = classification_report(y_fold_val, y_fold_pred, output_dict=True, zero_division=1)
-            
-            # Store metrics - use macro avg for all metrics
-            cv_scores['accuracy'].append(fold_report['accuracy'])
-            cv_scores['precision'].append(fold_report['macro avg']['precision'])
-            cv_scores['recall'].append(fold_report['macro avg']['recall'])
-            cv_scores['f1'].append(fold_report['macro avg']['f1-score'])
+        for fold, metrics in enumerate(fold_metrics, 1):
+            for metric, value in metrics.items():
+                cv_scores[metric].append(value)
             
             logging.info(f"\nFold {fold} Results:")
-            logging.info(f"Accuracy: {fold_report['accuracy']:.4f}")
-            logging.info(f"Precision: {fold_report['macro avg']['precision']:.4f}")
-            logging.info(f"Recall: {fold_report['macro avg']['recall']:.4f}")
-            logging.info(f"F1-score: {fold_report['macro avg']['f1-score']:.4f}")
+            logging.info(f"Accuracy: {metrics['accuracy']:.4f}")
+            logging.info(f"Precision: {metrics['precision']:.4f}")
+            logging.info(f"Recall: {metrics['recall']:.4f}")
+            logging.info(f"F1-score: {metrics['f1']:.4f}")
         
         # Print average CV scores
         logging.info("\nCross-validation Results:")
@@ -413,6 +306,7 @@ def train_model(X_train, y_train, X_test, y_test):
             logging.info(f"{metric.capitalize()}: {np.mean(scores):.4f} ± {np.std(scores):.4f}")
         
         # Final training on full training set
+        model = build_model(**(params or {}))
         model.fit(
             X_train, y_train,
             eval_set=[(X_test, y_test)],
@@ -431,6 +325,19 @@ def train_model(X_train, y_train, X_test, y_test):
         logging.info(f"Recall: {report['macro avg']['recall']:.4f}")
         logging.info(f"F1-score: {report['macro avg']['f1-score']:.4f}")
         
+        metrics = {
+            'cross_validation': {
+                metric: {'mean': float(np.mean(scores)), 'std': float(np.std(scores))}
+                for metric, scores in cv_scores.items()
+            },
+            'test': {
+                'accuracy': report['accuracy'],
+                'precision': report['macro avg']['precision'],
+                'recall': report['macro avg']['recall'],
+                'f1': report['macro avg']['f1-score'],
+            },
+        }
+        
         # Feature importance analysis
         feature_importance = pd.DataFrame({
             'feature': X_train.columns,
@@ -441,15 +348,88 @@ def train_model(X_train, y_train, X_test, y_test):
         for idx, row in feature_importance.head(10).iterrows():
             logging.info(f"{row['feature']}: {row['importance']:.4f}")
         
-        return model, feature_importance
+        return model, feature_importance, fold_models, metrics
         
     except Exception as e:
         logging.error(f"Error in model training: {str(e)}")
         logging.error(traceback.format_exc())
         raise
 
-def main():
+def log_calibration(models, X_test, y_test):
+    """Log test accuracy, log loss and Brier score for each named model and return them."""
+    logging.info("\nTest set calibration:")
+    calibration = {}
+    for name, model in models.items():
+        proba = model.predict_proba(X_test)[:, 1]
+        scores = calibration[name] = {
+            'accuracy': float(accuracy_score(y_test, proba >= 0.5)),
+            'log_loss': float(log_loss(y_test, proba, labels=[0, 1])),
+            'brier': float(brier_score_loss(y_test, proba)),
+        }
+        logging.info(
+            f"{name}: accuracy={scores['accuracy']:.4f} "
+            f"log_loss={scores['log_loss']:.4f} "
+            f"brier={scores['brier']:.4f}"
+        )
+    return calibration
+
+def clean_dataset(df):
+    """Strip column names and drop the identifier columns."""
+    df.columns = df.columns.str.strip()
+    columns_to_drop = ['Sl. No', 'Patient File No.', 'Unnamed: 44']
+    return df.drop(columns=columns_to_drop, errors='ignore')
+
+def load_training_frame(data_path, cache=None, sheet_name='Full_new'):
+    """
+    Load and preprocess the training sheet.
+    Args:
+        data_path (str): Path to the Excel workbook
+        cache (ArtifactCache): Cache of preprocessed frames, or None to always recompute
+        sheet_name (str): Sheet to load
+    Returns:
+        pd.DataFrame: The preprocessed frame
+    """
+    key = None
+    if cache is not None:
+        # Any edit to the workbook or to the loading and preprocessing code produces a new key
+        code = code_fingerprint(clean_dataset, preprocess_data, features_module, ingest)
+        key = cache.make_key(file_sha256(data_path), code, sheet_name)
+        df = cache.get(key)
+        if df is not None:
+            logging.info(f"Loaded preprocessed data from cache entry {key[:12]}")
+            print("Data shape:", df.shape)
+            return df
+
+    df = clean_dataset(load_dataset(data_path, sheet_name=sheet_name))
+    print("Data shape:", df.shape)
+    df = preprocess_data(df)
+
+    if cache is not None:
+        cache.put(key, df)
+        logging.info(f"Cached preprocessed data as {key[:12]}")
+    return df
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Train the PCOS prediction model.")
+    parser.add_argument('--jobs', type=int, default=None, help="parallel worker processes (default: all cores)")
+    parser.add_argument('--tune', action='store_true', help="run a successive halving search before training")
+    parser.add_argument('--trials', type=int, default=27, help="configurations sampled by the search")
+    parser.add_argument('--study', default=None, help="search name; rerun with the same name to resume")
+    parser.add_argument('--tuning-db', default=DEFAULT_DB_PATH, help="SQLite file holding trial results")
+    parser.add_argument('--no-cache', action='store_true', help="always recompute the preprocessed data")
+    parser.add_argument('--cache-max-mb', type=int, default=DEFAULT_MAX_BYTES // (1024 * 1024),
+                        help="disk budget for cached preprocessed data")
+    parser.add_argument('--registry-dir', default=registry.DEFAULT_REGISTRY_DIR,
+                        help="model registry the trained version is published to")
+    parser.add_argument('--no-publish', action='store_true', help="do not publish a registry version")
+    parser.add_argument('--keep-versions', type=int, default=registry.DEFAULT_KEEP_VERSIONS,
+                        help="newest registry versions kept after publishing (the served one is always kept); "
+                             "0 keeps all")
+    return parser.parse_args(argv)
+
+def main(argv=None):
     """Main function to run the PCOS prediction model training pipeline."""
+    args = parse_args(argv)
     try:
         print("Starting PCOS prediction model training...")
         print("Python version:", sys.version)
@@ -460,32 +440,23 @@ def main():
         current_dir = os.path.dirname(os.path.abspath(__file__))
         data_path = os.path.join(current_dir, "..", "data", "PCOS_data_without_infertility.xlsx")
         model_path = os.path.join(current_dir, "..", "models", "pcos_model.joblib")
-        scaler_path = os.path.join(current_dir, "..", "models", "scaler.joblib")
+        trees_path = os.path.join(current_dir, "..", "models", "pcos_model.trees.npz")
+        folds_path = os.path.join(current_dir, "..", "models", "pcos_model.folds.joblib")
+        ensemble_path = os.path.join(current_dir, "..", "models", "pcos_model.ensemble.npz")
+        preprocessor_path = os.path.join(current_dir, "..", "models", "pcos_model.preprocess.npz")
         feature_names_path = os.path.join(current_dir, "..", "models", "feature_names.txt")
         
         # Create models directory if it doesn't exist
         os.makedirs(os.path.dirname(model_path), exist_ok=True)
         
-        # Load and preprocess data
+        # Load and preprocess data, reusing a cached result while data and code are unchanged
         print(f"\nLoading data from: {os.path.dirname(data_path)}\n")
-        df = pd.read_excel(data_path, sheet_name='Full_new')
-        
-        # Clean column names once at the start
-        df.columns = df.columns.str.strip()
+        cache = None if args.no_cache else ArtifactCache(max_bytes=args.cache_max_mb * 1024 * 1024)
+        df = load_training_frame(data_path, cache)
         
-        # Remove unwanted columns
-        columns_to_drop = ['Sl. No', 'Patient File No.', 'Unnamed: 44']
-        df = df.drop(columns=columns_to_drop, errors='ignore')
-        
-        # Print initial data shape
-        print("Data shape:", df.shape)
-        
-        # Preprocess data
-        df = preprocess_data(df)
-        
-        # Prepare features and target
+        # Prepare features and target; column order comes from the shared feature spec
         target = 'PCOS (Y/N)'
-        features = [col for col in df.columns if col != target]
+        features = [col for col in default_feature_names() if col in df.columns]
         
         print("\nNumber of features being used:", len(features))
         print("\nFeatures:", features)
@@ -498,15 +469,51 @@ def main():
             X, y, test_size=0.2, random_state=RANDOM_SEED, stratify=y
         )
         
+        # Fit imputation medians, clip bounds and category maps on the training split only
+        preprocessor = Preprocessor.fit(X_train)
+        X_train = preprocessor.transform(X_train)
+        X_test = preprocessor.transform(X_test)
+        
+        # Optionally search hyperparameters on the training split's CV folds
+        params = None
+        if args.tune:
+            print("\nTuning hyperparameters...")
+            best = successive_halving(
+                X_train, y_train, MODEL_PARAMS,
+                n_configs=args.trials, n_folds=N_FOLDS, seed=RANDOM_SEED,
+                n_jobs=args.jobs, db_path=args.tuning_db, study=args.study
+            )
+            params = best['params']
+            best_params_path = os.path.join(os.path.dirname(model_path), "best_params.json")
+            with open(best_params_path, 'w') as f:
+                json.dump(best, f, indent=2)
+            logging.info(f"Saved best parameters to {best_params_path}")
+        
         print("\nTraining model...")
         
         # Train and evaluate model
-        model, feature_importance = train_model(X_train, y_train, X_test, y_test)
+        model, feature_importance, fold_models, metrics = train_model(
+            X_train, y_train, X_test, y_test, n_jobs=args.jobs, params=params
+        )
         
         # Save model and feature importance
         logging.info(f"Saving model to {model_path}")
         joblib.dump(model, model_path)
         
+        # Export the trees for catboost-free serving
+        export_oblivious_trees(model, trees_path)
+        logging.info(f"Exported compiled trees to {trees_path}")
+        
+        # Keep the fold models as a bagged ensemble, fused into one evaluator
+        joblib.dump(fold_models, folds_path)
+        ensemble = export_ensemble(fold_models, ensemble_path)
+        logging.info(f"Exported {ensemble.member_count}-model ensemble to {ensemble_path}")
+        metrics['calibration'] = log_calibration({'final model': model, 'fold ensemble': ensemble}, X_test, y_test)
+        
+        # Save the fitted preprocessing state next to the model for serving
+        preprocessor.save(preprocessor_path)
+        logging.info(f"Saved preprocessing state to {preprocessor_path}")
+        
         # Save feature names
         with open(feature_names_path, 'w') as f:
             f.write('\n'.join(features))
@@ -518,6 +525,16 @@ def main():
         feature_importance.to_csv(feature_importance_path, index=False)
         logging.info(f"Saved feature importance to {feature_importance_path}")
         
+        # Publish everything above as one immutable registry version for the servers to pick up
+        if not args.no_publish:
+            metrics.update(n_train=len(X_train), n_test=len(X_test), params={**MODEL_PARAMS, **(params or {})})
+            version = registry.publish(
+                [model_path, trees_path, folds_path, ensemble_path, preprocessor_path, feature_names_path,
+                 feature_importance_path],
+                metrics=metrics, registry_dir=args.registry_dir, keep=args.keep_versions or None
+            )
+            logging.info(f"Published model version {version} to {args.registry_dir}")
+        
         logging.info("Training pipeline completed successfully")
         
     except Exception as e:
@@ -0,0 +1,245 @@
+"""
+Dependency-light inference for CatBoost oblivious tree models.
+
+A trained CatBoostClassifier (grow_policy='SymmetricTree') is exported to a
+compact .npz file holding, for every tree, the split feature ids and
+thresholds per level plus the leaf values. ObliviousTreeEngine scores a batch
+with NumPy only: every tree level is compared at once, the resulting bits are
+shifted into leaf indices and the leaf values are summed across trees.
+Loading it does not import catboost. Like CatBoost, features and borders are
+compared as float32, so every row lands in the same leaves as predict_proba.
+
+Several models (e.g. the cross-validation fold models) can be fused into one
+engine: their trees are concatenated, every distinct split is still tested
+once per row, and member_offsets marks where each member's trees start so the
+leaf sums are reduced per member before their probabilities are averaged.
+
+The work grows with rows x trees and runs on one core, so the engine beats
+CatBoost on single rows and small batches, but not on large ones. A fused
+5-fold ensemble on 10k rows takes about 10x as long as one CatBoost model.
+"""
+import json
+import os
+import tempfile
+
+import numpy as np
+
+# Cells in the (trees, rows) intermediate arrays of one chunk; rows per chunk shrink as the
+# tree count grows so the working set stays cache-sized for single models and ensembles alike
+CHUNK_CELLS = 1 << 17
+
+
+class ObliviousTreeEngine:
+    """Array-backed evaluator for a binary oblivious tree ensemble."""
+
+    def __init__(self, feature_ids, thresholds, nan_as_true, leaf_values, scale=1.0, bias=0.0,
+                 feature_names=(), feature_importances=None, member_offsets=None):
+        """
+        Args:
+            feature_ids (np.ndarray): (trees, depth) feature column tested at each level
+            thresholds (np.ndarray): (trees, depth) split borders, stored as float32; a row goes right
+                when value > border
+            nan_as_true (np.ndarray): (trees, depth) whether a NaN value goes right at that level
+            leaf_values (np.ndarray): (trees, 2 ** depth) raw leaf values
+            scale (float or np.ndarray): Multiplier applied to the summed leaf values, per member
+            bias (float or np.ndarray): Offset added after scaling, per member
+            feature_names (sequence): Names of the model's input columns
+            feature_importances (np.ndarray): Global importances, kept for callers that report them
+            member_offsets (np.ndarray): (members + 1,) first tree of each member plus the tree count;
+                defaults to a single member holding every tree
+        """
+        self.feature_ids = np.ascontiguousarray(feature_ids, dtype=np.int32)
+        self.thresholds = np.ascontiguousarray(thresholds, dtype=np.float32)
+        self.nan_as_true = np.ascontiguousarray(nan_as_true, dtype=bool)
+        self.leaf_values = np.ascontiguousarray(leaf_values, dtype=np.float64)
+        self.feature_names = tuple(feature_names)
+        if feature_importances is None:
+            feature_importances = np.zeros(len(self.feature_names))
+        self.feature_importances_ = np.asarray(feature_importances, dtype=np.float64)
+
+        self.tree_count, self.depth = self.feature_ids.shape
+        if member_offsets is None:
+            member_offsets = [0, self.tree_count]
+        self.member_offsets = np.asarray(member_offsets, dtype=np.intp)
+        self.member_count = len(self.member_offsets) - 1
+        self.scale = np.broadcast_to(np.asarray(scale, dtype=np.float64), (self.member_count,)).copy()
+        self.bias = np.broadcast_to(np.asarray(bias, dtype=np.float64), (self.member_count,)).copy()
+
+        # Trees reuse the same borders, so each distinct split is binarized once per row
+        splits = np.stack([
+            self.feature_ids.ravel().astype(np.float64),
+            self.thresholds.ravel(),
+            self.nan_as_true.ravel().astype(np.float64),
+        ], axis=1)
+        unique_splits, split_idx = np.unique(splits, axis=0, return_inverse=True)
+        self._split_features = unique_splits[:, 0].astype(np.intp)
+        self._split_thresholds = unique_splits[:, 1].astype(np.float32)
+        self._split_nan_true = unique_splits[:, 2].astype(bool)
+        self._has_nan_true = bool(self._split_nan_true.any())
+        # (depth, trees) index of the distinct split tested at each level of each tree
+        self._level_splits = np.ascontiguousarray(split_idx.reshape(self.feature_ids.shape).T)
+
+        self._leaf_dtype = np.uint8 if self.depth <= 8 else np.int32
+        self._leaf_offsets = np.arange(self.tree_count, dtype=np.intp) * self.leaf_values.shape[1]
+        self._flat_leaf_values = self.leaf_values.ravel()
+
+    @classmethod
+    def from_catboost(cls, model):
+        """Build an engine from a fitted CatBoostClassifier with symmetric trees."""
+        # CatBoost's JSON export is the documented way to read the tree structure
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            json_path = os.path.join(tmp_dir, 'model.json')
+            model.save_model(json_path, format='json')
+            with open(json_path) as f:
+                spec = json.load(f)
+
+        float_features = spec['features_info']['float_features']
+        flat_index = {ff['feature_index']: ff['flat_feature_index'] for ff in float_features}
+        nan_true = {ff['feature_index']: ff.get('nan_value_treatment') == 'AsTrue' for ff in float_features}
+
+        trees = spec['oblivious_trees']
+        depth = max(1, max(len(tree['splits']) for tree in trees))
+        n_trees = len(trees)
+
+        # Shallower trees are padded with never-taken splits so their leaf index is unchanged
+        feature_ids = np.zeros((n_trees, depth), dtype=np.int32)
+        thresholds = np.full((n_trees, depth), np.inf)
+        nan_as_true = np.zeros((n_trees, depth), dtype=bool)
+        leaf_values = np.zeros((n_trees, 2 ** depth))
+
+        for t, tree in enumerate(trees):
+            for level, split in enumerate(tree['splits']):
+                if split.get('split_type', 'FloatFeature') != 'FloatFeature':
+                    raise ValueError(f"unsupported split type: {split['split_type']}")
+                feature_ids[t, level] = flat_index[split['float_feature_index']]
+                thresholds[t, level] = split['border']
+                nan_as_true[t, level] = nan_true[split['float_feature_index']]
+            values = tree['leaf_values']
+            if len(values) != 2 ** len(tree['splits']):
+                raise ValueError('only single-output (binary) models can be exported')
+            leaf_values[t, :len(values)] = values
+
+        scale, bias = spec.get('scale_and_bias', [1.0, [0.0]])
+        if isinstance(bias, list):
+            bias = bias[0] if bias else 0.0
+
+        return cls(
+            feature_ids, thresholds, nan_as_true, leaf_values, scale, bias,
+            feature_names=[ff.get('feature_id') or str(ff['flat_feature_index']) for ff in float_features],
+            feature_importances=model.feature_importances_,
+        )
+
+    @classmethod
+    def ensemble(cls, engines):
+        """Fuse several engines over the same features into one bagged ensemble."""
+        depth = max(engine.depth for engine in engines)
+
+        def pad(engine, name, fill, width):
+            array = getattr(engine, name)
+            padded = np.full((engine.tree_count, width), fill, dtype=array.dtype)
+            padded[:, :array.shape[1]] = array
+            return padded
+
+        # Padding levels never split, so shallower trees keep their leaf indices
+        return cls(
+            np.concatenate([pad(e, 'feature_ids', 0, depth) for e in engines]),
+            np.concatenate([pad(e, 'thresholds', np.inf, depth) for e in engines]),
+            np.concatenate([pad(e, 'nan_as_true', False, depth) for e in engines]),
+            np.concatenate([pad(e, 'leaf_values', 0.0, 2 ** depth) for e in engines]),
+            scale=np.concatenate([e.scale for e in engines]),
+            bias=np.concatenate([e.bias for e in engines]),
+            feature_names=engines[0].feature_names,
+            feature_importances=np.mean([e.feature_importances_ for e in engines], axis=0),
+            member_offsets=np.concatenate([[0], np.cumsum([e.tree_count for e in engines])]),
+        )
+
+    @classmethod
+    def load(cls, path):
+        """Load an engine written by save()."""
+        with np.load(path, allow_pickle=False) as data:
+            return cls(
+                data['feature_ids'], data['thresholds'], data['nan_as_true'], data['leaf_values'],
+                scale=data['scale'], bias=data['bias'],
+                feature_names=[str(name) for name in data['feature_names']],
+                feature_importances=data['feature_importances'],
+                # Files written before ensembles were supported hold a single model
+                member_offsets=data['member_offsets'] if 'member_offsets' in data.files else None,
+            )
+
+    def save(self, path):
+        """Write the engine arrays to a .npz file."""
+        np.savez(
+            path,
+            feature_ids=self.feature_ids,
+            thresholds=self.thresholds,
+            nan_as_true=self.nan_as_true,
+            leaf_values=self.leaf_values,
+            scale=self.scale,
+            bias=self.bias,
+            feature_names=np.array(self.feature_names, dtype=str),
+            feature_importances=self.feature_importances_,
+            member_offsets=self.member_offsets,
+        )
+
+    def _leaf_indices(self, X):
+        # Work feature-major so every gather below copies whole contiguous rows
+        values = np.ascontiguousarray(X.T)[self._split_features]
+        # (distinct splits, rows) outcome of every border test
+        bits = values > self._split_thresholds[:, None]
+        if self._has_nan_true:
+            bits |= np.isnan(values) & self._split_nan_true[:, None]
+
+        # Shift each level's bit into place for all trees at once
+        leaves = np.zeros((self.tree_count, len(X)), dtype=self._leaf_dtype)
+        for level in range(self.depth):
+            leaves |= bits[self._level_splits[level]].astype(self._leaf_dtype) << level
+        return leaves
+
+    def predict_member_raw(self, X, chunk_size=None):
+        """Return the (members, rows) raw (log-odds) score of every member for each row of X."""
+        # CatBoost rounds features to float32 before testing borders; doing the same keeps
+        # values that fall between a float32 border and its float64 neighbours on the same side
+        X = np.asarray(X, dtype=np.float32)
+        if X.ndim == 1:
+            X = X[None, :]
+        if chunk_size is None:
+            chunk_size = max(16, CHUNK_CELLS // self.tree_count)
+        raw = np.empty((self.member_count, len(X)))
+        for start in range(0, len(X), chunk_size):
+            leaves = self._leaf_indices(X[start:start + chunk_size])
+            # (trees, rows) leaf values, summed over each member's trees
+            values = np.take(self._flat_leaf_values, leaves + self._leaf_offsets[:, None])
+            raw[:, start:start + chunk_size] = np.add.reduceat(values, self.member_offsets[:-1], axis=0)
+        return self.scale[:, None] * raw + self.bias[:, None]
+
+    def predict_raw(self, X, chunk_size=None):
+        """Return the raw (log-odds) score for each row of X; for ensembles, of the averaged probability."""
+        raw = self.predict_member_raw(X, chunk_size)
+        if self.member_count == 1:
+            return raw[0]
+        p = self._average_probability(raw)
+        return np.log(p) - np.log1p(-p)
+
+    @staticmethod
+    def _average_probability(member_raw):
+        # Members are averaged in probability space, as bagging does
+        return (1.0 / (1.0 + np.exp(-member_raw))).mean(axis=0)
+
+    def predict_proba(self, X):
+        """Return class probabilities with the same (rows, 2) layout as CatBoostClassifier."""
+        p = self._average_probability(self.predict_member_raw(X))
+        return np.column_stack([1.0 - p, p])
+
+
+def export_oblivious_trees(model, path):
+    """Export a fitted CatBoost model to the compact array format used by ObliviousTreeEngine."""
+    engine = ObliviousTreeEngine.from_catboost(model)
+    engine.save(path)
+    return engine
+
+
+def export_ensemble(models, path):
+    """Export several fitted CatBoost models as one fused ObliviousTreeEngine ensemble."""
+    engine = ObliviousTreeEngine.ensemble([ObliviousTreeEngine.from_catboost(model) for model in models])
+    engine.save(path)
+    return engine
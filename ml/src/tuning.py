@@ -0,0 +1,232 @@
+"""
+Hyperparameter search for the CatBoost model using successive halving.
+
+A fixed, seeded set of configurations is scored on the stratified CV folds
+with a small iteration budget; the best 1/eta move on to a budget eta times
+larger, and so on until max_iterations. Trials run in parallel worker
+processes and every result is stored in a SQLite file as soon as it arrives,
+so an interrupted search resumes where it stopped when run again with the
+same settings.
+"""
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+import json
+import logging
+import math
+import os
+import sqlite3
+import time
+
+import numpy as np
+from sklearn.metrics import f1_score, log_loss
+from sklearn.model_selection import StratifiedKFold
+
+DEFAULT_DB_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'models', 'tuning.sqlite')
+
+# (distribution, low, high) for each tuned CatBoost parameter
+SEARCH_SPACE = {
+    'learning_rate': ('log_uniform', 0.01, 0.3),
+    'depth': ('int', 4, 8),
+    'l2_leaf_reg': ('log_uniform', 1.0, 10.0),
+    'random_strength': ('log_uniform', 0.1, 10.0),
+    'bagging_temperature': ('uniform', 0.0, 1.0),
+}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS studies (
+    name TEXT PRIMARY KEY,
+    settings TEXT NOT NULL,
+    created TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS trials (
+    study TEXT NOT NULL,
+    config_id INTEGER NOT NULL,
+    rung INTEGER NOT NULL,
+    iterations INTEGER NOT NULL,
+    params TEXT NOT NULL,
+    status TEXT NOT NULL,
+    logloss REAL,
+    f1 REAL,
+    duration REAL,
+    finished TEXT NOT NULL,
+    PRIMARY KEY (study, config_id, rung)
+);
+"""
+
+
+def sample_configs(n_configs, seed):
+    """Draw n_configs parameter dicts from SEARCH_SPACE; the same seed gives the same configs."""
+    rng = np.random.default_rng(seed)
+    configs = []
+    for _ in range(n_configs):
+        config = {}
+        for name, (dist, low, high) in SEARCH_SPACE.items():
+            if dist == 'log_uniform':
+                config[name] = float(math.exp(rng.uniform(math.log(low), math.log(high))))
+            elif dist == 'int':
+                config[name] = int(rng.integers(low, high + 1))
+            else:
+                config[name] = float(rng.uniform(low, high))
+        configs.append(config)
+    return configs
+
+
+def rung_budgets(min_iterations, max_iterations, eta):
+    """Iteration budget per rung: min_iterations * eta ** k, capped at max_iterations."""
+    budgets = [min_iterations]
+    while budgets[-1] * eta <= max_iterations:
+        budgets.append(budgets[-1] * eta)
+    return budgets
+
+
+class TrialStore:
+    """SQLite persistence for studies and trial results."""
+
+    def __init__(self, path=DEFAULT_DB_PATH):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.conn = sqlite3.connect(path)
+        self.conn.executescript(SCHEMA)
+
+    def open_study(self, name, settings):
+        """Create the study, or check that an existing one was run with the same settings."""
+        row = self.conn.execute('SELECT settings FROM studies WHERE name = ?', (name,)).fetchone()
+        if row is None:
+            with self.conn:
+                self.conn.execute(
+                    'INSERT INTO studies VALUES (?, ?, ?)',
+                    (name, json.dumps(settings, sort_keys=True), datetime.now().isoformat(timespec='seconds'))
+                )
+        elif json.loads(row[0]) != settings:
+            raise ValueError(f"study '{name}' already exists with different settings: {row[0]}")
+
+    def completed(self, study, rung):
+        """Return {config_id: result dict} for trials already finished at a rung."""
+        rows = self.conn.execute(
+            'SELECT config_id, status, logloss, f1 FROM trials WHERE study = ? AND rung = ?',
+            (study, rung)
+        ).fetchall()
+        return {
+            config_id: {'status': status, 'logloss': logloss, 'f1': f1}
+            for config_id, status, logloss, f1 in rows
+        }
+
+    def record(self, study, rung, iterations, params, result):
+        with self.conn:
+            self.conn.execute(
+                'INSERT OR REPLACE INTO trials VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                (study, result['config_id'], rung, iterations, json.dumps(params, sort_keys=True),
+                 result['status'], result['logloss'], result['f1'], result['duration'],
+                 datetime.now().isoformat(timespec='seconds'))
+            )
+
+    def close(self):
+        self.conn.close()
+
+
+# Worker state, set once per process by _init_worker so the data is shipped once, not per trial
+_worker = {}
+
+
+def _init_worker(X, y, folds, base_params, thread_count):
+    _worker.update(X=X, y=y, folds=folds, base_params=base_params, thread_count=thread_count)
+
+
+def evaluate_config(config_id, params, iterations):
+    """Score one configuration on every CV fold with the given iteration budget."""
+    from catboost import CatBoostClassifier
+
+    X, y = _worker['X'], _worker['y']
+    start = time.perf_counter()
+    losses, f1s = [], []
+    try:
+        for train_idx, val_idx in _worker['folds']:
+            model = CatBoostClassifier(**{
+                **_worker['base_params'], **params,
+                'iterations': iterations,
+                'thread_count': _worker['thread_count'],
+                'verbose': False,
+            })
+            model.fit(X.iloc[train_idx], y.iloc[train_idx], eval_set=[(X.iloc[val_idx], y.iloc[val_idx])])
+            proba = model.predict_proba(X.iloc[val_idx])[:, 1]
+            losses.append(log_loss(y.iloc[val_idx], proba, labels=[0, 1]))
+            f1s.append(f1_score(y.iloc[val_idx], (proba >= 0.5).astype(int), average='macro', zero_division=1))
+        status, logloss, f1 = 'ok', float(np.mean(losses)), float(np.mean(f1s))
+    except Exception as e:
+        status, logloss, f1 = f'failed: {e}', None, None
+    return {
+        'config_id': config_id, 'status': status, 'logloss': logloss, 'f1': f1,
+        'duration': time.perf_counter() - start,
+    }
+
+
+def successive_halving(X, y, base_params, n_configs=27, min_iterations=100, max_iterations=900, eta=3,
+                       n_folds=5, seed=42, n_jobs=None, db_path=DEFAULT_DB_PATH, study=None):
+    """
+    Search CatBoost hyperparameters with successive halving over stratified CV folds.
+    Args:
+        X (pd.DataFrame): Training features
+        y (pd.Series): Training target
+        base_params (dict): CatBoost parameters every trial starts from
+        n_configs (int): Configurations sampled for the first rung
+        min_iterations (int): Iteration budget of the first rung
+        max_iterations (int): Largest iteration budget
+        eta (int): Keep the best 1/eta configurations at each rung
+        n_folds (int): Number of stratified CV folds
+        seed (int): Seed for configuration sampling and fold splits
+        n_jobs (int): Parallel trial processes (default: all cores)
+        db_path (str): SQLite file with the trial history
+        study (str): Study name; reusing it resumes the search
+    Returns:
+        dict: Best configuration with its 'params', 'iterations', 'logloss' and 'f1'
+    """
+    settings = {
+        'n_configs': n_configs, 'min_iterations': min_iterations, 'max_iterations': max_iterations,
+        'eta': eta, 'n_folds': n_folds, 'seed': seed, 'rows': len(X),
+    }
+    study = study or f"sh-s{seed}-n{n_configs}-i{min_iterations}-{max_iterations}-e{eta}"
+    store = TrialStore(db_path)
+    store.open_study(study, settings)
+
+    configs = sample_configs(n_configs, seed)
+    budgets = rung_budgets(min_iterations, max_iterations, eta)
+    folds = list(StratifiedKFold(n_splits=n_folds, shuffle=True, random_state=seed).split(X, y))
+
+    cpu_count = os.cpu_count() or 1
+    n_jobs = max(1, min(n_configs, n_jobs or cpu_count))
+    thread_count = max(1, cpu_count // n_jobs)
+    logging.info(f"Study {study}: {n_configs} configs, budgets {budgets}, {n_jobs} worker(s) x {thread_count} thread(s)")
+
+    survivors = list(range(n_configs))
+    best = None
+    try:
+        with ProcessPoolExecutor(max_workers=n_jobs, initializer=_init_worker,
+                                 initargs=(X, y, folds, base_params, thread_count)) as pool:
+            for rung, iterations in enumerate(budgets):
+                results = store.completed(study, rung)
+                pending = [cid for cid in survivors if cid not in results]
+                logging.info(f"Rung {rung} ({iterations} iterations): {len(survivors)} configs, "
+                             f"{len(survivors) - len(pending)} already done")
+
+                futures = [pool.submit(evaluate_config, cid, configs[cid], iterations) for cid in pending]
+                for future in as_completed(futures):
+                    result = future.result()
+                    store.record(study, rung, iterations, configs[result['config_id']], result)
+                    results[result['config_id']] = result
+                    logging.info(f"  config {result['config_id']}: {result['status']} "
+                                 f"logloss={result['logloss']} f1={result['f1']}")
+
+                # Failed trials rank last
+                ranked = sorted(
+                    survivors,
+                    key=lambda cid: results[cid]['logloss'] if results[cid]['logloss'] is not None else math.inf
+                )
+                best_id = ranked[0]
+                best = {'config_id': best_id, 'params': configs[best_id], 'iterations': iterations, **{
+                    k: results[best_id][k] for k in ('logloss', 'f1')
+                }}
+                survivors = ranked[:max(1, len(ranked) // eta)]
+    finally:
+        store.close()
+
+    logging.info(f"Best config {best['config_id']}: {best['params']} (logloss={best['logloss']}, f1={best['f1']})")
+    return best
@@ -3,66 +3,147 @@ PCOS Risk Assessment Web Application using Streamlit.
 This module provides both a web interface and API for predicting PCOS risk.
 """
 
+from datetime import datetime
 from io import BytesIO
 import os
+import sys
+import time
 import streamlit as st
 
 import pandas as pd
 import numpy as np
 import requests
 import joblib
-from catboost import CatBoostClassifier
 import logging
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+from features import FeaturePipeline, Preprocessor
+from prediction_cache import PredictionCache, file_version
+from tree_engine import ObliviousTreeEngine
+
 # Set up logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Blood group mapping helper function
-def map_blood_group(blood_group_str):
-    mapping = {
-        'A+': 1,
-        'A-': 2,
-        'B+': 3,
-        'B-': 4,
-        'O+': 5,
-        'O-': 6,
-        'AB+': 7,
-        'AB-': 8
+# 'catboost' unpickles the full model; 'compiled' uses the exported trees and never imports catboost;
+# 'ensemble' averages the cross-validation fold models with the same catboost-free evaluator
+INFERENCE_ENGINE = os.environ.get('PCOS_INFERENCE_ENGINE', 'catboost')
+
+MODEL_FILES = {
+    'catboost': 'pcos_model.joblib',
+    'compiled': 'pcos_model.trees.npz',
+    'ensemble': 'pcos_model.ensemble.npz',
+}
+
+def find_model_path(model_file=None):
+    """Return the first existing path of a model artifact, or None."""
+    if model_file is None:
+        model_file = MODEL_FILES[INFERENCE_ENGINE]
+    
+    # Try different paths to find the model
+    possible_paths = [
+        os.path.join(os.path.dirname(__file__), '..', 'models', model_file),  # Original path
+        os.path.join('models', model_file),  # For Streamlit cloud
+        os.path.join('ml', 'models', model_file),  # Alternative path
+        model_file,  # Direct path
+        os.path.join(os.path.dirname(os.path.dirname(__file__)), 'models', model_file)  # Another path
+    ]
+    
+    for path in possible_paths:
+        if os.path.exists(path):
+            return os.path.abspath(path)
+    
+    # If model not found, log paths that were checked
+    logger.error(f"{model_file} not found in any of the paths: {possible_paths}")
+    return None
+
+def artifact_stamps(path):
+    """(path, mtime) of the model and of the preprocessing files saved next to it; mtime is None if missing."""
+    model_dir = os.path.dirname(path)
+    paths = (path, os.path.join(model_dir, 'pcos_model.preprocess.npz'), os.path.join(model_dir, 'feature_names.txt'))
+    return tuple((p, os.path.getmtime(p) if os.path.exists(p) else None) for p in paths)
+
+# Cached once per process and keyed by the path and mtime of every artifact, so a
+# retrain that replaces any of them triggers a reload on the next rerun while the
+# old entry is evicted
+@st.cache_resource(max_entries=1, show_spinner="Loading model...")
+def _load_model_resource(stamps):
+    (path, mtime), (preprocessor_path, _), (feature_names_path, _) = stamps
+    start = time.perf_counter()
+    logger.info(f"Loading model from: {path}")
+    if INFERENCE_ENGINE != 'catboost':
+        loaded = ObliviousTreeEngine.load(path)
+    else:
+        loaded = joblib.load(path)
+    
+    # Built like predictor.load_bundle, so the app and the API parse inputs identically
+    preprocessor = Preprocessor.load(preprocessor_path)
+    pipeline = FeaturePipeline.load(
+        feature_names_path,
+        encodings=preprocessor.category_maps if preprocessor is not None else None
+    )
+    
+    # Version is a short content hash of the model and the preprocessing saved with it,
+    # so identical artifacts report the same version and cached predictions stay valid
+    version = file_version(path, preprocessor_path, feature_names_path)
+    
+    info = {
+        'path': path,
+        'version': version,
+        'engine': INFERENCE_ENGINE,
+        'modified': datetime.fromtimestamp(
+            max(stamp for _, stamp in stamps if stamp is not None)
+        ).strftime('%Y-%m-%d %H:%M:%S'),
+        'load_seconds': time.perf_counter() - start,
     }
-    return mapping.get(blood_group_str, 1)  # Default to 1 if unknown
+    return loaded, pipeline, preprocessor, info
 
 # Model loading function
 def load_model():
+    """
+    Return (model, feature pipeline, preprocessor, info) from the process-wide cache,
+    or all None if no model is available.
+    """
     try:
-        # Try different paths to find the model
-        possible_paths = [
-            os.path.join(os.path.dirname(__file__), '..', 'models', 'pcos_model.joblib'),  # Original path
-            'models/pcos_model.joblib',  # For Streamlit cloud
-            'ml/models/pcos_model.joblib',  # Alternative path
-            'pcos_model.joblib',  # Direct path
-            os.path.join(os.path.dirname(os.path.dirname(__file__)), 'models', 'pcos_model.joblib')  # Another path
-        ]
-        
-        for path in possible_paths:
-            if os.path.exists(path):
-                logger.info(f"Loading model from: {path}")
-                return joblib.load(path)
-        
-        # If model not found, log paths that were checked
-        logger.error(f"Model not found in any of the paths: {possible_paths}")
-        
-        # Create a simple fallback model for demonstration
-        logger.info("Creating a fallback model for demonstration")
-        return None
+        path = find_model_path()
+        if path is None:
+            logger.info("Falling back to rule-based predictions")
+            return None, None, None, None
+        return _load_model_resource(artifact_stamps(path))
     except Exception as e:
         logger.error(f"Failed to load model: {e}")
-        return None
+        return None, None, None, None
+
+def show_model_info(info):
+    """Show the serving model's version and load time in the sidebar."""
+    st.sidebar.subheader("Model")
+    if info is None:
+        st.sidebar.warning("Model unavailable; using rule-based fallback.")
+        return
+    st.sidebar.write(f"**Version:** `{info['version']}`")
+    st.sidebar.write(f"**Engine:** {info['engine']}")
+    st.sidebar.write(f"**Updated:** {info['modified']}")
+    st.sidebar.write(f"**Load time:** {info['load_seconds'] * 1000:.0f} ms")
+    stats = get_prediction_cache().stats()
+    st.sidebar.write(f"**Cache:** {stats['hits']} hits / {stats['misses']} misses")
+
+@st.cache_resource
+def get_prediction_cache():
+    """One prediction cache per process, shared by all sessions."""
+    return PredictionCache()
 
 # Prediction function
-def predict_probability(model, features):
+def predict_probability(model, feature_pipeline, preprocessor, input_data, version=''):
+    """Risk probability for one form submission; repeated inputs are served from the cache."""
+    def compute(raw):
+        features = feature_pipeline.transform(raw)
+        if preprocessor is not None:
+            features = preprocessor.transform(features)
+        return model.predict_proba(features)[:, 1]
+    
     try:
-        return float(model.predict_proba(np.array([features]))[0][1])
+        raw = feature_pipeline.parse_record(input_data)[None, :]
+        return float(get_prediction_cache().get_or_compute(raw, version, compute)[0])
     except Exception as e:
         logger.error(f"Prediction failed: {e}")
         return None
@@ -82,11 +163,11 @@ def fallback_predict(input_data):
     risk_count = sum(1 for factor in risk_factors if factor)
     return risk_count / len(risk_factors)  # Simple ratio of risk factors present
 
-# Initialize the model when module is loaded
-model = load_model()
-
 # Define a function to create the Streamlit UI
 def create_streamlit_ui():
+    model, feature_pipeline, preprocessor, model_info = load_model()
+    show_model_info(model_info)
+    
     st.title('PCOS Risk Assessment')
     st.write('Enter your health information for PCOS risk assessment.')
     
@@ -185,20 +266,18 @@ def create_streamlit_ui():
 
         if submitted:
             try:
-                # Convert blood group to numeric value
-                blood_group_num = map_blood_group(blood_group)
-                
-                # Create input data dictionary with validated data
+                # Create input data dictionary with validated data; the feature pipeline
+                # encodes blood group, cycle and Y/N values the same way training does
                 prediction_input = {
                     'age': age,
                     'weight': weight,
                     'height': height,
                     'bmi': bmi,
-                    'blood_group': blood_group_num,
+                    'blood_group': blood_group,
                     'pulse_rate': pulse_rate,
                     'rr': rr,
                     'hb': hb,
-                    'cycle_ri': 1 if cycle_regularity else 0,
+                    'cycle_ri': 'R' if cycle_regularity else 'I',
                     'cycle_length': cycle_length,
                     'marriage_status': marriage_status,
                     'pregnant': 1 if pregnant else 0,
@@ -233,25 +312,11 @@ def create_streamlit_ui():
                     'endometrium': endometrium
                 }
                 
-                # Extract only the features needed for the model in the correct order and format
-                model_features = [
-                    prediction_input['beta_hcg1'],
-                    prediction_input['beta_hcg2'],
-                    prediction_input['amh'],
-                    prediction_input['pregnant'],
-                    prediction_input['weight_gain'],
-                    prediction_input['hair_growth'],
-                    prediction_input['skin_darkening'],
-                    prediction_input['hair_loss'],
-                    prediction_input['pimples'],
-                    prediction_input['fast_food'],
-                    prediction_input['regular_exercise'],
-                    prediction_input['blood_group']
-                ]
-                
                 # Make prediction
                 if model is not None:
-                    risk_probability = predict_probability(model, model_features)
+                    risk_probability = predict_probability(
+                        model, feature_pipeline, preprocessor, prediction_input, model_info['version']
+                    )
                     if risk_probability is None:
                         risk_probability = fallback_predict(prediction_input)
                 else:
@@ -0,0 +1,100 @@
+"""
+Shared fixtures: a small CatBoost model trained on synthetic patients and its
+artifacts written out the way train_model.py writes them, so the tests never
+depend on a trained model being present in ml/models.
+"""
+import os
+import sys
+
+import joblib
+import numpy as np
+import pandas as pd
+import pytest
+
+ML_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [ML_DIR, os.path.join(ML_DIR, 'src')]
+
+from features import RAW_FEATURES, Preprocessor, add_derived_features, default_feature_names  # noqa: E402
+
+ARTIFACT_FILES = (
+    'pcos_model.joblib', 'pcos_model.trees.npz', 'pcos_model.folds.joblib', 'pcos_model.ensemble.npz',
+    'pcos_model.preprocess.npz', 'feature_names.txt',
+)
+
+
+def synthetic_frame(n=400, seed=0, missing_rate=0.1):
+    """Encoded training features plus a target that depends on a few of them."""
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame(index=range(n))
+    for raw in RAW_FEATURES:
+        if raw.encoding is not None:
+            df[raw.column] = rng.choice(sorted(set(raw.encoding.values())), size=n).astype(np.float64)
+        else:
+            # One decimal, like the workbook, so many rows share values and sit on split borders
+            df[raw.column] = np.round(rng.gamma(4.0, 10.0, size=n), 1)
+    df = add_derived_features(df)[default_feature_names()]
+    score = df.iloc[:, 0].rank(pct=True) + df.iloc[:, 5].rank(pct=True) + rng.normal(0, 0.3, size=n)
+    y = pd.Series((score > score.median()).astype(int), name='PCOS (Y/N)')
+    X = df.mask(rng.random(df.shape) < missing_rate)
+    return X, y
+
+
+def fit_catboost(X, y, seed=0, iterations=40):
+    from catboost import CatBoostClassifier
+    model = CatBoostClassifier(
+        iterations=iterations, depth=4, learning_rate=0.1, random_seed=seed,
+        grow_policy='SymmetricTree', verbose=False, thread_count=1, allow_writing_files=False
+    )
+    return model.fit(X, y)
+
+
+@pytest.fixture(scope='session')
+def training_data():
+    X, y = synthetic_frame()
+    preprocessor = Preprocessor.fit(X)
+    return X, y, preprocessor
+
+
+@pytest.fixture(scope='session')
+def fitted_model(training_data):
+    """A model fitted on raw (not imputed) features, so NaN routing is exercised too."""
+    X, y, _ = training_data
+    return fit_catboost(X, y)
+
+
+@pytest.fixture(scope='session')
+def fold_models(training_data):
+    X, y, _ = training_data
+    folds = np.arange(len(X)) % 3
+    return [fit_catboost(X[folds != k], y[folds != k], seed=k) for k in range(3)]
+
+
+@pytest.fixture(scope='session')
+def model_dir(tmp_path_factory, training_data, fitted_model, fold_models):
+    """A flat artifact directory like ml/models after a training run."""
+    from tree_engine import export_ensemble, export_oblivious_trees
+
+    X, _, preprocessor = training_data
+    path = tmp_path_factory.mktemp('models')
+    joblib.dump(fitted_model, path / 'pcos_model.joblib')
+    export_oblivious_trees(fitted_model, str(path / 'pcos_model.trees.npz'))
+    joblib.dump(fold_models, path / 'pcos_model.folds.joblib')
+    export_ensemble(fold_models, str(path / 'pcos_model.ensemble.npz'))
+    preprocessor.save(str(path / 'pcos_model.preprocess.npz'))
+    (path / 'feature_names.txt').write_text('\n'.join(X.columns))
+    return path
+
+
+@pytest.fixture(scope='session')
+def predictor(tmp_path_factory, model_dir):
+    """The predictor module, serving the fixture model from a registry of its own."""
+    import registry
+
+    registry_dir = str(tmp_path_factory.mktemp('registry'))
+    registry.publish([str(model_dir / name) for name in ARTIFACT_FILES], registry_dir=registry_dir)
+    # Read at import time, so predictor must not have been imported before this fixture
+    assert 'predictor' not in sys.modules
+    os.environ['PCOS_REGISTRY_DIR'] = registry_dir
+    os.environ['PCOS_MODEL_RELOAD_SECONDS'] = '0'
+    import predictor
+    return predictor
@@ -0,0 +1,78 @@
+import asyncio
+
+import numpy as np
+import pytest
+
+from batching import MicroBatcher
+
+
+class Model:
+    """Records the size of every batch it scores."""
+
+    def __init__(self, fail=False):
+        self.batches = []
+        self.fail = fail
+
+    def __call__(self, X):
+        self.batches.append(len(X))
+        if self.fail:
+            raise RuntimeError('model failed')
+        return X[:, 0] / 100
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+async def submit_all(batcher, rows):
+    await batcher.start()
+    try:
+        return await asyncio.gather(*(batcher.submit(row) for row in rows), return_exceptions=True)
+    finally:
+        await batcher.stop()
+
+
+def test_concurrent_requests_share_batches_and_get_their_own_results():
+    model = Model()
+    rows = [[float(i), 0.0] for i in range(10)]
+    results = run(submit_all(MicroBatcher(model, max_batch_size=4, max_wait_ms=50), rows))
+
+    np.testing.assert_allclose(results, [i / 100 for i in range(10)])
+    assert sum(model.batches) == 10
+    assert max(model.batches) == 4
+    assert len(model.batches) == 3
+
+
+def test_a_lone_request_is_flushed_after_the_wait():
+    model = Model()
+
+    async def scenario():
+        batcher = MicroBatcher(model, max_batch_size=64, max_wait_ms=5)
+        await batcher.start()
+        try:
+            return await asyncio.wait_for(batcher.submit([30.0]), timeout=2)
+        finally:
+            await batcher.stop()
+
+    assert run(scenario()) == pytest.approx(0.3)
+    assert model.batches == [1]
+
+
+def test_a_failed_batch_fails_each_of_its_requests():
+    results = run(submit_all(MicroBatcher(Model(fail=True), max_batch_size=8, max_wait_ms=20), [[1.0], [2.0]]))
+    assert all(isinstance(result, RuntimeError) for result in results)
+
+
+def test_stop_fails_requests_still_queued():
+    async def scenario():
+        batcher = MicroBatcher(Model(), max_batch_size=1, max_wait_ms=0)
+        await batcher.start()
+        # Without the flush loop the request stays queued
+        batcher._worker.cancel()
+        pending = asyncio.ensure_future(batcher.submit([1.0]))
+        await asyncio.sleep(0)
+        await batcher.stop()
+        return await asyncio.gather(pending, return_exceptions=True)
+
+    [result] = run(scenario())
+    assert isinstance(result, RuntimeError)
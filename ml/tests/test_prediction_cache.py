@@ -0,0 +1,109 @@
+import numpy as np
+import pytest
+
+import prediction_cache
+from prediction_cache import PredictionCache, merge_stats
+
+
+class Model:
+    """Counts the rows it is asked to score."""
+
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, rows):
+        self.calls.append(len(rows))
+        return rows[:, 0] / 100
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(prediction_cache.time, 'monotonic', lambda: now[0])
+    return now
+
+
+def test_repeated_and_rounded_rows_are_served_from_the_cache():
+    cache, model = PredictionCache(max_entries=10), Model()
+    rows = np.array([[30.0, np.nan], [40.0, 1.0]])
+    np.testing.assert_allclose(cache.get_or_compute(rows, 'v1', model), [0.3, 0.4])
+    # -0.0 and values equal after rounding map to the same entries
+    again = np.array([[30.0 + 1e-7, np.nan], [40.0, 1.0 - 1e-9]])
+    np.testing.assert_allclose(cache.get_or_compute(again, 'v1', model), [0.3, 0.4])
+    assert model.calls == [2]
+    assert (cache.hits, cache.misses) == (2, 2)
+
+
+def test_entries_expire_after_the_ttl(clock):
+    cache, model = PredictionCache(max_entries=10, ttl_seconds=60), Model()
+    row = np.array([[30.0]])
+    cache.get_or_compute(row, 'v1', model)
+    clock[0] += 59
+    cache.get_or_compute(row, 'v1', model)
+    assert model.calls == [1]
+    clock[0] += 2
+    cache.get_or_compute(row, 'v1', model)
+    assert model.calls == [1, 1]
+    assert cache.expirations == 1
+
+
+def test_new_model_version_invalidates_every_entry():
+    cache, model = PredictionCache(max_entries=10), Model()
+    rows = np.array([[30.0], [40.0]])
+    cache.get_or_compute(rows, 'v1', model)
+    cache.get_or_compute(rows, 'v2', model)
+    assert model.calls == [2, 2]
+    assert cache.stats()['version'] == 'v2'
+    assert cache.stats()['entries'] == 2
+
+
+def test_results_from_a_replaced_model_are_not_stored():
+    cache = PredictionCache(max_entries=10)
+
+    def swap_during_compute(rows):
+        # Another request switches the cache to the new version mid-computation
+        cache.get_or_compute(np.array([[1.0]]), 'v2', Model())
+        return rows[:, 0]
+
+    cache.get_or_compute(np.array([[30.0]]), 'v1', swap_during_compute)
+    assert cache.stats()['entries'] == 1
+    assert cache.version == 'v2'
+
+
+def test_least_recently_used_entries_are_evicted():
+    cache, model = PredictionCache(max_entries=2), Model()
+    for value in (1.0, 2.0, 1.0, 3.0):
+        cache.get_or_compute(np.array([[value]]), 'v1', model)
+    cache.get_or_compute(np.array([[1.0]]), 'v1', model)
+    cache.get_or_compute(np.array([[2.0]]), 'v1', model)
+    # 2.0 was the least recently used when 3.0 arrived
+    assert model.calls == [1, 1, 1, 1]
+    assert cache.evictions == 2
+
+
+def test_disabled_cache_always_computes():
+    cache, model = PredictionCache(max_entries=0), Model()
+    for _ in range(2):
+        cache.get_or_compute(np.array([[30.0]]), 'v1', model)
+    assert model.calls == [1, 1]
+
+
+def worker_stats(version, hits=0, misses=0):
+    cache = PredictionCache(max_entries=10)
+    stats = cache.stats()
+    stats.update(version=version, hits=hits, misses=misses)
+    return stats
+
+
+def test_merge_stats_takes_first_known_version():
+    merged = merge_stats([worker_stats(None), worker_stats('v1', hits=3, misses=1), worker_stats('v1', misses=2)])
+    assert merged['version'] == 'v1'
+    assert 'versions' not in merged
+    assert (merged['workers'], merged['hits'], merged['misses']) == (3, 3, 3)
+    assert merged['hit_rate'] == 0.5
+
+
+def test_merge_stats_lists_every_version_during_a_reload():
+    merged = merge_stats([worker_stats(None), worker_stats('v1'), worker_stats('v2'), worker_stats('v1')])
+    assert merged['version'] == 'v1'
+    assert merged['versions'] == ['v1', 'v2']
@@ -0,0 +1,100 @@
+import os
+
+import pytest
+
+import registry
+
+
+@pytest.fixture
+def artifact(tmp_path):
+    path = tmp_path / 'pcos_model.trees.npz'
+    path.write_bytes(b'first')
+    return path
+
+
+@pytest.fixture
+def registry_dir(tmp_path):
+    return str(tmp_path / 'registry')
+
+
+def publish(artifact, registry_dir, content, **kwargs):
+    artifact.write_bytes(content)
+    return registry.publish([str(artifact)], metrics={'content': content.decode()}, registry_dir=registry_dir,
+                            keep=kwargs.pop('keep', None), **kwargs)
+
+
+def test_publish_writes_a_verified_version_and_activates_it(artifact, registry_dir):
+    version = publish(artifact, registry_dir, b'first')
+    path = registry.version_dir(version, registry_dir)
+
+    assert registry.current_version(registry_dir) == version
+    assert registry.list_versions(registry_dir) == [version]
+    manifest = registry.verify(path)
+    assert set(manifest['files']) == {'pcos_model.trees.npz', 'metrics.json'}
+    assert registry.read_metrics(path) == {'content': 'first'}
+    # Staging directories never survive a publish
+    assert set(os.listdir(registry_dir)) == {'CURRENT', version}
+
+
+def test_verify_detects_changed_and_missing_files(artifact, registry_dir):
+    path = registry.version_dir(publish(artifact, registry_dir, b'first'), registry_dir)
+    with open(os.path.join(path, 'pcos_model.trees.npz'), 'wb') as f:
+        f.write(b'tampered')
+    with pytest.raises(ValueError, match='checksum mismatch'):
+        registry.verify(path)
+    os.remove(os.path.join(path, 'pcos_model.trees.npz'))
+    with pytest.raises(ValueError, match='missing'):
+        registry.verify(path)
+
+
+def test_rollback_and_refusing_a_damaged_version(artifact, registry_dir):
+    first = publish(artifact, registry_dir, b'first')
+    second = publish(artifact, registry_dir, b'second')
+    assert first != second
+    assert registry.current_version(registry_dir) == second
+
+    registry.activate_version(first, registry_dir)
+    assert registry.current_version(registry_dir) == first
+
+    os.remove(os.path.join(registry.version_dir(second, registry_dir), 'metrics.json'))
+    with pytest.raises(ValueError):
+        registry.activate_version(second, registry_dir)
+    assert registry.current_version(registry_dir) == first
+
+
+def test_unactivated_publish_leaves_current_alone(artifact, registry_dir):
+    first = publish(artifact, registry_dir, b'first')
+    publish(artifact, registry_dir, b'second', activate=False)
+    assert registry.current_version(registry_dir) == first
+
+
+def test_prune_keeps_the_newest_versions_and_the_current_one(artifact, registry_dir, monkeypatch):
+    # Version names start with a timestamp; fake one per publish so they sort in publish order
+    stamps = iter(f'20260101-0000{i:02d}' for i in range(10))
+
+    class Clock:
+        @staticmethod
+        def now():
+            return Clock
+
+        @staticmethod
+        def strftime(fmt):
+            return next(stamps)
+
+        @staticmethod
+        def isoformat(timespec):
+            return '2026-01-01T00:00:00'
+
+    monkeypatch.setattr(registry, 'datetime', Clock)
+    versions = [publish(artifact, registry_dir, f'run {i}'.encode(), activate=i < 2) for i in range(5)]
+    assert registry.current_version(registry_dir) == versions[1]
+
+    assert registry.prune(2, registry_dir) == [versions[0], versions[2]]
+    assert registry.list_versions(registry_dir) == [versions[1], versions[3], versions[4]]
+
+    newest = publish(artifact, registry_dir, b'run 5', keep=1)
+    assert registry.list_versions(registry_dir) == [newest]
+    assert set(os.listdir(registry_dir)) == {'CURRENT', newest}
+
+    with pytest.raises(ValueError, match='at least 1'):
+        registry.prune(0, registry_dir)
@@ -0,0 +1,56 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from features import FeaturePipeline
+
+
+def test_parse_frame_reports_empty_and_unparseable_rows():
+    df = pd.DataFrame({
+        'age': ['30', None, 'abc', ' ', '28'],
+        'bmi': ['22.5', None, 'xyz', None, ''],
+        'cycle_ri': ['R', None, None, None, 'sometimes'],
+        'unknown': ['x', 'y', 'z', 'w', 'v'],
+    })
+    raw, errors = FeaturePipeline().parse_frame(df)
+
+    assert raw.shape == (5, len(FeaturePipeline().raw_columns))
+    assert errors[0] is None
+    assert errors[1] == 'record has no recognised patient fields'
+    # Only the first unparseable column is reported
+    assert errors[2] == "invalid value for 'age': 'abc'"
+    assert errors[3] == 'record has no recognised patient fields'
+    assert errors[4] == "invalid value for 'cycle_ri': 'sometimes'"
+
+
+def test_parse_frame_rejects_frame_without_known_columns():
+    with pytest.raises(ValueError, match='no recognised input columns'):
+        FeaturePipeline().parse_frame(pd.DataFrame({'foo': [1], 'bar': [2]}))
+
+
+def test_score_file_leaves_rejected_rows_unscored(predictor, tmp_path):
+    import score
+
+    source = tmp_path / 'patients.csv'
+    source.write_text('id,age,bmi,cycle_ri\n1,30,22,R\n2,,,\n3,abc,xyz,\n4,41,31.5,I\n')
+    output = tmp_path / 'scores.csv'
+
+    assert score.score_file(str(source), str(output), chunk_size=2, id_column='id') == 4
+    out = pd.read_csv(output)
+
+    assert list(out.columns) == ['id', 'risk_probability', 'stage', 'error']
+    rejected = out['id'].isin([2, 3])
+    assert out.loc[rejected, 'risk_probability'].isna().all()
+    assert out.loc[rejected, 'stage'].isna().all()
+    assert out.loc[out['id'] == 2, 'error'].item() == 'record has no recognised patient fields'
+    assert out.loc[out['id'] == 3, 'error'].item() == "invalid value for 'age': 'abc'"
+
+    # Valid rows match /predict's path for the same records
+    serving = predictor.current_bundle()
+    expected = serving.predict_risk(np.array([
+        serving.pipeline.parse_record({'age': 30, 'bmi': 22, 'cycle_ri': 'R'}),
+        serving.pipeline.parse_record({'age': 41, 'bmi': 31.5, 'cycle_ri': 'I'}),
+    ]))
+    np.testing.assert_allclose(out.loc[~rejected, 'risk_probability'], expected)
+    assert out.loc[~rejected, 'error'].isna().all()
+    assert out.loc[~rejected, 'stage'].isin(serving.profile.stages).all()
@@ -0,0 +1,95 @@
+import json
+
+import numpy as np
+import pandas as pd
+import pytest
+
+pytest.importorskip('tensorflow')
+
+# Largest difference from the Keras model each variant may show on standardized inputs
+TOLERANCE = {'float32': 1e-5, 'float16': 1e-3, 'int8': 0.1}
+
+
+def synthetic_sheet(n=600, seed=0):
+    """Rows shaped like the workbook: the three hormone columns, a label and some blanks."""
+    from pcos_model import FEATURE_COLUMNS, TARGET_COLUMN
+
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame({column: np.round(rng.gamma(2.0, 3.0, size=n), 2) for column in FEATURE_COLUMNS})
+    df[TARGET_COLUMN] = (df[FEATURE_COLUMNS[0]] + rng.normal(0, 2, size=n) > 6).astype(int)
+    df.loc[::25, FEATURE_COLUMNS[1]] = None
+    # Like the workbook's beta-HCG readings, a value far outside the rest
+    df.loc[n - 1, FEATURE_COLUMNS[2]] = 400.0
+    # The workbook pads some headers with spaces
+    return df.rename(columns={TARGET_COLUMN: f' {TARGET_COLUMN} '})
+
+
+@pytest.fixture(scope='module')
+def keras_model():
+    from tensorflow import keras
+    from pcos_model import create_model, fit_scaler, select_inputs
+
+    X, y = select_inputs(synthetic_sheet())
+    scaler = fit_scaler(X)
+    X = ((X - scaler['mean']) / np.array(scaler['scale'])).astype(np.float32)
+    keras.utils.set_random_seed(0)
+    model = create_model((X.shape[1],))
+    model.fit(X, y, epochs=5, batch_size=32, verbose=0)
+    return model, X
+
+
+@pytest.fixture(scope='module')
+def variants(tmp_path_factory, keras_model):
+    from pcos_model import export_variants
+
+    model, X = keras_model
+    path = tmp_path_factory.mktemp('tflite') / 'pcos_model.tflite'
+    return export_variants(model, str(path), X)
+
+
+@pytest.mark.parametrize('name', sorted(TOLERANCE))
+def test_variant_matches_keras_at_any_batch_size(keras_model, variants, name):
+    from test_model import load_interpreter, predict_batch
+
+    model, X = keras_model
+    interpreter = load_interpreter(variants[name])
+    detail = interpreter.get_input_details()[0]
+    # Dynamic batch, float32 in and out even for the int8 variant
+    assert detail['shape_signature'][0] == -1
+    assert detail['dtype'] == np.float32
+    assert interpreter.get_output_details()[0]['dtype'] == np.float32
+
+    expected = model.predict(X, verbose=0).ravel()
+    for batch_size in (1, 7, 1024):
+        got = predict_batch(interpreter, X, batch_size=batch_size)
+        assert got.shape == expected.shape
+        np.testing.assert_allclose(got, expected, rtol=0, atol=TOLERANCE[name])
+
+
+def test_save_as_tflite_rejects_bad_quantization(keras_model, tmp_path):
+    from pcos_model import save_as_tflite
+
+    model, _ = keras_model
+    with pytest.raises(ValueError, match='representative_data'):
+        save_as_tflite(model, str(tmp_path / 'm.tflite'), 'int8')
+    with pytest.raises(ValueError, match='unknown quantization'):
+        save_as_tflite(model, str(tmp_path / 'm.tflite'), 'int4')
+
+
+def test_train_and_export_writes_scaler_and_variants(tmp_path):
+    from pcos_model import FEATURE_COLUMNS, train_and_export
+    from test_model import load_interpreter, predict_batch
+
+    paths = train_and_export(synthetic_sheet(), str(tmp_path), epochs=2)
+
+    assert paths['float32'] == str(tmp_path / 'pcos_model.tflite')
+    assert {name: p.rsplit('/', 1)[-1] for name, p in paths.items()} == {
+        'float32': 'pcos_model.tflite', 'float16': 'pcos_model.float16.tflite', 'int8': 'pcos_model.int8.tflite',
+    }
+    scaler = json.loads((tmp_path / 'pcos_scaler.json').read_text())
+    assert len(scaler['mean']) == len(scaler['scale']) == len(FEATURE_COLUMNS)
+
+    # The exported model scores scaled rows as probabilities
+    X = ((np.array([[4.0, 5.0, 6.0]]) - scaler['mean']) / np.array(scaler['scale'])).astype(np.float32)
+    prob = predict_batch(load_interpreter(paths['float32']), X)
+    assert prob.shape == (1,) and 0.0 <= prob[0] <= 1.0
@@ -0,0 +1,67 @@
+import numpy as np
+import pytest
+
+from tree_engine import ObliviousTreeEngine, export_ensemble, export_oblivious_trees
+
+# The engine sums the same float64 leaf values as CatBoost, in a different order
+TOLERANCE = 1e-12
+
+
+@pytest.fixture(scope='module')
+def engine(fitted_model):
+    return ObliviousTreeEngine.from_catboost(fitted_model)
+
+
+def border_rows(engine, n=3000, seed=0):
+    """Rows whose values sit on, and one to three float64 ulps either side of, every split border."""
+    rng = np.random.default_rng(seed)
+    X = rng.normal(size=(n, len(engine.feature_names)))
+    for j in range(X.shape[1]):
+        borders = engine._split_thresholds[(engine._split_features == j) & np.isfinite(engine._split_thresholds)]
+        if len(borders):
+            picked = rng.choice(borders.astype(np.float64), size=n)
+            X[:, j] = picked + rng.integers(-3, 4, size=n) * np.spacing(picked)
+    return X
+
+
+def test_matches_catboost_on_training_rows_with_missing_values(engine, fitted_model, training_data):
+    X = training_data[0].to_numpy()
+    assert np.isnan(X).any()
+    np.testing.assert_allclose(engine.predict_proba(X), fitted_model.predict_proba(X), rtol=0, atol=TOLERANCE)
+
+
+def test_matches_catboost_next_to_float32_borders(engine, fitted_model):
+    X = border_rows(engine)
+    X[np.random.default_rng(1).random(X.shape) < 0.05] = np.nan
+    np.testing.assert_allclose(engine.predict_proba(X), fitted_model.predict_proba(X), rtol=0, atol=TOLERANCE)
+
+
+def test_single_row_and_chunking_give_the_same_scores(engine, training_data):
+    X = training_data[0].to_numpy()[:50]
+    whole = engine.predict_member_raw(X)
+    np.testing.assert_array_equal(engine.predict_member_raw(X, chunk_size=7), whole)
+    np.testing.assert_array_equal(engine.predict_raw(X[3]), whole[0, 3:4])
+
+
+def test_save_and_load_round_trip(tmp_path, fitted_model, training_data):
+    path = str(tmp_path / 'trees.npz')
+    exported = export_oblivious_trees(fitted_model, path)
+    loaded = ObliviousTreeEngine.load(path)
+    X = training_data[0].to_numpy()
+    np.testing.assert_array_equal(loaded.predict_proba(X), exported.predict_proba(X))
+    assert loaded.feature_names == exported.feature_names
+    assert loaded.thresholds.dtype == np.float32
+
+
+def test_ensemble_averages_fold_probabilities(tmp_path, fold_models, training_data):
+    ensemble = export_ensemble(fold_models, str(tmp_path / 'ensemble.npz'))
+    X = training_data[0].to_numpy()
+    expected = np.mean([model.predict_proba(X)[:, 1] for model in fold_models], axis=0)
+
+    assert ensemble.member_count == len(fold_models)
+    np.testing.assert_allclose(ensemble.predict_proba(X)[:, 1], expected, rtol=0, atol=TOLERANCE)
+    # Each member's raw score is that fold model's own log-odds
+    member_raw = ensemble.predict_member_raw(X)
+    for raw, model in zip(member_raw, fold_models):
+        np.testing.assert_allclose(raw, model.predict(X, prediction_type='RawFormulaVal'), rtol=0, atol=1e-10)
+    np.testing.assert_allclose(1 / (1 + np.exp(-ensemble.predict_raw(X))), expected, rtol=0, atol=1e-10)